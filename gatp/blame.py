@@ -0,0 +1,150 @@
+"""
+Persistent blame cache.
+
+The blame of a file at a commit never changes, so hunks are kept in
+.gatp/blame/<sha1 of path>.json, one entry per (commit, blob). Each entry
+remembers which line ranges it covers: a request inside them is answered
+locally, otherwise only the missing lines are blamed by git and merged in.
+When a newer commit did not touch the file (same blob, no commit in
+between changing the path), the entry of the older commit is reused.
+"""
+
+import hashlib
+from typing import Optional
+
+from .cache import load_state, save_state
+from .repository import BlameHunk
+
+# bump when the cache layout changes: older caches are ignored
+CACHE_VERSION = 1
+CACHE_DIR = "blame"
+# (commit, blob) entries kept per path, newest first
+MAX_ENTRIES = 8
+
+
+def _merge_ranges(ranges) -> list[list[int]]:
+    merged = []
+    for start, end in sorted(tuple(r) for r in ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _missing_ranges(covered, start: int, end: int) -> list[tuple[int, int]]:
+    """Parts of [start, end] not in the (merged, sorted) `covered` ranges."""
+    missing, pos = [], start
+    for s, e in covered:
+        if e < pos:
+            continue
+        if s > end:
+            break
+        if s > pos:
+            missing.append((pos, s - 1))
+        pos = e + 1
+    if pos <= end:
+        missing.append((pos, end))
+    return missing
+
+
+def _line_count(data: bytes) -> int:
+    return data.count(b"\n") + (1 if data and not data.endswith(b"\n") else 0)
+
+
+def _reusable(repo, entry: dict, commit: str, blob: str, path: str) -> bool:
+    # same content, and history between the two commits never touched the path
+    return (
+        entry["blob"] == blob
+        and repo.is_ancestor(entry["commit"], commit)
+        and next(repo.iter_commits([commit], [entry["commit"]], max_count=1, paths=[path]), None)
+        is None
+    )
+
+
+def blame_lines(
+    repo,
+    path: str,
+    rev: str = "HEAD",
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    use_cache: bool = True,
+) -> list[BlameHunk]:
+    """
+    Blame hunks of `path` (from the repository root) at `rev`, in line
+    order, clipped to the inclusive range [start, end] (default: whole file).
+    """
+    commit = repo.resolve(f"{rev}^{{commit}}")
+    if commit is None:
+        raise ValueError(f"Unknown commit '{rev}'")
+    info = repo.objects.info(f"{commit}:{path}")
+    if info is None or info[1] != "blob":
+        raise ValueError(f"'{path}' is not a file in {rev}")
+    blob = info[0]
+
+    cache_path = repo.state_dir / CACHE_DIR / (hashlib.sha1(path.encode()).hexdigest() + ".json")
+    state = load_state(cache_path, CACHE_VERSION) if use_cache else {}
+    entries = state.get("entries", []) if state.get("path") == path else []
+    commits = state.get("commits", {}) if entries else {}
+
+    entry = next((e for e in entries if e["commit"] == commit and e["blob"] == blob), None)
+    dirty = False
+    if entry is None:
+        dirty = True
+        base = next((e for e in entries if _reusable(repo, e, commit, blob, path)), None)
+        if base is not None:
+            entry = dict(base, commit=commit)
+        else:
+            lines = _line_count(repo.objects.read(blob)[2])
+            entry = {"commit": commit, "blob": blob, "lines": lines, "covered": [], "hunks": []}
+
+    lines = entry["lines"]
+    start, end = max(start or 1, 1), min(end or lines, lines)
+    if lines == 0:
+        return []
+    if start > end:
+        raise ValueError(f"'{path}' has only {lines} lines")
+
+    missing = _missing_ranges(entry["covered"], start, end)
+    if missing:
+        dirty = True
+        entry["hunks"] = list(entry["hunks"])
+        for h in repo.iter_blame(path, commit, missing):
+            entry["hunks"].append([h.start, h.count, h.commit, h.orig_start, h.orig_path])
+            commits[h.commit] = [h.author, h.email, h.timestamp, h.summary]
+        entry["covered"] = _merge_ranges([*entry["covered"], *missing])
+
+    if dirty and use_cache:
+        keep = [entry, *(e for e in entries if (e["commit"], e["blob"]) != (commit, blob))]
+        keep = keep[:MAX_ENTRIES]
+        live = {h[2] for e in keep for h in e["hunks"]}
+        save_state(
+            cache_path,
+            CACHE_VERSION,
+            {
+                "path": path,
+                "entries": keep,
+                "commits": {sha: c for sha, c in commits.items() if sha in live},
+            },
+        )
+
+    result = []
+    for h_start, count, sha, orig_start, orig_path in sorted(entry["hunks"]):
+        first, last = max(h_start, start), min(h_start + count - 1, end)
+        if first > last:
+            continue
+        author, email, timestamp, summary = commits[sha]
+        result.append(
+            BlameHunk(
+                first,
+                last - first + 1,
+                sha,
+                orig_start + first - h_start,
+                orig_path,
+                author,
+                email,
+                timestamp,
+                summary,
+            )
+        )
+    return result
@@ -0,0 +1,29 @@
+"""
+Small versioned JSON state files under .gatp (caches, checkpoints).
+A file written with another layout version reads as empty, and writes
+are atomic (temp file + rename), so concurrent runs never see half a file.
+"""
+
+import json
+import os
+from pathlib import Path
+
+
+def load_state(path: Path, version: int) -> dict:
+    """Payload stored in `path`, or {} if missing, unreadable or outdated."""
+    try:
+        with open(path, "rb") as fh:
+            data = json.loads(fh.read())
+    except (FileNotFoundError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != version:
+        return {}
+    return data.get("data", {})
+
+
+def save_state(path: Path, version: int, payload: dict):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps({"version": version, "data": payload}, separators=(",", ":")))
+    os.replace(tmp, path)
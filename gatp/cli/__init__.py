@@ -1,43 +1,66 @@
-import typer
+from typing import List
 
-from typing import Annotated
+import typer
 
 from .config import app as config_app
 from .bind import app as bind_app
 from .flux import app as flux_app
-from .trunk import app as trunk_app
-from ..tree_manager import TreeManager
+from .trunk import app as trunk_app, write_statuses
+from .hook import app as hook_app
+from ..repository import spawn_count
+
+
+class State(dict):
+    """
+    Shared `ctx.obj`. The TreeManager (GitPython, SQLAlchemy, repo and
+    DB access) is only built the first time a command asks for it, so
+    `--help`, completion and usage errors never pay for it.
+    """
+
+    def __missing__(self, key):
+        if key != "tree_manager":
+            raise KeyError(key)
+        from ..tree_manager import TreeManager
+
+        self[key] = tree_manager = TreeManager()
+        return tree_manager
+
 
-# Istanza condivisa
-tree_manager = TreeManager()
 app = typer.Typer()
 
 
 @app.callback()
 def callback(
     ctx: typer.Context,
-    tree_manager: Annotated[
-        TreeManager, typer.Option(help="Tree manager instance")
-    ] = tree_manager,
+    stats: bool = typer.Option(
+        False, "--stats", help="Report how many git processes the command spawned"
+    ),
 ):
-    ctx.obj = {"tree_manager": tree_manager}
+    ctx.obj = State()
+    if stats:
+        ctx.call_on_close(
+            lambda: typer.echo(f"git processes spawned: {spawn_count()}", err=True)
+        )
 
 
 app.add_typer(config_app, name="config")
 app.add_typer(bind_app, name="bind")
 app.add_typer(flux_app, name="flux")
 app.add_typer(trunk_app, name="trunk")
+app.add_typer(hook_app, name="hook")
 
 
 # ---------------------- COMMIT/UPDATE ----------------------
 @app.command()
 def commit(
+    ctx: typer.Context,
     message: str = typer.Option(..., help="Commit message"),
     all: bool = typer.Option(False, help="Add all changes"),
     files: list[str] = typer.Option(None, help="List of files to add"),
 ):
     """Commit changes to the current branch."""
-    current_branch = tree_manager.lg.current_branch()
+    tree_manager = ctx.obj["tree_manager"]
+    current_branch = tree_manager.repo.current_branch()
     flow = tree_manager.detect_flow(current_branch)
     if flow is None:
         # maybe it's a trunk: we still allow commit, but warn
@@ -47,19 +70,19 @@ def commit(
 
     # Stage changes
     if all:
-        tree_manager.lg.add(all=True)
+        tree_manager.repo.add(all=True)
     elif files:
-        tree_manager.lg.add(all=False, files=[f for f in files])
+        tree_manager.repo.add(all=False, files=[f for f in files])
     else:
         raise typer.Exit("No files specified for commit and --all not set")
 
     # Commit
-    tree_manager.lg.commit(message)
+    tree_manager.repo.commit(message)
     typer.echo(f"Committed changes on {current_branch} with message: '{message}'")
 
     # Push if policy allows (check via TreeManager)
     if tree_manager.can_push(current_branch):
-        tree_manager.lg.push(current_branch)
+        tree_manager.repo.push(current_branch)
         typer.echo(f"Pushed {current_branch}")
     else:
         typer.echo(f"Push skipped: policy forbids pushing directly to {current_branch}")
@@ -73,10 +96,21 @@ def commit(
 
 # ---------------------- LIST BRANCHES ----------------------
 @app.command()
-def list(remote: bool = typer.Option(True, help="Include remote branches")):
+def list(
+    ctx: typer.Context,
+    remote: bool = typer.Option(True, help="Include remote branches"),
+    format: str = typer.Option(
+        "text", help="Output format: text|jsonl (jsonl includes policy status)"
+    ),
+):
     """Show current branch and list of branches."""
-    current_branch = tree_manager.lg.current_branch()
-    branches = tree_manager.lg.list_branches(remote=remote)
+    tree_manager = ctx.obj["tree_manager"]
+    if format != "text":
+        write_statuses(tree_manager.audit_refs(remote=remote), format)
+        return
+
+    current_branch = tree_manager.repo.current_branch()
+    branches = tree_manager.repo.list_branches(remote=remote)
 
     typer.echo(f"Current branch: {current_branch}")
     typer.echo(f"Branches ({'remote' if remote else 'local'}):")
@@ -86,9 +120,13 @@ def list(remote: bool = typer.Option(True, help="Include remote branches")):
 
 # ---------------------- BRANCH SWITCH ----------------------
 @app.command()
-def switch(branch: str = typer.Argument(..., help="Branch name to switch to")):
+def switch(
+    ctx: typer.Context,
+    branch: str = typer.Argument(..., help="Branch name to switch to"),
+):
     """Switch to an existing branch."""
-    tree_manager.lg.checkout(branch)
+    tree_manager = ctx.obj["tree_manager"]
+    tree_manager.repo.checkout(branch)
     typer.echo(f"Switched to {branch}")
 
 
@@ -99,7 +137,7 @@ def switch(branch: str = typer.Argument(..., help="Branch name to switch to")):
 #     new: str = typer.Argument(..., help="New branch name"),
 # ):
 #     """Rename a branch locally and remotely."""
-#     tree_manager.lg.rename_branch(old, new)
+#     tree_manager.repo.rename_branch(old, new)
 #     typer.echo(f"Renamed branch {old} → {new}")
 
 
@@ -110,7 +148,7 @@ def switch(branch: str = typer.Argument(..., help="Branch name to switch to")):
 #     remote: bool = typer.Option(False, help="Also delete remote branch"),
 # ):
 #     """Delete a branch locally and optionally remotely."""
-#     tree_manager.lg.delete_branch(branch, remote=remote)
+#     tree_manager.repo.delete_branch(branch, remote=remote)
 #     typer.echo(f"Deleted branch {branch}")
 
 
@@ -149,41 +187,172 @@ def switch(branch: str = typer.Argument(..., help="Branch name to switch to")):
 
 
 # ---------------------- LOG ----------------------
-# TODO gatp log
-# @app.command()
-# def log(
-#     n: int = typer.Option(10, help="Number of commits to show"),
-#     full: bool = typer.Option(False, help="Show full commit message"),
-# ):
-#     """Show the last N commits on the current branch."""
-#     commits = fm.lg.get_commits(n)
-#     for c in commits:
-#         typer.echo(f"\nCommit: {c.hexsha[:10]}")
-#         typer.echo(f"Author: {c.author.name}")
-#         typer.echo(f"Date:   {c.committed_datetime}")
-#         typer.echo(f"Msg:    {c.message if full else c.summary}")
+@app.command()
+def log(
+    ctx: typer.Context,
+    rev: str = typer.Argument(None, help="Branch or revision (default: current branch)"),
+    n: int = typer.Option(None, "-n", "--max-count", help="Number of commits to show"),
+    skip: int = typer.Option(0, help="Skip the first N commits (paging)"),
+    pending: bool = typer.Option(
+        False, help="Only commits not yet on the branch's flow target / lower trunks"
+    ),
+    # `list` is shadowed by the list command below
+    path: List[str] = typer.Option(None, help="Only commits touching these paths"),
+    first_parent: bool = typer.Option(False, help="Follow only the first parent"),
+    full: bool = typer.Option(False, help="Show full commit message"),
+    format: str = typer.Option("text", help="Output format: text|jsonl"),
+):
+    """Stream the commits of a branch, newest first."""
+    import sys
+    import json
+    from datetime import datetime
+
+    if format not in ("text", "jsonl"):
+        raise typer.BadParameter(f"Unknown format '{format}' (text|jsonl)")
+
+    tree_manager = ctx.obj["tree_manager"]
+    rev = rev or tree_manager.repo.current_branch()
+    include, exclude = [rev], []
+    if pending:
+        try:
+            include, exclude = tree_manager.pending_range(rev)
+        except ValueError as e:
+            raise typer.BadParameter(str(e))
+
+    commits = tree_manager.repo.iter_commits(
+        include,
+        exclude,
+        skip=skip,
+        max_count=n,
+        paths=path or (),
+        first_parent=first_parent,
+        body=full,
+    )
+    out = sys.stdout
+    try:
+        for c in commits:
+            if format == "jsonl":
+                out.write(json.dumps(c._asdict()) + "\n")
+                continue
+            date = datetime.fromtimestamp(c.timestamp)
+            out.write(f"{c.sha[:10]} {date:%Y-%m-%d %H:%M} {c.author:<20} {c.subject}\n")
+            if full and c.body:
+                out.write("".join(f"    {line}\n" for line in c.body.splitlines()) + "\n")
+    except BrokenPipeError:
+        # `gatp log | head`: stop quietly, the git pipe is closed on exit
+        sys.stderr.close()
+        return
+    out.flush()
 
 
 # ---------------------- SHOW COMMIT DIFF ----------------------
-# @app.command()
-# def diff(
-#     commit: str = typer.Argument(..., help="Commit hash"),
-#     file: str = typer.Option(None, help="Show diff only for this file"),
-# ):
-#     """Show the diff of a specific commit, optionally for a single file."""
-#     diff = fm.lg.show_commit(commit, file)
-#     typer.echo(diff)
-
-
-# # ---------------------- BLAME ----------------------
-# @app.command()
-# def blame(
-#     file: str = typer.Argument(..., help="File to analyze"),
-#     line: int = typer.Option(None, help="Line number to blame"),
-# ):
-#     """Show git blame information for a file, optionally for a specific line."""
-#     result = fm.lg.blame(file, line)
-#     typer.echo(result)
+@app.command()
+def diff(
+    ctx: typer.Context,
+    commit: str = typer.Argument("HEAD", help="Commit to show"),
+    path: List[str] = typer.Option(None, help="Only these paths (git pathspecs)"),
+    parent: str = typer.Option(None, help="Compare against this commit instead of the first parent"),
+    stat: bool = typer.Option(False, "--stat", help="Per-file line counts only, no patch"),
+    name_only: bool = typer.Option(False, "--name-only", help="Changed paths only, no patch"),
+    binary: bool = typer.Option(False, help="Emit binary changes as applicable patches"),
+    format: str = typer.Option("text", help="Output format for --stat/--name-only: text|jsonl"),
+):
+    """Stream the diff of a commit, optionally limited to some paths."""
+    import sys
+    import json
+
+    if format not in ("text", "jsonl"):
+        raise typer.BadParameter(f"Unknown format '{format}' (text|jsonl)")
+    if stat and name_only:
+        raise typer.BadParameter("--stat and --name-only are mutually exclusive")
+
+    repo = ctx.obj["tree_manager"].repo
+    try:
+        repo.commit_parents(commit)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+    paths = path or ()
+
+    out = sys.stdout.buffer
+    try:
+        if name_only:
+            for p in repo.changed_paths(commit, paths, parent):
+                line = json.dumps({"path": p}) if format == "jsonl" else p
+                out.write(line.encode(errors="surrogateescape") + b"\n")
+        elif stat:
+            files = added = deleted = 0
+            for s in repo.diff_stat(commit, paths, parent):
+                files += 1
+                added += s.added or 0
+                deleted += s.deleted or 0
+                if format == "jsonl":
+                    line = json.dumps(s._asdict())
+                else:
+                    name = f"{s.old_path} => {s.path}" if s.old_path else s.path
+                    counts = "   bin   bin" if s.added is None else f"{s.added:>6}{s.deleted:>6}"
+                    line = f"{counts}  {name}"
+                out.write(line.encode(errors="surrogateescape") + b"\n")
+            if format == "text":
+                out.write(f"{files} files changed, {added} insertions(+), {deleted} deletions(-)\n".encode())
+        else:
+            # raw bytes: the patch is never decoded nor held in memory
+            for chunk in repo.iter_diff(commit, paths, parent, binary=binary):
+                out.write(chunk)
+        out.flush()
+    except BrokenPipeError:
+        # `gatp diff | head`: stop quietly, the git pipe is closed on exit
+        sys.stderr.close()
+
+
+# ---------------------- BLAME ----------------------
+@app.command()
+def blame(
+    ctx: typer.Context,
+    file: str = typer.Argument(..., help="File to analyze (path from the repository root)"),
+    rev: str = typer.Option("HEAD", help="Revision to blame"),
+    line: int = typer.Option(None, help="Line number to blame"),
+    lines: str = typer.Option(None, "-L", "--lines", help="Line range START,END"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="Ask git, without reading or updating the cache"),
+    format: str = typer.Option("text", help="Output format: text (per line) | jsonl (per hunk)"),
+):
+    """Show git blame information for a file, optionally for some lines."""
+    import sys
+    import json
+    from datetime import datetime
+    from ..blame import blame_lines
+
+    if format not in ("text", "jsonl"):
+        raise typer.BadParameter(f"Unknown format '{format}' (text|jsonl)")
+    start = end = line
+    if lines:
+        try:
+            start, end = (int(n) for n in lines.split(","))
+        except ValueError:
+            raise typer.BadParameter(f"Invalid line range '{lines}' (START,END)")
+
+    repo = ctx.obj["tree_manager"].repo
+    try:
+        hunks = blame_lines(repo, file, rev, start, end, use_cache=not no_cache)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+
+    out = sys.stdout.buffer
+    try:
+        if format == "jsonl":
+            for h in hunks:
+                out.write(json.dumps(h._asdict()).encode() + b"\n")
+        elif hunks:
+            # git numbers lines on "\n" only (a lone "\r" does not end a line)
+            content = repo.objects.read(f"{rev}:{file}")[2].split(b"\n")
+            width = len(str(hunks[-1].start + hunks[-1].count - 1))
+            for h in hunks:
+                date = datetime.fromtimestamp(h.timestamp)
+                for n in range(h.start, h.start + h.count):
+                    prefix = f"{h.commit[:8]} ({h.author[:20]:<20} {date:%Y-%m-%d} {n:>{width}}) "
+                    out.write(prefix.encode() + content[n - 1] + b"\n")
+        out.flush()
+    except BrokenPipeError:
+        sys.stderr.close()
 
 
 # # ---------------------- CONFIG ----------------------
@@ -218,39 +387,6 @@ def switch(branch: str = typer.Argument(..., help="Branch name to switch to")):
 #         )
 
 
-# @config_app.command("cleanup")
-# def config_cleanup():
-#     """Delete remote branches that are not part of any trunk or configured flow."""
-#     if not fm.store.is_initialized():
-#         typer.echo("Not initialized. Run `tool config setup` first.")
-#         raise typer.Exit()
-
-#     remote = fm.lg.get_remote_name()
-#     all_branches = fm.lg.list_branches(remote=True)
-
-#     valid_trunks = [f"{remote}/{t}" for t in fm.trunks.keys()]
-#     valid_flow_prefixes = [f"{remote}/{f.prefix}" for f in fm.flows.values()]
-
-#     for branch in all_branches:
-#         if branch in valid_trunks:
-#             continue
-#         if any(branch.startswith(prefix) for prefix in valid_flow_prefixes):
-#             continue
-
-#         # extract branch name without remote prefix
-#         branch_name = branch.split("/", 1)[1]
-
-#         # skip HEAD or weird git branches
-#         if branch_name == "HEAD":
-#             continue
-
-#         # ask for confirmation and delete if confirmed
-#         confirm = typer.confirm(f"Delete remote branch '{branch_name}'?", default=False)
-#         if confirm:
-#             fm.lg.delete_branch(branch_name, remote=True)
-#             typer.echo(f"Deleted remote branch: {branch_name}")
-
-
 # @config_app.command("new-trunk")
 # def config_new_trunk(
 #     name: str = typer.Argument(...),
@@ -1,3 +1,42 @@
 import typer
 
 app = typer.Typer(help="Manage bind settings and operations.")
+
+
+def echo_plan(steps):
+    for step in steps:
+        typer.echo(f"  {step.action:<8} {step.detail}")
+
+
+# ---------------------- RUN ----------------------
+@app.command()
+def run(
+    ctx: typer.Context,
+    name: str = typer.Argument(..., help="Bind name"),
+    plan: bool = typer.Option(
+        False, "--plan", help="Only report predicted merges, conflicts, pushes, tags"
+    ),
+    depth: int = typer.Option(
+        None, help="Fetch the trunks with at most N commits of history (shallow)"
+    ),
+    filter: str = typer.Option(
+        None, help="Partial fetch of the trunks, e.g. blob:none"
+    ),
+):
+    """Execute a bind (merge/rebase/aggregate parent into target)."""
+    from ..repository import MergeConflictError
+
+    tree_manager = ctx.obj["tree_manager"]
+    if plan:
+        typer.echo(f"Plan for bind '{name}':")
+        echo_plan(tree_manager.plan_bind(name))
+        return
+
+    try:
+        tree_manager.execute_bind(name, depth=depth, filter=filter)
+    except MergeConflictError as e:
+        typer.echo("Merge conflict detected!")
+        for path in e.paths:
+            typer.echo(f" - {path}")
+        raise typer.Exit(code=1)
+    typer.echo(f"Bind '{name}' executed.")
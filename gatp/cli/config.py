@@ -1,3 +1,212 @@
+import json
+import sys
+import time
+from datetime import datetime
+
 import typer
 
 app = typer.Typer(help="Manage topology configuration for the current repo.")
+
+
+# ---------------------- LOG RETENTION ----------------------
+@app.command("compact-logs")
+def compact_logs(
+    ctx: typer.Context,
+    older_than: int = typer.Option(
+        None, help="Archive log rows older than N days (default: 90)"
+    ),
+    vacuum: bool = typer.Option(True, help="Reclaim DB space afterwards"),
+):
+    """Archive old audit log rows into compressed segment files."""
+    tree_manager = ctx.obj["tree_manager"]
+    kwargs = {"vacuum": vacuum}
+    if older_than is not None:
+        kwargs["older_than_days"] = older_than
+    count, segment = tree_manager.store.compact_logs(**kwargs)
+    if count:
+        typer.echo(f"Archived {count} log rows to {segment}")
+    else:
+        typer.echo("No log rows to archive.")
+
+
+# ---------------------- BRANCH CLEANUP ----------------------
+@app.command()
+def cleanup(
+    ctx: typer.Context,
+    pattern: list[str] = typer.Option(
+        None, help="Only branches matching these globs (repeatable)"
+    ),
+    older_than: int = typer.Option(
+        None, help="Only branches whose last commit is older than N days"
+    ),
+    remote: bool = typer.Option(
+        True, help="Clean remote branches (--no-remote: local branches)"
+    ),
+    yes: bool = typer.Option(
+        False, "--yes", "-y", help="Delete without asking (default: only list)"
+    ),
+    force: bool = typer.Option(
+        False, help="With --no-remote, also delete unmerged local branches (git branch -D)"
+    ),
+):
+    """Delete branches that are not part of any trunk or configured flow."""
+    tree_manager = ctx.obj["tree_manager"]
+    if not tree_manager.is_configured:
+        typer.echo("Not initialized. Run `gatp config setup` first.")
+        raise typer.Exit(code=1)
+
+    out = sys.stdout
+    selected = []
+    for branch, age in tree_manager.unmanaged_branches(
+        remote=remote, patterns=pattern, older_than_days=older_than
+    ):
+        out.write(f"{branch:<60} {age:>6.1f}d\n")
+        selected.append(branch)
+    out.flush()
+
+    where = "remote" if remote else "local"
+    if not selected:
+        typer.echo(f"No unmanaged {where} branches.", err=True)
+        return
+    if not yes:
+        typer.echo(
+            f"{len(selected)} unmanaged {where} branch(es); re-run with --yes to delete them.",
+            err=True,
+        )
+        return
+
+    # chunked atomic pushes (or one `branch -d`: local-only work is kept)
+    deleted = tree_manager.repo.delete_branches(
+        selected, remote=remote, local=not remote, force=force
+    )
+    typer.echo(f"Deleted {len(deleted)} {where} branch(es).", err=True)
+    kept = [b for b in selected if b not in set(deleted)]
+    if kept and not remote:
+        typer.echo(
+            f"Kept {len(kept)} unmerged local branch(es) (use --force to delete them):",
+            err=True,
+        )
+        for branch in kept:
+            typer.echo(f" - {branch}", err=True)
+
+
+# ---------------------- LOG QUERY ----------------------
+@app.command()
+def log(
+    ctx: typer.Context,
+    since: datetime = typer.Option(None, help="Only rows at or after this time"),
+    until: datetime = typer.Option(None, help="Only rows before this time"),
+    user: str = typer.Option(None, help="Filter by user"),
+    level: str = typer.Option(None, help="Filter by level"),
+    tail: int = typer.Option(None, help="Only show the last N matching rows"),
+    follow: bool = typer.Option(
+        False, "--follow", "-f", help="Keep streaming new rows"
+    ),
+    interval: float = typer.Option(1.0, help="Polling interval for --follow (s)"),
+    format: str = typer.Option("text", help="Output format: text|jsonl"),
+):
+    """Stream audit log rows, oldest first."""
+    store = ctx.obj["tree_manager"].store
+    filters = dict(since=since, until=until, user=user, level=level)
+
+    # follow on insertion order: rows are stamped before the sink inserts them
+    last_id = 0
+    if tail is not None:
+        if follow:
+            # start after the rows that exist now, not after the oldest one shown
+            last_id = store.last_log_id()
+        # newest N via the descending index walk, printed oldest first
+        rows = []
+        for row in store.iter_logs(descending=True, page_size=tail or 1, **filters):
+            if len(rows) >= tail:
+                break
+            rows.append(row)
+        rows.reverse()
+    else:
+        rows = store.iter_logs(**filters)
+
+    out = sys.stdout
+    while True:
+        for row in rows:
+            if format == "jsonl":
+                record = row._asdict()
+                record["timestamp"] = record["timestamp"].isoformat()
+                out.write(json.dumps(record) + "\n")
+            else:
+                out.write(
+                    f"{row.timestamp:%Y-%m-%d %H:%M:%S} {row.level or '-':<7} "
+                    f"{row.user}: {row.message}\n"
+                )
+            last_id = max(last_id, row.id)
+        out.flush()
+        if not follow:
+            return
+        time.sleep(interval)
+        rows = store.iter_logs(after_id=last_id, **filters)
+
+
+# ---------------------- SETUP ----------------------
+@app.command()
+def setup(ctx: typer.Context):
+    """Initialize the topology database with the default trunks/flows/binds."""
+    tree_manager = ctx.obj["tree_manager"]
+    # the DB file alone does not count: logs and the PR cache create it empty
+    if tree_manager.is_configured:
+        typer.echo("Repository is already initialized.")
+        raise typer.Exit()
+
+    tree_manager.init_store_with_defaults()
+    tree_manager.init_user()
+    typer.echo("Repository initialized for flow management.")
+
+
+# ---------------------- EXPORT/IMPORT ----------------------
+@app.command("export")
+def export_topology(
+    ctx: typer.Context,
+    path: str = typer.Argument(None, help="Output file (default: stdout)"),
+    format: str = typer.Option(
+        None, help="json|toml (default: from the file extension, else json)"
+    ),
+):
+    """Export trunks, flows and binds as a declarative topology file."""
+    from ..policy import dump_topology
+
+    tree_manager = ctx.obj["tree_manager"]
+    if format is None:
+        format = "toml" if path and path.endswith(".toml") else "json"
+    text = dump_topology(tree_manager.policy, format)
+    if path:
+        with open(path, "w") as fh:
+            fh.write(text)
+        typer.echo(f"Exported topology to {path}")
+    else:
+        sys.stdout.write(text)
+
+
+@app.command("import")
+def import_topology(
+    ctx: typer.Context,
+    path: str = typer.Argument(..., help="Topology file (.json or .toml)"),
+    prune: bool = typer.Option(False, help="Delete objects missing from the file"),
+    dry_run: bool = typer.Option(False, help="Only show what would change"),
+):
+    """Apply a topology file to the DB in a single transaction."""
+    from ..policy import load_topology
+
+    tree_manager = ctx.obj["tree_manager"]
+    try:
+        policy = load_topology(path)
+        changes = tree_manager.store.apply_policy(
+            policy, prune=prune, dry_run=dry_run
+        )
+    except (ValueError, TypeError, KeyError) as e:
+        typer.echo(f"Invalid topology: {e}")
+        raise typer.Exit(code=1)
+    if not dry_run:
+        tree_manager.init_user()
+
+    for action in ("added", "updated", "removed"):
+        for name in changes[action]:
+            typer.echo(f"{'would be ' if dry_run else ''}{action}: {name}")
+    typer.echo(f"{len(changes['unchanged'])} unchanged.")
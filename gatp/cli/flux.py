@@ -1,6 +1,7 @@
-import typer
+import json
+import sys
 
-from ..provider_api import AzureDevOpsProvider
+import typer
 
 app = typer.Typer(help="Manage flux settings and operations.")
 
@@ -8,6 +9,8 @@ app = typer.Typer(help="Manage flux settings and operations.")
 ### start: create a new flow branch
 ### finish: finish a flow branch (merge into trunk with policy)
 ### resolve: complete a merge after manual conflict resolution
+### conflicts: predict conflicts between flow branches and their targets
+### retain: delete merged / expired flow branches (retention policy)
 
 
 # ---------------------- START ----------------------
@@ -30,17 +33,17 @@ def start(
     flow_name, flow_settings = flow
     actual_base = base or flow_settings.parent
 
-    if not tree_manager.lg.branch_exists(actual_base):
+    if not tree_manager.repo.branch_exists(actual_base):
         raise RuntimeError(f"Base branch '{actual_base}' does not exist locally.")
 
     # create from base
-    tree_manager.lg.checkout(actual_base)
-    tree_manager.lg.checkout(branch, create=True)
+    tree_manager.repo.checkout(actual_base)
+    tree_manager.repo.checkout(branch, create=True)
 
     # push if requested and allowed by policy (flow/trunk)
     if push:
         if tree_manager.can_push(branch):
-            tree_manager.lg.push(branch)
+            tree_manager.repo.push(branch)
             typer.echo(f"Created branch {branch} from {actual_base} and pushed.")
         else:
             typer.echo(
@@ -63,11 +66,28 @@ def finish(
         "ort", help="Auto-resolve strategy: ort|ours|theirs|resolve"
     ),
     ff: bool = typer.Option(False, help="Allow fast-forward merge"),
+    plan: bool = typer.Option(
+        False, "--plan", help="Only report the predicted merge, push and PR"
+    ),
+    depth: int = typer.Option(
+        None, help="Fetch the target with at most N commits of history (shallow)"
+    ),
+    filter: str = typer.Option(
+        None, help="Partial fetch of the target, e.g. blob:none"
+    ),
 ):
     """Finish a feature branch by merging it into the target trunk (with policy)."""
+    from ..repository import MergeConflictError
 
     tree_manager = ctx.obj["tree_manager"]
 
+    if plan:
+        from .bind import echo_plan
+
+        typer.echo(f"Plan for finishing {branch}:")
+        echo_plan(tree_manager.plan_finish(branch, no_ff=not ff))
+        return
+
     flow = tree_manager.detect_flow(branch)
     if not flow:
         typer.echo(f"Unknown flow for branch {branch}")
@@ -81,27 +101,27 @@ def finish(
     if not target_trunk:
         raise RuntimeError(f"Target trunk '{target_branch}' not configured.")
 
-    if not tree_manager.lg.branch_exists(target_branch):
+    if not tree_manager.repo.branch_exists(target_branch):
         raise RuntimeError(f"Target branch '{target_branch}' does not exist locally.")
 
-    # Checkout target branch and pull latest
-    tree_manager.lg.checkout(target_branch)
-    tree_manager.lg.pull(target_branch)
+    # bring the target up to date without checking it out
+    tree_manager.repo.sync_branch(target_branch, depth=depth, filter=filter)
 
     # Merge source into target. GitRepository.merge raises MergeConflictError if conflict.
     try:
         # GitRepository.merge signature: merge(source, target, strategy=None, no_ff=True)
-        tree_manager.lg.merge(branch, target_branch, strategy=resolve, no_ff=not ff)
+        tree_manager.repo.merge(branch, target_branch, strategy=resolve, no_ff=not ff)
         typer.echo(f"Merged {branch} → {target_branch}")
     except Exception as e:
         # prefer specific MergeConflictError, fallback generic
-        if isinstance(e, getattr(tree_manager.lg, "MergeConflictError", type(e))):
-            conflicts = tree_manager.lg.repo.index.unmerged_blobs()
+        if isinstance(e, MergeConflictError):
             typer.echo("Merge conflict detected!")
-            for path, bloblist in conflicts.items():
+            for path in e.paths:
                 typer.echo(f" - {path}")
             typer.echo(
-                "\nRisolvi i conflitti manualmente, poi esegui `resolve` per completare."
+                f"\nRisolvi i conflitti manualmente in {e.worktree} e aggiungi i file "
+                "(`git add`), poi esegui `flux resolve` per completare "
+                "(o `flux resolve --abort` per annullare)."
             )
             raise typer.Exit(code=1)
         else:
@@ -109,20 +129,31 @@ def finish(
 
     # Push target if allowed by trunk policy
     if tree_manager.can_push(target_branch):
-        tree_manager.lg.push(target_branch)
+        tree_manager.repo.push(target_branch)
         typer.echo(f"Pushed {target_branch}.")
     else:
         typer.echo(f"Target {target_branch} is protected: push skipped.")
 
     # Create PR if required by trunk policy (note: often PR to trunk is not needed if already merged locally)
     if tree_manager.requires_pr(target_branch):
+        from ..provider_api import AzureDevOpsProvider
+        from ..pr_cache import PRCache
+
         provider = AzureDevOpsProvider(org, project, repo, pat)
+        prs = PRCache(tree_manager.store, provider)
+        tree_manager.init_user()
+        # idempotent reruns: reuse the PR opened by a previous run
+        existing = prs.open_pr(branch, target_branch)
+        if existing is not None:
+            typer.echo(f"PR already open: {existing.pr_id}")
+            return
         pr = provider.create_pr(
             source=branch,
             target=target_branch,
             title=f"Merge {branch} → {target_branch}",
             description="Auto-created by Gitflow manager.",
         )
+        prs.record(branch, target_branch, pr)
         typer.echo(f"PR created: {pr.get('pullRequestId', 'N/A')}")
     else:
         typer.echo(
@@ -134,36 +165,63 @@ def finish(
 @app.command()
 def resolve(
     ctx: typer.Context,
-    org: str = typer.Option(..., help="Azure DevOps organization"),
-    project: str = typer.Option(..., help="Azure DevOps project"),
-    repo: str = typer.Option(..., help="Azure DevOps repository"),
-    pat: str = typer.Option(..., help="Azure DevOps personal access token"),
+    org: str = typer.Option(None, help="Azure DevOps organization"),
+    project: str = typer.Option(None, help="Azure DevOps project"),
+    repo: str = typer.Option(None, help="Azure DevOps repository"),
+    pat: str = typer.Option(None, help="Azure DevOps personal access token"),
+    trunk: str = typer.Option(
+        None, help="Trunk to resolve (default: the only one waiting)"
+    ),
+    abort: bool = typer.Option(
+        False, "--abort", help="Give up the pending merge/rebase and reset the worktree"
+    ),
 ):
     """Complete a merge after resolving conflicts manually."""
-    # we expect user to be on the target branch (merge in progress)
-    tree_manager = ctx.obj["tree_manager"]
+    from ..repository import MergeConflictError
 
-    current_branch = tree_manager.lg.current_branch()
+    # conflicts wait in the trunk's gatp worktree (.gatp/worktrees/<trunk>)
+    tree_manager = ctx.obj["tree_manager"]
 
-    # check merge in progress
-    if not tree_manager.lg.repo.index.unmerged_blobs():
+    pending = tree_manager.repo.pending_worktrees()
+    if not pending:
         typer.echo("No merge in progress. Nothing to resolve.")
         raise typer.Exit()
+    if trunk is None:
+        if len(pending) > 1:
+            typer.echo(f"Several merges in progress: {', '.join(pending)}; use --trunk.")
+            raise typer.Exit(code=1)
+        trunk = next(iter(pending))
+    if trunk not in pending:
+        typer.echo(f"No merge in progress on {trunk}.")
+        raise typer.Exit(code=1)
 
-    typer.echo("Committing resolved merge ...")
+    source = pending[trunk]["source"]
+    if abort:
+        tree_manager.repo.abort_worktree(trunk)
+        typer.echo(f"Aborted {pending[trunk].get('kind', 'merge')} of {source} on {trunk}.")
+        return
 
-    # Stage resolved files (add everything)
-    tree_manager.lg.add(all=True)
+    needs_pr = tree_manager.requires_pr(trunk)
+    if needs_pr and not all((org, project, repo, pat)):
+        raise typer.BadParameter(
+            f"{trunk} requires a PR: --org, --project, --repo and --pat are needed"
+        )
 
-    # Finalize merge commit
-    message = f"Merge resolution on {current_branch}"
-    tree_manager.lg.commit(message)
-    typer.echo(f"Merge resolved and committed on {current_branch}.")
+    typer.echo("Committing resolved merge ...")
+    try:
+        tree_manager.repo.complete_worktree(trunk)
+    except MergeConflictError as e:
+        typer.echo(str(e))
+        for path in e.paths:
+            typer.echo(f" - {path}")
+        raise typer.Exit(code=1)
+    except ValueError as e:
+        typer.echo(str(e))
+        raise typer.Exit(code=1)
+    typer.echo(f"Merge of {source} resolved and committed on {trunk}.")
 
-    # Determine flow/trunk context for push / PR decisions:
-    # if current branch is a trunk, target_trunk = current_branch,
-    # else it's likely a trunk name (since merge occurs on trunk).
-    target_trunk = current_branch
+    # target_trunk is the branch the merge was made on
+    target_trunk = trunk
     trunk_settings = tree_manager.trunks.get(target_trunk)
     if not trunk_settings:
         typer.echo(
@@ -172,19 +230,170 @@ def resolve(
 
     # Push if trunk allows it
     if tree_manager.can_push(target_trunk):
-        tree_manager.lg.push(target_trunk)
+        tree_manager.repo.push(target_trunk)
         typer.echo(f"Pushed {target_trunk}.")
 
     # If the trunk's policy requires PRs (unusual after merge), create one
-    if tree_manager.requires_pr(target_trunk):
+    if needs_pr:
+        from ..provider_api import AzureDevOpsProvider
+        from ..pr_cache import PRCache
+
         provider = AzureDevOpsProvider(org, project, repo, pat)
-        # TODO: source branch is unknown here; user must provide it
-        # We need a source branch to open a PR — in the merge flow the source branch
-        # is not deterministically known here. If you want to auto-create PRs from
-        # the original source branch, you should pass it as an argument to resolve().
-        typer.echo(
-            "PR creation requested by policy, but resolve() does not know the original source branch."
+        prs = PRCache(tree_manager.store, provider)
+        tree_manager.init_user()
+        existing = prs.open_pr(source, target_trunk)
+        if existing is not None:
+            typer.echo(f"PR already open: {existing.pr_id}")
+            return
+        pr = provider.create_pr(
+            source=source,
+            target=target_trunk,
+            title=f"Merge {source} → {target_trunk}",
+            description="Auto-created by Gitflow manager.",
         )
-        typer.echo("Please create PR manually or pass source branch to the command.")
+        prs.record(source, target_trunk, pr)
+        typer.echo(f"PR created: {pr.get('pullRequestId', 'N/A')}")
     else:
         typer.echo("No PR required by trunk policy.")
+
+
+# ---------------------- CONFLICTS ----------------------
+@app.command()
+def conflicts(
+    ctx: typer.Context,
+    flow: list[str] = typer.Option(
+        None, help="Only branches of these flows (default: all flows)"
+    ),
+    workers: int = typer.Option(None, help="Merge processes (default: CPU count)"),
+    cache: bool = typer.Option(True, help="Reuse results cached by commit pair"),
+    format: str = typer.Option("text", help="Output format: text|jsonl"),
+):
+    """Predict which flow branches conflict with their target and with each other."""
+    from ..conflicts import conflict_matrix
+
+    if format not in ("text", "jsonl"):
+        raise typer.BadParameter(f"Unknown format '{format}' (text|jsonl)")
+
+    tree_manager = ctx.obj["tree_manager"]
+    branches, results, computed = conflict_matrix(
+        tree_manager, flows=flow, workers=workers, use_cache=cache
+    )
+
+    out = sys.stdout
+    if format == "jsonl":
+        for r in results:
+            record = r._asdict()
+            record["conflicted"] = r.conflicted
+            out.write(json.dumps(record) + "\n")
+        out.flush()
+        return
+
+    if not branches:
+        typer.echo("No flow branches found.")
+        return
+
+    # N×N matrix (plus each branch vs its target): X = conflict, ! = merge failed, . = clean
+    marks, targets = {}, {}
+    for r in results:
+        mark = "!" if r.error else "X" if r.conflicted else "."
+        if r.kind == "flow":
+            targets.setdefault(r.source, []).append(f"{r.target} {mark}")
+        else:
+            marks[r.source, r.target] = marks[r.target, r.source] = mark
+    width = len(str(len(branches)))
+    out.write(" " * (width + 2) + " ".join(f"{i:>{width}}" for i in range(1, len(branches) + 1)) + "\n")
+    for i, a in enumerate(branches, 1):
+        row = " ".join(
+            f"{'-' if a == b else marks.get((a, b), '?'):>{width}}" for b in branches
+        )
+        target = ", ".join(targets.get(a, []))
+        out.write(f"{i:>{width}}  {row}  {a}{f'  (→ {target})' if target else ''}\n")
+
+    out.write("\n")
+    conflicted = [r for r in results if r.conflicted or r.error]
+    for r in conflicted:
+        arrow = "→" if r.kind == "flow" else "↔"
+        if r.error:
+            out.write(f"{r.source} {arrow} {r.target}: merge failed: {r.error}\n")
+            continue
+        out.write(f"{r.source} {arrow} {r.target}: {len(r.paths)} conflicting path(s)\n")
+        for path in r.paths:
+            out.write(f"  - {path}\n")
+    out.write(
+        f"{len(conflicted)} of {len(results)} merges conflict "
+        f"({computed} computed, {len(results) - computed} cached or trivial).\n"
+    )
+    out.flush()
+
+
+# ---------------------- RETAIN ----------------------
+@app.command()
+def retain(
+    ctx: typer.Context,
+    remote: bool = typer.Option(
+        True, help="Apply to remote branches (--no-remote: local branches)"
+    ),
+    older_than: int = typer.Option(
+        None, help="Only delete merged branches older than N days"
+    ),
+    include_unmerged: bool = typer.Option(
+        False, help="Also delete unmerged branches past their flow lifetime"
+    ),
+    yes: bool = typer.Option(
+        False, "--yes", "-y", help="Delete without asking (default: only list)"
+    ),
+    all: bool = typer.Option(False, "--all", help="Also report kept branches"),
+    org: str = typer.Option(None, help="Azure DevOps organization (check open PRs)"),
+    project: str = typer.Option(None, help="Azure DevOps project"),
+    repo: str = typer.Option(None, help="Azure DevOps repository"),
+    pat: str = typer.Option(None, help="Azure DevOps personal access token"),
+    skip_pr_check: bool = typer.Option(
+        False, "--skip-pr-check", help="Delete without checking for open PRs"
+    ),
+    format: str = typer.Option("text", help="Output format: text|jsonl"),
+):
+    """Apply flow retention: auto_delete of merged branches and max_lifetime_days."""
+    if format not in ("text", "jsonl"):
+        raise typer.BadParameter(f"Unknown format '{format}' (text|jsonl)")
+    check_prs = bool(org and project and repo and pat)
+    if yes and not check_prs and not skip_pr_check:
+        raise typer.BadParameter(
+            "Deleting needs --org/--project/--repo/--pat to keep branches with "
+            "open PRs (or --skip-pr-check)"
+        )
+
+    tree_manager = ctx.obj["tree_manager"]
+    decisions = tree_manager.plan_retention(
+        remote=remote, older_than_days=older_than, include_unmerged=include_unmerged
+    )
+    if check_prs:
+        from ..provider_api import AzureDevOpsProvider
+        from ..pr_cache import PRCache
+
+        provider = AzureDevOpsProvider(org, project, repo, pat)
+        decisions = tree_manager.keep_open_prs(
+            decisions, PRCache(tree_manager.store, provider)
+        )
+
+    out = sys.stdout
+    for d in decisions:
+        if not (d.delete or all):
+            continue
+        if format == "jsonl":
+            out.write(json.dumps(d._asdict()) + "\n")
+        else:
+            action = "delete" if d.delete else "keep"
+            out.write(f"{action:<7} {d.branch:<50} {d.age_days:>6.1f}d  {d.reason}\n")
+    out.flush()
+
+    where = "remote" if remote else "local"
+    planned = sum(d.delete for d in decisions)
+    if not yes:
+        if planned:
+            typer.echo(
+                f"{planned} {where} branch(es) to delete; re-run with --yes to delete them.",
+                err=True,
+            )
+        return
+    deleted = tree_manager.apply_retention(decisions, remote=remote)
+    typer.echo(f"Deleted {len(deleted)} {where} branch(es).", err=True)
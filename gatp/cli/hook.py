@@ -0,0 +1,66 @@
+import typer
+
+app = typer.Typer(help="Enforce trunk/flow policy through git hooks.")
+
+# The installed hooks call gatp.hooks directly (`python -I -S`, no typer);
+# these commands are the same entry points for manual use and debugging.
+
+
+@app.command("pre-push", context_settings={"allow_extra_args": True})
+def pre_push(ctx: typer.Context):
+    """Check ref updates read from stdin (git pre-push format)."""
+    from .. import hooks
+
+    raise typer.Exit(code=hooks.pre_push(ctx.args))
+
+
+@app.command()
+def update(
+    ref: str = typer.Argument(..., help="Updated ref"),
+    old: str = typer.Argument(..., help="Old sha"),
+    new: str = typer.Argument(..., help="New sha"),
+):
+    """Check one ref update (git server-side update hook format)."""
+    from .. import hooks
+
+    raise typer.Exit(code=hooks.update([ref, old, new]))
+
+
+@app.command()
+def install(
+    server: bool = typer.Option(
+        False, help="Install the server-side update hook instead of pre-push"
+    ),
+    force: bool = typer.Option(False, help="Overwrite an existing hook"),
+):
+    """Install the policy hook into the current repository."""
+    from .. import hooks
+
+    kind = "update" if server else "pre-push"
+    try:
+        path = hooks.install(kind, force=force)
+    except FileExistsError as e:
+        typer.echo(f"{e} (use --force to overwrite)")
+        raise typer.Exit(code=1)
+    typer.echo(f"Installed {kind} hook at {path}")
+
+
+@app.command()
+def bench(
+    runs: int = typer.Option(30, help="Number of timed runs"),
+    refs: int = typer.Option(100, help="Ref updates per push"),
+):
+    """Measure hook latency against the latency budget."""
+    from .. import hooks
+
+    result = hooks.benchmark(runs=runs, refs=refs)
+    budget = hooks.HOOK_BUDGET_MS
+    # the budget applies to what a push pays: the whole hook process
+    over = result["process_ms"] > budget
+    typer.echo(f"policy check: {result['check_ms']:.2f} ms (in process)")
+    typer.echo(
+        f"full hook process: {result['process_ms']:.2f} ms (budget {budget} ms)"
+        + (" OVER BUDGET" if over else "")
+    )
+    if over:
+        raise typer.Exit(code=1)
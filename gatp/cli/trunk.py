@@ -1,3 +1,75 @@
+import json
+import sys
+
 import typer
 
 app = typer.Typer(help="Manage trunk settings and operations.")
+
+
+def write_statuses(statuses, format: str = "text"):
+    """Stream RefStatus records to stdout, one line each (text or jsonl)."""
+    out = sys.stdout
+    if format == "jsonl":
+        for status in statuses:
+            out.write(json.dumps(status._asdict()) + "\n")
+    elif format == "text":
+        for s in statuses:
+            out.write(
+                f"{s.ref:<50} flow={s.flow or '-':<10} trunk={s.trunk or '-':<10} "
+                f"push={'yes' if s.push_allowed else 'no':<3} "
+                f"pr={'yes' if s.pr_required else 'no':<3}"
+                f"{' UNMANAGED' if s.unmanaged else ''}\n"
+            )
+    else:
+        raise typer.BadParameter(f"Unknown format '{format}' (text|jsonl)")
+    out.flush()
+
+
+# ---------------------- AUDIT ----------------------
+@app.command()
+def audit(
+    ctx: typer.Context,
+    local: bool = typer.Option(True, help="Include local branches"),
+    remote: bool = typer.Option(True, help="Include remote branches"),
+    format: str = typer.Option("text", help="Output format: text|jsonl"),
+):
+    """Classify every branch against the trunk/flow policy."""
+    tree_manager = ctx.obj["tree_manager"]
+    write_statuses(tree_manager.audit_refs(local=local, remote=remote), format)
+
+
+# ---------------------- VERIFY ----------------------
+@app.command()
+def verify(
+    ctx: typer.Context,
+    remote: bool = typer.Option(False, help="Check remote-tracking branches"),
+    commits: bool = typer.Option(False, help="List the commits not yet propagated"),
+    full: bool = typer.Option(False, help="Ignore checkpoints and walk everything"),
+    format: str = typer.Option("text", help="Output format: text|jsonl"),
+):
+    """Check that every trunk's commits have reached the trunks below it."""
+    if format not in ("text", "jsonl"):
+        raise typer.BadParameter(f"Unknown format '{format}' (text|jsonl)")
+
+    tree_manager = ctx.obj["tree_manager"]
+    results = tree_manager.verify_propagation(remote=remote, commits=commits, full=full)
+
+    out = sys.stdout
+    for p in results:
+        if format == "jsonl":
+            out.write(json.dumps(p._asdict()) + "\n")
+            continue
+        edge = f"{p.source} → {p.target}"
+        via = ",".join(p.via)
+        if p.pending is None:
+            out.write(f"{edge:<40} missing branch  ({via})\n")
+        elif p.pending == 0:
+            out.write(f"{edge:<40} up to date      ({via})\n")
+        else:
+            out.write(f"{edge:<40} {p.pending} pending  ({via})\n")
+            for sha, subject in p.commits:
+                out.write(f"    {sha[:10]} {subject}\n")
+    out.flush()
+
+    if any(p.pending for p in results):
+        raise typer.Exit(code=1)
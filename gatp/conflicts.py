@@ -0,0 +1,135 @@
+"""
+Pairwise conflict prediction for active flow branches.
+
+Every flow branch is merged in memory (`git merge-tree --write-tree`)
+against its flow target(s) and against every other flow branch; the
+merges run in a process pool. Results only depend on the two commits,
+so they are cached in .gatp/conflicts.json by (sha, sha) pair and a
+rerun only computes the pairs whose branches moved.
+"""
+
+import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from typing import NamedTuple, Optional
+
+from .cache import load_state, save_state
+
+# bump when the cache layout changes: older caches are ignored
+CACHE_VERSION = 2
+CACHE_NAME = "conflicts.json"
+
+
+class PairResult(NamedTuple):
+    source: str
+    target: str
+    kind: str  # "flow" (branch vs its target) or "pair" (branch vs branch)
+    paths: list[str]
+    error: Optional[str] = None
+
+    @property
+    def conflicted(self) -> bool:
+        return bool(self.paths)
+
+
+def _pair_key(a: str, b: str) -> str:
+    # the conflicting paths of a merge do not depend on its direction
+    return ":".join(sorted((a, b)))
+
+
+def conflicting_paths(cwd: str, ours: str, theirs: str) -> tuple[list[str], Optional[str]]:
+    """
+    Paths that conflict when merging `theirs` into `ours`, computed without
+    touching index or worktree. Runs in pool workers, hence module level
+    and plain subprocess. Returns (paths, error message or None).
+    """
+    proc = subprocess.run(
+        ["git", "merge-tree", "--write-tree", "--name-only", "--no-messages", "-z", ours, theirs],
+        cwd=cwd,
+        capture_output=True,
+    )
+    if proc.returncode not in (0, 1):
+        return [], proc.stderr.decode(errors="replace").strip()
+    _, *paths = proc.stdout.decode(errors="surrogateescape").split("\0")
+    return list(dict.fromkeys(p for p in paths if p)), None
+
+
+def _run_pair(args: tuple[str, str, str]):
+    return conflicting_paths(*args)
+
+
+def flow_branches(tree_manager, flows: Optional[list[str]] = None) -> dict[str, str]:
+    """Local branches belonging to a flow (optionally only `flows`) → sha."""
+    branches = {}
+    for ref, sha in sorted(tree_manager.repo.refs.refs("refs/heads/").items()):
+        branch = ref[len("refs/heads/") :]
+        flow = tree_manager.detect_flow(branch)
+        if flow is not None and (not flows or flow[0] in flows):
+            branches[branch] = sha
+    return branches
+
+
+def conflict_matrix(
+    tree_manager,
+    flows: Optional[list[str]] = None,
+    workers: Optional[int] = None,
+    use_cache: bool = True,
+) -> tuple[list[str], list[PairResult], int]:
+    """
+    Predict conflicts of every flow branch with its target(s) and with
+    every other flow branch. Returns (branches, results, pairs computed);
+    pairs served from the cache are not counted as computed.
+    """
+    repo = tree_manager.repo
+    branches = flow_branches(tree_manager, flows)
+
+    # (source, target, kind, source sha, target sha)
+    jobs = []
+    for branch, sha in branches.items():
+        _, flow = tree_manager.detect_flow(branch)
+        for target in flow.target.split(","):
+            target = target.strip()
+            target_sha = repo.refs.get(f"refs/heads/{target}")
+            if target_sha is not None:
+                jobs.append((branch, target, "flow", sha, target_sha))
+    for a, b in combinations(branches, 2):
+        jobs.append((a, b, "pair", branches[a], branches[b]))
+
+    cache_path = tree_manager.repo.state_dir / CACHE_NAME
+    cache = load_state(cache_path, CACHE_VERSION) if use_cache else {}
+    todo = sorted(
+        {
+            _pair_key(s_sha, t_sha): (t_sha, s_sha)
+            for _, _, _, s_sha, t_sha in jobs
+            if s_sha != t_sha and _pair_key(s_sha, t_sha) not in cache
+        }.items()
+    )
+
+    cwd = str(repo.repo_root)
+    if len(todo) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outcomes = pool.map(
+                _run_pair,
+                [(cwd, ours, theirs) for _, (ours, theirs) in todo],
+                chunksize=max(1, len(todo) // (4 * (workers or os.cpu_count() or 1))),
+            )
+            computed = dict(zip((key for key, _ in todo), outcomes))
+    else:
+        computed = {key: conflicting_paths(cwd, ours, theirs) for key, (ours, theirs) in todo}
+
+    results = []
+    for source, target, kind, s_sha, t_sha in jobs:
+        key = _pair_key(s_sha, t_sha)
+        if key in computed:
+            paths, error = computed[key]
+        else:
+            paths, error = cache.get(key, []), None
+        results.append(PairResult(source, target, kind, paths, error))
+
+    # failed merges (e.g. unrelated histories) are retried next time
+    cache.update({key: paths for key, (paths, error) in computed.items() if error is None})
+    if computed and use_cache:
+        live = {_pair_key(s, t) for *_, s, t in jobs}
+        save_state(cache_path, CACHE_VERSION, {key: cache[key] for key in cache if key in live})
+    return list(branches), results, len(computed)
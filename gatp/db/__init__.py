@@ -1,136 +1,338 @@
-from sqlalchemy import create_engine
+import atexit
+from contextlib import contextmanager
+from pathlib import Path
+
+from datetime import datetime
+from typing import Iterator, Optional
+
+from sqlalchemy import create_engine, event, func, inspect, select, tuple_
 from sqlalchemy.orm import sessionmaker
 
-from .models import Base, Trunk, Flow, Bind, Log, User
+from .models import Base, Trunk, Flow, Bind, Log, PullRequest, User
+from .logsink import LogSink, compact_logs, LOG_RETENTION_DAYS
+from ..policy import (
+    Policy,
+    db_key,
+    write_snapshot,
+    rekey_snapshot,
+    validate_topology,
+)
+
+# bump when models change: the schema is (re)created only on mismatch
+SCHEMA_VERSION = 3
+
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
 
 
 class DBStore:
     def __init__(self, db_path: str = ".gatp/config.db"):
+        self.db_path = Path(db_path)
+        # one engine and one session factory for the whole store lifetime
         self.engine = create_engine(f"sqlite:///{db_path}")
-        Base.metadata.create_all(self.engine)
-
-    def open(self):
-        Session = sessionmaker(bind=self.engine)
-        self.session = Session()
-
-    def close(self):
-        self.session.close()
+        event.listen(self.engine, "connect", _set_sqlite_pragmas)
+        self.Session = sessionmaker(bind=self.engine, expire_on_commit=False)
+
+        # unit of work state (see transaction())
+        self.session = None
+        self._depth = 0
+        self._policy_changed = False
+        self._written = False
+
+        self._ensure_schema()
+        atexit.register(self.dispose)
+
+        # buffered audit log writer (thread started on first add_log)
+        self.log_sink = LogSink(self)
+
+    def _ensure_schema(self):
+        with self.engine.begin() as conn:
+            version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+            if version != SCHEMA_VERSION:
+                Base.metadata.create_all(conn)
+                # create_all skips existing tables, indexes included
+                for table in Base.metadata.sorted_tables:
+                    for index in table.indexes:
+                        index.create(conn, checkfirst=True)
+                conn.exec_driver_sql(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    @contextmanager
+    def transaction(self):
+        """
+        Unit of work: every store call made inside the block shares one
+        session and is committed once when the outermost block exits
+        (rolled back on error). The policy snapshot is synced after that
+        single commit.
+        """
+        if self._depth == 0:
+            # DB state before this unit of work, to keep the policy snapshot valid
+            self._key_before = db_key(self.db_path)
+            self.session = self.Session()
+            self._policy_changed = self._written = False
+        self._depth += 1
+        try:
+            yield self.session
+            if self._depth == 1 and self._written:
+                self.session.commit()
+        except BaseException:
+            if self._depth == 1:
+                self.session.rollback()
+            raise
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                self.session.close()
+                self.session = None
+        if self._depth == 0 and self._written:
+            self._sync_snapshot(self._policy_changed)
+
+    def _write(self, policy: bool = False):
+        # mark the current unit of work as dirty
+        self._written = True
+        self._policy_changed |= policy
+
+    def dispose(self):
+        """
+        Close pooled connections. Closing the last WAL connection
+        checkpoints into the main DB file, so re-key the snapshot after it.
+        """
+        key_before = db_key(self.db_path)
+        self.engine.dispose()
+        rekey_snapshot(self.db_path, key_before)
 
     def is_initialized(self) -> bool:
         # check if tables exist
-        self.open()
-        inspector = self.engine.inspect(self.engine)
-        tables = inspector.get_table_names()
-        self.close()
+        tables = inspect(self.engine).get_table_names()
         required_tables = {"trunks", "flows", "binds", "logger"}
         return required_tables.issubset(set(tables))
 
+    ### COMPILED POLICY SNAPSHOT ###
+    def get_policy(self) -> Policy:
+        with self.transaction() as session:
+            return Policy.from_rows(
+                session.query(Trunk).all(),
+                session.query(Flow).all(),
+                session.query(Bind).all(),
+            )
+
+    def apply_policy(
+        self, policy: Policy, prune: bool = False, dry_run: bool = False
+    ) -> dict[str, list[str]]:
+        """
+        Diff `policy` against the DB and upsert every trunk, flow and bind
+        in a single transaction (idempotent: unchanged rows are not
+        touched). With `prune`, rows missing from `policy` are deleted.
+        Returns the names per action, e.g. {"added": ["trunk:main"], ...}.
+        """
+        validate_topology(policy)
+        changes = {"added": [], "updated": [], "removed": [], "unchanged": []}
+        with self.transaction() as session:
+            current = self.get_policy()
+            for model, wanted, existing, label in (
+                (Trunk, policy.trunks, current.trunks, "trunk"),
+                (Flow, policy.flows, current.flows, "flow"),
+                (Bind, policy.binds, current.binds, "bind"),
+            ):
+                for name, item in wanted.items():
+                    old = existing.get(name)
+                    if old == item:
+                        changes["unchanged"].append(f"{label}:{name}")
+                        continue
+                    changes["updated" if old else "added"].append(f"{label}:{name}")
+                    if not dry_run:
+                        session.merge(model(**vars(item)))
+                if prune:
+                    for name in existing.keys() - wanted.keys():
+                        changes["removed"].append(f"{label}:{name}")
+                        if not dry_run:
+                            session.query(model).filter_by(name=name).delete()
+            changed = changes["added"] or changes["updated"] or changes["removed"]
+            if changed and not dry_run:
+                self._write(policy=True)
+        return changes
+
+    def rebuild_snapshot(self) -> Policy:
+        """Recompile the policy snapshot next to the DB from the ORM tables."""
+        policy = self.get_policy()
+        write_snapshot(self.db_path, policy)
+        return policy
+
+    def _sync_snapshot(self, policy_changed: bool):
+        # called after every write commit
+        if policy_changed:
+            self.rebuild_snapshot()
+        else:
+            rekey_snapshot(self.db_path, self._key_before)
+
     ### ADD METHODS TO ADD/GET trunks, flows, binds, ... ###
+    def _add(self, model, policy: bool, **kwargs):
+        with self.transaction() as session:
+            session.add(model(**kwargs))
+            self._write(policy)
+
     def add_trunk(self, **kwargs):
-        self.open()
-        trunk = Trunk(**kwargs)
-        self.session.add(trunk)
-        self.session.commit()
-        self.close()
+        self._add(Trunk, policy=True, **kwargs)
 
     def add_flow(self, **kwargs):
-        self.open()
-        flow = Flow(**kwargs)
-        self.session.add(flow)
-        self.session.commit()
-        self.close()
+        self._add(Flow, policy=True, **kwargs)
 
     def add_bind(self, **kwargs):
-        self.open()
-        bind = Bind(**kwargs)
-        self.session.add(bind)
-        self.session.commit()
-        self.close()
+        self._add(Bind, policy=True, **kwargs)
 
     def add_log(self, **kwargs):
-        self.open()
-        log = Log(**kwargs)
-        self.session.add(log)
-        self.session.commit()
-        self.close()
+        # never blocks the command path: rows are batched by the log sink
+        self.log_sink.put(**kwargs)
+
+    def flush_logs(self):
+        self.log_sink.close()
+
+    def compact_logs(self, older_than_days: int = LOG_RETENTION_DAYS, **kwargs):
+        """Archive old `logger` rows into compressed segments and drop them."""
+        self.flush_logs()
+        return compact_logs(self, older_than_days, **kwargs)
 
     def add_user(self, **kwargs):
-        self.open()
-        user = User(**kwargs)
-        self.session.add(user)
-        self.session.commit()
-        self.close()
+        self._add(User, policy=False, **kwargs)
 
     ### GET METHODS FOR trunks, flows, binds, logs, ... ###
+    def _get(self, model, filter_by: dict = None):
+        with self.transaction() as session:
+            query = session.query(model)
+            if filter_by:
+                query = query.filter_by(**filter_by)
+            return query.all()
+
     def get_trunks(self, filter_by: dict = None):
-        self.open()
-        if filter_by:
-            out = self.session.query(Trunk).filter_by(**filter_by).all()
-        else:
-            out = self.session.query(Trunk).all()
-        self.close()
-        return out
+        return self._get(Trunk, filter_by)
 
     def get_flows(self, filter_by: dict = None):
-        self.open()
-        if filter_by:
-            out = self.session.query(Flow).filter_by(**filter_by).all()
-        else:
-            out = self.session.query(Flow).all()
-        self.close()
-        return out
+        return self._get(Flow, filter_by)
 
     def get_binds(self, filter_by: dict = None):
-        self.open()
-        if filter_by:
-            out = self.session.query(Bind).filter_by(**filter_by).all()
-        else:
-            out = self.session.query(Bind).all()
-        self.close()
-        return out
+        return self._get(Bind, filter_by)
 
     def get_logs(self, filter_by: dict = None):
-        self.open()
-        if filter_by:
-            out = self.session.query(Log).filter_by(**filter_by).all()
+        return self._get(Log, filter_by)
+
+    def iter_logs(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        user: Optional[str] = None,
+        level: Optional[str] = None,
+        after: Optional[tuple] = None,
+        descending: bool = False,
+        page_size: int = 1000,
+        after_id: Optional[int] = None,
+    ) -> Iterator:
+        """
+        Stream `logger` rows (id, timestamp, user, level, message) ordered
+        by (timestamp, id), with keyset pagination: each page is one
+        indexed range query starting after the last (timestamp, id) seen,
+        so memory stays flat and deep pages cost the same as the first.
+        `after` resumes from a previous (timestamp, id) key.
+
+        `after_id` instead streams rows inserted after row `after_id`, in
+        insertion (id) order, for tailing: the LogSink stamps rows when
+        they are logged but inserts them up to a flush interval later, so
+        a concurrent writer's rows can land behind a timestamp cursor.
+        It cannot be combined with `descending`.
+        """
+        if after_id is not None and descending:
+            raise ValueError("after_id streams in insertion order: descending is not supported")
+        self.flush_logs()
+        key = tuple_(Log.timestamp, Log.id)
+        query = select(Log.id, Log.timestamp, Log.user, Log.level, Log.message)
+        if since is not None:
+            query = query.where(Log.timestamp >= since)
+        if until is not None:
+            query = query.where(Log.timestamp < until)
+        if user is not None:
+            query = query.where(Log.user == user)
+        if level is not None:
+            query = query.where(Log.level == level)
+        if after_id is not None:
+            key, after = Log.id, after_id
+            query = query.order_by(Log.id)
+        elif descending:
+            query = query.order_by(Log.timestamp.desc(), Log.id.desc())
         else:
-            out = self.session.query(Log).all()
-        self.close()
-        return out
+            query = query.order_by(Log.timestamp, Log.id)
+
+        with self.Session() as session:
+            while True:
+                page = query
+                if after is not None:
+                    page = page.where(key < after if descending else key > after)
+                rows = session.execute(page.limit(page_size)).all()
+                yield from rows
+                if len(rows) < page_size:
+                    return
+                after = rows[-1].id if after_id is not None else (rows[-1].timestamp, rows[-1].id)
+
+    def last_log_id(self) -> int:
+        """Id of the newest `logger` row (0 if empty): a cursor for iter_logs(after_id=...)."""
+        self.flush_logs()
+        with self.Session() as session:
+            return session.scalar(select(func.max(Log.id))) or 0
 
     def get_users(self, filter_by: dict = None):
-        self.open()
-        if filter_by:
-            out = self.session.query(User).filter_by(**filter_by).all()
-        else:
-            out = self.session.query(User).all()
-        self.close()
-        return out
+        return self._get(User, filter_by)
+
+    ### PULL REQUEST STATE CACHE ###
+    def get_pr_states(self, pairs: list[tuple[str, str]]) -> dict:
+        """Cached PullRequest rows for (source, target) pairs, by pair."""
+        states = {}
+        with self.Session() as session:
+            # chunked to stay below SQLite's bound parameter limit
+            for i in range(0, len(pairs), 400):
+                rows = session.scalars(
+                    select(PullRequest).where(
+                        tuple_(PullRequest.source, PullRequest.target).in_(
+                            pairs[i : i + 400]
+                        )
+                    )
+                )
+                states.update({(r.source, r.target): r for r in rows})
+        return states
+
+    def put_pr_states(self, rows: list[dict]):
+        """Upsert PR state rows (source, target, pr_id, status, etag, fetched_at)."""
+        if not rows:
+            return
+        with self.transaction() as session:
+            for row in rows:
+                session.merge(PullRequest(**row))
+            self._write()
 
     ### DELETE METHODS FOR trunks, flows, binds, logs, users ... ###
+    def _delete(self, model, policy: bool, name: str):
+        with self.transaction() as session:
+            session.query(model).filter_by(name=name).delete()
+            self._write(policy)
+
     def delete_trunk(self, name: str):
-        self.open()
-        self.session.query(Trunk).filter_by(name=name).delete()
-        self.session.commit()
-        self.close()
+        self._delete(Trunk, policy=True, name=name)
 
     def delete_flow(self, name: str):
-        self.open()
-        self.session.query(Flow).filter_by(name=name).delete()
-        self.session.commit()
-        self.close()
+        self._delete(Flow, policy=True, name=name)
 
     def delete_bind(self, name: str):
-        self.open()
-        self.session.query(Bind).filter_by(name=name).delete()
-        self.session.commit()
-        self.close()
+        self._delete(Bind, policy=True, name=name)
 
     def delete_user(self, name: str):
-        self.open()
-        self.session.query(User).filter_by(name=name).delete()
-        self.session.commit()
-        self.close()
+        self._delete(User, policy=False, name=name)
 
 
 # # Previous sqlite3-based implementation (to be removed)
@@ -0,0 +1,144 @@
+import atexit
+import gzip
+import json
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import delete, insert, select
+
+from .models import Log
+from ..policy import db_key, rekey_snapshot
+
+# default retention for `logger` rows kept in the DB
+LOG_RETENTION_DAYS = 90
+
+_STOP = object()
+
+
+class LogSink:
+    """
+    Buffered, non-blocking writer for `logger` rows.
+    put() only enqueues; a daemon thread inserts the rows in batches,
+    flushing when `max_batch` rows are pending, when `flush_interval`
+    seconds have passed, and at interpreter exit.
+    """
+
+    def __init__(self, store, max_batch: int = 500, flush_interval: float = 1.0):
+        self.store = store
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def put(self, **kwargs):
+        kwargs.setdefault("timestamp", datetime.utcnow())
+        if self._thread is None or not self._thread.is_alive():
+            self._start()
+        self._queue.put(kwargs)
+
+    def _start(self):
+        # (re)start the writer thread: close() stops it after a flush
+        with self._lock:
+            if self._thread is None:
+                atexit.register(self.close)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="gatp-log-sink", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                self._write(batch)
+                return
+            if item is not None:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if len(batch) >= self.max_batch or (
+                batch and time.monotonic() >= deadline
+            ):
+                self._write(batch)
+                batch, deadline = [], None
+
+    def _write(self, batch: list[dict]):
+        if not batch:
+            return
+        key_before = db_key(self.store.db_path)
+        # own session: the store's unit of work belongs to the command thread
+        with self.store.Session.begin() as session:
+            session.execute(insert(Log), batch)
+        rekey_snapshot(self.store.db_path, key_before)
+
+    def close(self):
+        """Flush everything still queued and stop the writer thread."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+
+def compact_logs(
+    store,
+    older_than_days: int = LOG_RETENTION_DAYS,
+    archive_dir: Path = None,
+    chunk_size: int = 5000,
+    vacuum: bool = True,
+) -> tuple[int, Path | None]:
+    """
+    Move `logger` rows older than `older_than_days` into a gzip JSON
+    Lines segment under `archive_dir` (default: .gatp/logs next to the
+    DB), then delete them. Rows are streamed in id order, chunk by chunk.
+    Returns (rows archived, segment path).
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    archive_dir = Path(archive_dir or store.db_path.with_name("logs"))
+
+    count, last_id = 0, 0
+    segment = archive_dir / f"logger-{cutoff:%Y%m%d%H%M%S}.jsonl.gz"
+    tmp = segment.with_name(segment.name + ".tmp")
+    with store.Session() as session:
+        while True:
+            rows = session.execute(
+                select(Log.id, Log.timestamp, Log.user, Log.level, Log.message)
+                .where(Log.timestamp < cutoff, Log.id > last_id)
+                .order_by(Log.id)
+                .limit(chunk_size)
+            ).all()
+            if not rows:
+                break
+            if count == 0:
+                archive_dir.mkdir(parents=True, exist_ok=True)
+                fh = gzip.open(tmp, "wt", encoding="utf-8")
+            for row in rows:
+                record = row._asdict()
+                record["timestamp"] = record["timestamp"].isoformat()
+                fh.write(json.dumps(record) + "\n")
+            count += len(rows)
+            last_id = rows[-1].id
+    if count == 0:
+        return 0, None
+    fh.close()
+    tmp.replace(segment)
+
+    # rows are only deleted once the segment is safely on disk
+    with store.transaction() as session:
+        session.execute(delete(Log).where(Log.timestamp < cutoff, Log.id <= last_id))
+        store._write()
+    if vacuum:
+        key_before = db_key(store.db_path)
+        with store.engine.connect() as conn:
+            conn.exec_driver_sql("VACUUM")
+        rekey_snapshot(store.db_path, key_before)
+    return count, segment
@@ -1,4 +1,13 @@
-from sqlalchemy import Column, Integer, String, Boolean, Text, ForeignKey, DATETIME
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    Boolean,
+    Text,
+    ForeignKey,
+    DATETIME,
+    Index,
+)
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
@@ -48,8 +57,25 @@ class Bind(Base):
 
 class Log(Base):
     __tablename__ = "logger"
+    # (filter, timestamp) indexes back the keyset-paginated log queries
+    __table_args__ = (
+        Index("ix_logger_timestamp", "timestamp"),
+        Index("ix_logger_user_timestamp", "user", "timestamp"),
+        Index("ix_logger_level_timestamp", "level", "timestamp"),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     timestamp = Column(DATETIME, default=datetime.utcnow)
     user = Column(String)
     level = Column(String)
     message = Column(Text)
+
+
+class PullRequest(Base):
+    __tablename__ = "pull_requests"
+    # local cache of provider PR state, one row per (source, target)
+    source = Column(String, primary_key=True)
+    target = Column(String, primary_key=True)
+    pr_id = Column(Integer)  # None: no PR found
+    status = Column(String)  # active | completed | abandoned | none
+    etag = Column(String)
+    fetched_at = Column(DATETIME, default=datetime.utcnow)
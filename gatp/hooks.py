@@ -0,0 +1,229 @@
+"""
+Git hook entry points enforcing the trunk/flow policy.
+
+Installed hooks run `python -I -S` on this module rather than the `gatp`
+CLI: git starts hooks at the top of the worktree (or in the bare
+repository), so the compiled policy snapshot is read straight from
+.gatp/ with builtin modules only (posix, marshal). Only a missing or
+stale snapshot takes the TreeManager path, which rebuilds it. Keep
+module-level imports to builtin modules (not even os).
+"""
+
+from __future__ import annotations
+
+import sys
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from pathlib import Path
+    from typing import Iterable, Optional
+
+    from .snapshot import BranchMatcher
+
+HOOK_MARKER = "# installed by gatp"
+HOOK_KINDS = ("pre-push", "update")
+# latency budget for one hook invocation, in milliseconds
+HOOK_BUDGET_MS = 20
+
+
+def _is_zero(sha: str) -> bool:
+    return not sha.strip("0")
+
+
+class _Record:
+    # attribute view of a snapshot dict (types.SimpleNamespace costs an import)
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+def hook_matcher(repo_root: str = ".") -> BranchMatcher:
+    """
+    Trunk/flow matcher for a hook. Built from the fresh snapshot in
+    `repo_root` when there is one; otherwise (no setup yet, stale
+    snapshot, repository discovery needed) through TreeManager.
+    """
+    from .snapshot import BranchMatcher, fresh_policy_data
+
+    data = fresh_policy_data(f"{repo_root}/.gatp/config.db")
+    if data and data.get("trunks"):
+
+        def by_name(items):
+            return {item["name"]: _Record(**item) for item in items}
+
+        return BranchMatcher(
+            _Record(trunks=by_name(data["trunks"]), flows=by_name(data.get("flows", [])))
+        )
+
+    if sys.flags.no_site:
+        # slow path under `python -S`: SQLAlchemy & co. live in site-packages
+        import site
+
+        site.main()
+    from .tree_manager import TreeManager
+
+    return TreeManager(repo_root).matcher
+
+
+def check_updates(
+    matcher: BranchMatcher, updates: Iterable[tuple[str, str, str]]
+) -> list[str]:
+    """
+    Check (ref, old sha, new sha) updates against the policy in one pass.
+    Returns one message per rejected update (empty list: push allowed).
+    Only branches are checked; trunks can never be deleted and only
+    accept direct updates if `allow_push` is set.
+    """
+    rejected = []
+    for ref, old, new in updates:
+        if not ref.startswith("refs/heads/"):
+            continue
+        branch = ref[len("refs/heads/") :]
+        trunk = matcher.trunk(branch)
+        if trunk is None:
+            continue
+        if _is_zero(new):
+            rejected.append(f"deleting trunk '{branch}' is not allowed")
+        elif not trunk.allow_push:
+            how = "via a pull request" if trunk.require_pr else "through gatp"
+            rejected.append(
+                f"direct push to trunk '{branch}' is not allowed; merge {how}"
+            )
+    return rejected
+
+
+def _report(rejected: list[str]) -> int:
+    for message in rejected:
+        sys.stderr.write(f"gatp: {message}\n")
+    return 1 if rejected else 0
+
+
+def pre_push(argv: list[str], stdin=None) -> int:
+    """
+    Client side: `pre-push <remote> <url>`, with one
+    `<local ref> <local sha> <remote ref> <remote sha>` line per ref on stdin.
+    """
+    stdin = stdin or sys.stdin
+    updates = []
+    for line in stdin:
+        parts = line.split()
+        if len(parts) == 4:
+            _, local_sha, remote_ref, remote_sha = parts
+            updates.append((remote_ref, remote_sha, local_sha))
+    return _report(check_updates(hook_matcher(), updates))
+
+
+def update(argv: list[str]) -> int:
+    """Server side: `update <ref> <old sha> <new sha>`, once per updated ref."""
+    if len(argv) != 3:
+        sys.stderr.write("usage: update <ref> <old> <new>\n")
+        return 2
+    ref, old, new = argv
+    return _report(check_updates(hook_matcher(), [(ref, old, new)]))
+
+
+def install(
+    kind: str = "pre-push", repo_path: str = ".", force: bool = False
+) -> Path:
+    """Write the `kind` hook script into the repository hooks directory."""
+    import shlex
+
+    from .repository import discover_repository
+
+    if kind not in HOOK_KINDS:
+        raise ValueError(f"Unknown hook '{kind}' ({'|'.join(HOOK_KINDS)})")
+    _, _, common_dir = discover_repository(repo_path)
+    hook = common_dir / "hooks" / kind
+    if hook.exists() and HOOK_MARKER not in hook.read_text() and not force:
+        raise FileExistsError(f"{hook} exists and was not installed by gatp")
+
+    hook.parent.mkdir(parents=True, exist_ok=True)
+    command = " ".join(shlex.quote(arg) for arg in hook_command(kind))
+    hook.write_text(f'#!/bin/sh\n{HOOK_MARKER}\nexec {command} "$@"\n')
+    hook.chmod(0o755)
+    return hook
+
+
+def hook_command(kind: str) -> list[str]:
+    """
+    Command line of an installed hook. `-I -S` skips site-packages, user
+    site and PYTHON* variables (most of the interpreter start-up); gatp is
+    found through its install location instead.
+    """
+    import os
+
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = (
+        f"import sys; sys.path.insert(0, {package_root!r}); "
+        "from gatp.hooks import main; sys.exit(main())"
+    )
+    return [sys.executable, "-I", "-S", "-c", code, kind]
+
+
+def benchmark(
+    repo_path: str = ".", runs: int = 30, refs: int = 100
+) -> dict[str, float]:
+    """
+    Time the pre-push hook on `refs` synthetic ref updates.
+    `check_ms` is the in-process cost (policy load + checks);
+    `process_ms` runs the installed hook's command line, interpreter
+    start included: that is what every push pays.
+    Values are medians in milliseconds.
+    """
+    import os
+    import statistics
+    import subprocess
+    import time
+
+    zero = "0" * 40
+    sha = "1" * 40
+    lines = [
+        f"refs/heads/feature/b{i} {sha} refs/heads/feature/b{i} {zero}\n"
+        for i in range(refs)
+    ]
+    lines.append(f"refs/heads/main {sha} refs/heads/main {sha}\n")
+
+    cwd = os.getcwd()
+    os.chdir(repo_path)
+    try:
+        check = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            updates = []
+            for line in lines:
+                _, local_sha, remote_ref, remote_sha = line.split()
+                updates.append((remote_ref, remote_sha, local_sha))
+            check_updates(hook_matcher(), updates)
+            check.append((time.perf_counter() - start) * 1000)
+
+        process = []
+        payload = "".join(lines).encode()
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run(
+                [*hook_command("pre-push"), "origin", "bench"],
+                input=payload,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            process.append((time.perf_counter() - start) * 1000)
+    finally:
+        os.chdir(cwd)
+
+    return {
+        "check_ms": statistics.median(check),
+        "process_ms": statistics.median(process),
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in HOOK_KINDS:
+        sys.stderr.write(f"usage: python -m gatp.hooks {'|'.join(HOOK_KINDS)} ...\n")
+        return 2
+    if argv[0] == "pre-push":
+        return pre_push(argv[1:])
+    return update(argv[1:])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
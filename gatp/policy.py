@@ -0,0 +1,180 @@
+import json
+import os
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Optional
+
+# snapshot and matcher live in an import-light module (used by the git hooks)
+from .snapshot import (  # noqa: F401  (re-exported)
+    SNAPSHOT_NAME,
+    SNAPSHOT_VERSION,
+    REGEX_PREFIX,
+    BranchMatcher,
+    db_key,
+    dump_snapshot,
+    fresh_policy_data,
+    is_pattern,
+    read_snapshot,
+    snapshot_path,
+)
+
+
+@dataclass
+class TrunkPolicy:
+    name: str
+    allow_push: bool = False
+    require_pr: bool = True
+    deprecated: bool = False
+    default_branch: bool = False
+    sync_with: Optional[str] = None  # list, es. 'develop,release'
+
+
+@dataclass
+class FlowPolicy:
+    name: str
+    prefix: str
+    parent: str
+    target: str  # list, es. 'develop,main'
+    max_lifetime_days: Optional[int] = None
+    auto_delete: bool = False
+    allow_push: bool = False
+    require_pr: bool = True
+
+
+@dataclass
+class BindPolicy:
+    name: str
+    parent: str
+    target: str
+    mode: str
+    tag: bool = True
+    conflict_policy: str = "block"
+    schedule: str = "on_push"
+
+
+class Policy:
+    """
+    Plain, ORM-free view of trunks, flows and binds.
+    This is what TreeManager works with; it is loaded from the compiled
+    snapshot next to config.db and only rebuilt from SQLAlchemy when the
+    snapshot is missing or stale.
+    """
+
+    def __init__(
+        self,
+        trunks: dict[str, TrunkPolicy],
+        flows: dict[str, FlowPolicy],
+        binds: dict[str, BindPolicy],
+    ):
+        self.trunks = trunks
+        self.flows = flows
+        self.binds = binds
+
+    @classmethod
+    def from_rows(cls, trunks, flows, binds) -> "Policy":
+        """Build from ORM rows (anything exposing the policy attributes)."""
+        return cls(
+            {t.name: _copy(TrunkPolicy, t) for t in trunks},
+            {f.name: _copy(FlowPolicy, f) for f in flows},
+            {b.name: _copy(BindPolicy, b) for b in binds},
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "trunks": [asdict(t) for t in self.trunks.values()],
+            "flows": [asdict(f) for f in self.flows.values()],
+            "binds": [asdict(b) for b in self.binds.values()],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Policy":
+        return cls(
+            {t["name"]: TrunkPolicy(**t) for t in data.get("trunks", [])},
+            {f["name"]: FlowPolicy(**f) for f in data.get("flows", [])},
+            {b["name"]: BindPolicy(**b) for b in data.get("binds", [])},
+        )
+
+
+def _copy(kind, row):
+    return kind(**{name: getattr(row, name) for name in kind.__dataclass_fields__})
+
+
+# ---------------------- TOPOLOGY FILES ----------------------
+def load_topology(path: Path) -> Policy:
+    """Read a declarative topology file (.toml, or JSON otherwise)."""
+    path = Path(path)
+    if path.suffix == ".toml":
+        import tomllib
+
+        with open(path, "rb") as fh:
+            data = tomllib.load(fh)
+    else:
+        with open(path, "rb") as fh:
+            data = json.loads(fh.read())
+    return Policy.from_dict(data)
+
+
+def dump_topology(policy: Policy, format: str = "json") -> str:
+    data = policy.to_dict()
+    if format == "json":
+        return json.dumps(data, indent=2) + "\n"
+    if format == "toml":
+        # arrays of tables; TOML has no null, so unset values are omitted
+        lines = []
+        for section, items in data.items():
+            for item in items:
+                lines.append(f"[[{section}]]")
+                for key, value in item.items():
+                    if value is not None:
+                        lines.append(f"{key} = {json.dumps(value)}")
+                lines.append("")
+        return "\n".join(lines)
+    raise ValueError(f"Unknown topology format '{format}' (json|toml)")
+
+
+def validate_topology(policy: Policy):
+    """
+    Flows and binds may only point at configured trunks, and glob/regex
+    trunk names must compile (see BranchMatcher).
+    """
+    BranchMatcher(policy)
+    for kind, items in (("flow", policy.flows), ("bind", policy.binds)):
+        for name, item in items.items():
+            for trunk in [item.parent, *item.target.split(",")]:
+                if trunk.strip() not in policy.trunks:
+                    raise ValueError(
+                        f"{kind} '{name}' references unknown trunk '{trunk}'"
+                    )
+
+
+# ---------------------- SNAPSHOT ----------------------
+def load_snapshot(db_path: Path) -> Optional[Policy]:
+    """Compiled policy for `db_path`, or None if missing or stale."""
+    data = fresh_policy_data(db_path)
+    return Policy.from_dict(data) if data is not None else None
+
+
+def write_snapshot(db_path: Path, policy: Policy):
+    """Atomically (re)write the compiled policy, keyed on the current DB state."""
+    path = Path(snapshot_path(db_path))
+    data = {
+        "version": SNAPSHOT_VERSION,
+        "key": db_key(db_path),
+        "policy": policy.to_dict(),
+    }
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(dump_snapshot(data))
+    os.replace(tmp, path)
+
+
+def rekey_snapshot(db_path: Path, previous_key: Optional[list]) -> bool:
+    """
+    Refresh the key of a snapshot after a write that did not touch the
+    policy tables (users, logs), so it stays valid. Only done if the
+    snapshot matched the DB as it was before that write.
+    """
+    data = read_snapshot(db_path)
+    if data is None or data.get("key") != previous_key:
+        return False
+    write_snapshot(db_path, Policy.from_dict(data["policy"]))
+    return True
@@ -0,0 +1,128 @@
+"""
+Local PR state, cached in the `pull_requests` table of config.db.
+
+Commands ask "is there a PR from X to Y, and in which state?" for one
+or thousands of branches. Fresh rows (younger than the TTL) answer
+locally; stale rows with a known PR are revalidated with conditional
+GETs (If-None-Match, 304 = unchanged); branches without a known PR are
+looked up by source branch. Both refreshes go through the provider's
+concurrent bulk APIs.
+"""
+
+from datetime import datetime, timedelta
+from typing import Iterable, NamedTuple, Optional
+
+from .provider_api import run_bulk
+
+# seconds a cached PR state is trusted without asking the provider
+PR_CACHE_TTL = 300
+NO_PR = "none"
+# the provider could not be asked: never stored, callers must not assume "no PR"
+UNKNOWN = "unknown"
+
+
+class PRState(NamedTuple):
+    source: str
+    target: str
+    pr_id: Optional[int]
+    status: str  # active | completed | abandoned | none | unknown
+    etag: Optional[str]
+    fetched_at: datetime
+
+    @property
+    def is_open(self) -> bool:
+        return self.status == "active"
+
+    @property
+    def is_unknown(self) -> bool:
+        return self.status == UNKNOWN
+
+
+def _branch(ref: str) -> str:
+    return ref[len("refs/heads/") :] if ref.startswith("refs/heads/") else ref
+
+
+class PRCache:
+    def __init__(self, store, provider, ttl: int = PR_CACHE_TTL):
+        self.store = store
+        self.provider = provider
+        self.ttl = timedelta(seconds=ttl)
+
+    def lookup(
+        self, pairs: Iterable[tuple[str, str]], refresh: bool = False
+    ) -> dict[tuple[str, str], PRState]:
+        """
+        PR state per (source, target); only stale entries hit the provider.
+        Pairs the provider failed to answer get an UNKNOWN state (not cached).
+        """
+        pairs = list(dict.fromkeys(pairs))
+        now = datetime.utcnow()
+        states = {
+            key: PRState(row.source, row.target, row.pr_id, row.status, row.etag, row.fetched_at)
+            for key, row in self.store.get_pr_states(pairs).items()
+        }
+        stale = [
+            key
+            for key in pairs
+            if refresh or key not in states or now - states[key].fetched_at > self.ttl
+        ]
+        if not stale:
+            return states
+
+        updates = []
+        # known PRs: revalidate, a 304 only refreshes fetched_at
+        known = {states[key].pr_id: key for key in stale if key in states and states[key].pr_id}
+        fetched = run_bulk(
+            lambda pr_id: self.provider.fetch_pr(pr_id, states[known[pr_id]].etag),
+            known,
+            self.provider.concurrency,
+        )
+        for pr_id, (pr, etag) in fetched.results.items():
+            old = states[known[pr_id]]
+            status = pr["status"] if pr is not None else old.status
+            updates.append(old._replace(status=status, etag=etag, fetched_at=now))
+
+        # unknown (or failed) pairs: search active PRs by source branch
+        unknown = [key for key in stale if key not in states or not states[key].pr_id]
+        unknown += [known[pr_id] for pr_id in fetched.errors]
+        listed = self.provider.list_prs_by_source({source for source, _ in unknown})
+        failed = {}
+        for source, target in unknown:
+            if source not in listed.results:
+                failed[source, target] = PRState(source, target, None, UNKNOWN, None, now)
+                continue
+            match = next(
+                (pr for pr in listed.results[source] if _branch(pr.get("targetRefName", "")) == target),
+                None,
+            )
+            if match is None:
+                updates.append(PRState(source, target, None, NO_PR, None, now))
+            else:
+                updates.append(
+                    PRState(source, target, match["pullRequestId"], match["status"], None, now)
+                )
+
+        self.store.put_pr_states([u._asdict() for u in updates])
+        states.update({(u.source, u.target): u for u in updates})
+        states.update(failed)
+        return states
+
+    def open_pr(self, source: str, target: str) -> Optional[PRState]:
+        """The open PR from `source` to `target`, if any; raises if the provider failed."""
+        state = self.lookup([(source, target)]).get((source, target))
+        if state is not None and state.is_unknown:
+            raise RuntimeError(
+                f"Could not check for an open PR from '{source}' to '{target}': provider lookup failed"
+            )
+        return state if state is not None and state.is_open else None
+
+    def record(self, source: str, target: str, pr: dict):
+        """Store a PR the command just created, so reruns see it without an API call."""
+        self.store.put_pr_states(
+            [
+                PRState(
+                    source, target, pr.get("pullRequestId"), pr.get("status", "active"),
+                    None, datetime.utcnow(),
+                )._asdict()
+            ]
+        )
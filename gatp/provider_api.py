@@ -1,26 +1,144 @@
 # azure_provider.py
 import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+API_VERSION = "7.1-preview.1"
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (5, 30)
+# throttling and transient gateway errors; Retry-After is honoured
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# the only ones a non-idempotent request (POST/PATCH) is replayed on: the
+# request was refused, not applied. A 500/502/504 may come back after the
+# PR was created, and a replay would create a duplicate.
+REPLAY_STATUSES = (429, 503)
+# concurrent requests of the bulk APIs (kept <= the connection pool size)
+DEFAULT_CONCURRENCY = 8
+PAGE_SIZE = 100
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class _ProviderRetry(Retry):
+    def is_retry(self, method: str, status_code: int, has_retry_after: bool = False) -> bool:
+        if method.upper() not in Retry.DEFAULT_ALLOWED_METHODS and status_code not in REPLAY_STATUSES:
+            return False
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+def _retry_policy(retries: int = 5, backoff: float = 0.5) -> Retry:
+    return _ProviderRetry(
+        total=retries,
+        # connection never established: nothing was sent, safe for every verb
+        connect=retries,
+        # a request whose response was lost may have been applied: no blind replays
+        read=0,
+        status=retries,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=None,  # per verb in _ProviderRetry.is_retry
+        backoff_factor=backoff,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+
+def shared_session() -> requests.Session:
+    """
+    Process-wide keep-alive session: every provider call reuses the same
+    connection pool (one TLS handshake per host), with retries built in.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=2 * DEFAULT_CONCURRENCY,
+                max_retries=_retry_policy(),
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+class BulkResult(NamedTuple):
+    results: dict  # item → API result
+    errors: dict  # item → exception, for the items that failed
+
+
+def run_bulk(
+    fn: Callable, items: Iterable, concurrency: int = DEFAULT_CONCURRENCY
+) -> BulkResult:
+    """
+    Call `fn(item)` for every item on a bounded thread pool. One failure
+    does not stop the others: it is reported in `errors`.
+    """
+    items = list(dict.fromkeys(items))
+    results, errors = {}, {}
+    if not items:
+        return BulkResult(results, errors)
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(items)))) as pool:
+        futures = {item: pool.submit(fn, item) for item in items}
+        for item, future in futures.items():
+            try:
+                results[item] = future.result()
+            except Exception as e:
+                errors[item] = e
+    return BulkResult(results, errors)
 
 
 class AzureDevOpsProvider:
-    def __init__(self, organization: str, project: str, repository: str, pat: str):
+    def __init__(
+        self,
+        organization: str,
+        project: str,
+        repository: str,
+        pat: str,
+        base_url: str = None,
+        timeout=DEFAULT_TIMEOUT,
+        session: requests.Session = None,
+        concurrency: int = DEFAULT_CONCURRENCY,
+    ):
         self.organization = organization
         self.project = project
         self.repository = repository
+        self.timeout = timeout
+        self.session = session or shared_session()
+        self.concurrency = concurrency
 
         # encode PAT
         token = f":{pat}".encode("utf-8")
         self.auth_header = base64.b64encode(token).decode("utf-8")
 
-        self.base_url = (
-            f"https://dev.azure.com/{organization}/{project}"
-            f"/_apis/git/repositories/{repository}"
+        # base_url: point at another server (on-prem Azure DevOps Server, local stand-in)
+        self.base_url = (base_url or "https://dev.azure.com").rstrip("/") + (
+            f"/{organization}/{project}/_apis/git/repositories/{repository}"
         )
 
-    def create_pr(self, source: str, target: str, title: str, description: str = ""):
-        url = f"{self.base_url}/pullrequests?api-version=7.1-preview.1"
+    def _request(self, method: str, path: str, **kwargs) -> requests.Response:
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Basic {self.auth_header}",
+            **kwargs.pop("headers", {}),
+        }
+        params = {"api-version": API_VERSION, **kwargs.pop("params", {})}
+        return self.session.request(
+            method,
+            f"{self.base_url}/{path}",
+            headers=headers,
+            params=params,
+            timeout=self.timeout,
+            **kwargs,
+        )
 
+    def create_pr(self, source: str, target: str, title: str, description: str = ""):
         payload = {
             "sourceRefName": f"refs/heads/{source}",
             "targetRefName": f"refs/heads/{target}",
@@ -28,12 +146,7 @@ class AzureDevOpsProvider:
             "description": description,
         }
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Basic {self.auth_header}",
-        }
-
-        response = requests.post(url, json=payload, headers=headers)
+        response = self._request("POST", "pullrequests", json=payload)
 
         if response.status_code not in (200, 201):
             raise RuntimeError(
@@ -41,3 +154,89 @@ class AzureDevOpsProvider:
             )
 
         return response.json()
+
+    # ---------------------- QUERIES ----------------------
+    def get_pr(self, pr_id: int) -> dict:
+        return self.fetch_pr(pr_id)[0]
+
+    def fetch_pr(self, pr_id: int, etag: Optional[str] = None) -> tuple[Optional[dict], Optional[str]]:
+        """
+        Conditional GET: (PR, ETag), or (None, etag) if the PR did not
+        change since `etag` (304, nothing transferred).
+        """
+        headers = {"If-None-Match": etag} if etag else {}
+        response = self._request("GET", f"pullrequests/{pr_id}", headers=headers)
+        if response.status_code == 304:
+            return None, etag
+        if response.status_code != 200:
+            raise RuntimeError(
+                f"Azure PR {pr_id} lookup failed {response.status_code}: {response.text}"
+            )
+        return response.json(), response.headers.get("ETag")
+
+    def iter_prs(
+        self,
+        source: Optional[str] = None,
+        target: Optional[str] = None,
+        status: str = "active",
+        page_size: int = PAGE_SIZE,
+    ) -> Iterator[dict]:
+        """
+        Stream PRs matching the criteria, page by page. Follows the
+        `x-ms-continuationtoken` header when the service sends one,
+        `$skip` paging otherwise.
+        """
+        params = {"searchCriteria.status": status, "$top": page_size}
+        if source:
+            params["searchCriteria.sourceRefName"] = f"refs/heads/{source}"
+        if target:
+            params["searchCriteria.targetRefName"] = f"refs/heads/{target}"
+
+        skip = 0
+        while True:
+            response = self._request("GET", "pullrequests", params=params)
+            if response.status_code != 200:
+                raise RuntimeError(
+                    f"Azure PR query failed {response.status_code}: {response.text}"
+                )
+            page = response.json().get("value", [])
+            yield from page
+
+            token = response.headers.get("x-ms-continuationtoken")
+            if token:
+                params["continuationToken"] = token
+            elif len(page) >= page_size:
+                skip += len(page)
+                params["$skip"] = skip
+            else:
+                return
+
+    def list_prs(self, **criteria) -> list[dict]:
+        return list(self.iter_prs(**criteria))
+
+    # ---------------------- BULK ----------------------
+    def create_prs(
+        self, specs: Iterable[tuple[str, str, str]], description: str = ""
+    ) -> BulkResult:
+        """Create one PR per (source, target, title), concurrently."""
+        return run_bulk(
+            lambda spec: self.create_pr(*spec, description=description),
+            specs,
+            self.concurrency,
+        )
+
+    def list_prs_by_source(
+        self, branches: Iterable[str], status: str = "active"
+    ) -> BulkResult:
+        """PRs (list) for each source branch, concurrently."""
+        return run_bulk(
+            lambda branch: self.list_prs(source=branch, status=status),
+            branches,
+            self.concurrency,
+        )
+
+    def get_pr_statuses(self, pr_ids: Iterable[int]) -> BulkResult:
+        """Status (active/completed/abandoned) for each PR id, concurrently."""
+        return run_bulk(
+            lambda pr_id: self.get_pr(pr_id)["status"], pr_ids, self.concurrency
+        )
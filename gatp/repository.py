@@ -1,30 +1,376 @@
 # local_git.py
-import git
-from typing import Optional, Tuple
+import json
+import os
+import subprocess
+import time
+import weakref
+from contextlib import contextmanager
+from functools import cached_property
+from typing import Iterable, Iterator, NamedTuple, Optional, Tuple
 from pathlib import Path
 
 
 class MergeConflictError(Exception):
+    def __init__(self, message: str, paths: list[str] = (), worktree: Path = None):
+        super().__init__(message)
+        self.paths = list(paths)
+        # gatp worktree where the conflict is waiting to be resolved, if any
+        self.worktree = worktree
+
+
+class MergeResult(NamedTuple):
+    kind: str  # "up-to-date" | "fast-forward" | "merge" | "conflict"
+    commit: Optional[str]  # new tip of the target (None for predictions/conflicts)
+    conflicts: list[str]
+
+
+class CommitRecord(NamedTuple):
+    sha: str
+    parents: list[str]
+    author: str
+    email: str
+    timestamp: int  # committer date, unix seconds
+    subject: str
+    body: Optional[str] = None  # only when requested
+
+
+class DiffStat(NamedTuple):
+    path: str
+    added: Optional[int]  # None for binary files
+    deleted: Optional[int]
+    old_path: Optional[str] = None  # renames/copies only
+
+
+class BlameHunk(NamedTuple):
+    start: int  # first line in the blamed revision (1-based)
+    count: int
+    commit: str
+    orig_start: int  # first line in `commit`
+    orig_path: str  # path in `commit` (differs after renames)
+    author: str
+    email: str
+    timestamp: int  # author date, unix seconds
+    summary: str
+
+
+# git log --format: unit separator between fields, NUL between records (-z)
+_LOG_FIELDS = "%H%x1f%P%x1f%an%x1f%ae%x1f%ct%x1f%s"
+
+
+class NotAGitRepositoryError(Exception):
     pass
 
 
+# a ref fetched less than this many seconds ago is considered current
+FETCH_MAX_AGE = 30
+FETCH_STATE_NAME = "fetch.json"
+FETCH_STATE_VERSION = 1
+
+# number of git subprocesses spawned by this interpreter (gatp + GitPython)
+_spawn_count = 0
+
+
+def spawn_count() -> int:
+    """Number of git processes spawned so far by the current command."""
+    return _spawn_count
+
+
+_repo_class = None
+
+
+def _open_repo(path: Path):
+    """
+    GitPython Repo whose command wrapper counts every spawned process.
+    GitPython is imported here, on first use, so commands that never
+    touch it (help, completion, policy reads) do not pay for it.
+    """
+    global _repo_class
+    if _repo_class is None:
+        import git
+
+        class _CountingGit(git.Git):
+            __slots__ = ()
+
+            def execute(self, *args, **kwargs):
+                global _spawn_count
+                _spawn_count += 1
+                return super().execute(*args, **kwargs)
+
+        class _Repo(git.Repo):
+            GitCommandWrapperType = _CountingGit
+
+        _repo_class = _Repo
+    return _repo_class(path)
+
+
+class ObjectReader:
+    """
+    Long-lived `git cat-file --batch` / `--batch-check` processes.
+    Both are started on first use and reused for every later read,
+    so resolving N refs or reading N objects costs one fork, not N.
+    """
+
+    def __init__(self, cwd: Path):
+        self.cwd = cwd
+        self._procs = {}
+
+    def _process(self, mode: str) -> subprocess.Popen:
+        global _spawn_count
+        proc = self._procs.get(mode)
+        if proc is None or proc.poll() is not None:
+            _spawn_count += 1
+            proc = subprocess.Popen(
+                ["git", "cat-file", f"--{mode}"],
+                cwd=self.cwd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+            self._procs[mode] = proc
+            weakref.finalize(self, _close_process, proc)
+        return proc
+
+    @staticmethod
+    def _header(proc: subprocess.Popen, rev: str) -> Optional[Tuple[str, str, int]]:
+        if "\n" in rev:
+            raise ValueError(f"Invalid revision: {rev!r}")
+        proc.stdin.write(rev.encode() + b"\n")
+        proc.stdin.flush()
+        parts = proc.stdout.readline().split()
+        # "<rev> missing" / "<rev> ambiguous": <rev> itself may contain spaces
+        if not parts or parts[-1] in (b"missing", b"ambiguous"):
+            return None
+        return parts[0].decode(), parts[1].decode(), int(parts[2])
+
+    def info(self, rev: str) -> Optional[Tuple[str, str, int]]:
+        """(sha, type, size) of `rev`, or None if it does not resolve."""
+        return self._header(self._process("batch-check"), rev)
+
+    def read(self, rev: str) -> Optional[Tuple[str, str, bytes]]:
+        """(sha, type, raw content) of `rev`, or None if it does not resolve."""
+        proc = self._process("batch")
+        header = self._header(proc, rev)
+        if header is None:
+            return None
+        sha, kind, size = header
+        data = proc.stdout.read(size)
+        proc.stdout.read(1)  # trailing LF
+        return sha, kind, data
+
+    def close(self):
+        for proc in self._procs.values():
+            _close_process(proc)
+        self._procs.clear()
+
+
+def _close_process(proc: subprocess.Popen):
+    if proc.poll() is None:
+        proc.stdin.close()
+        proc.wait()
+
+
+def discover_repository(path: str) -> Tuple[Path, Path, Path]:
+    """
+    Find (repo_root, git_dir, common_dir) walking up from `path`,
+    without spawning git. Handles linked worktrees (`.git` file with a
+    `gitdir:` pointer and a `commondir`) and bare repositories
+    (repo_root == git_dir).
+    """
+    start = Path(path).resolve()
+    for candidate in (start, *start.parents):
+        dot_git = candidate / ".git"
+        if dot_git.is_dir():
+            git_dir = dot_git
+        elif dot_git.is_file():
+            pointer = dot_git.read_text().strip()
+            if not pointer.startswith("gitdir:"):
+                continue
+            git_dir = (candidate / pointer[len("gitdir:") :].strip()).resolve()
+        elif (candidate / "HEAD").is_file() and (candidate / "objects").is_dir():
+            # bare repository
+            return candidate, candidate, candidate
+        else:
+            continue
+
+        common_dir = git_dir
+        commondir_file = git_dir / "commondir"
+        if commondir_file.is_file():
+            common_dir = (git_dir / commondir_file.read_text().strip()).resolve()
+        return candidate, git_dir, common_dir
+
+    raise NotAGitRepositoryError(str(start))
+
+
+class RefIndex:
+    """
+    Pure-Python view of HEAD, `packed-refs` and loose refs.
+    `packed-refs` is parsed once and reloaded only when its mtime/size
+    change; loose refs are scanned per directory and a directory is
+    re-read only when its own mtime changes (git updates refs through
+    lock-file renames, which always touch the parent directory).
+    """
+
+    def __init__(self, git_dir: Path, common_dir: Path):
+        self.git_dir = git_dir
+        self.common_dir = common_dir
+        self._packed: dict[str, str] = {}
+        self._packed_key = None
+        # directory -> (mtime_ns, {refname: sha or "ref: ..."}, [subdirs])
+        self._loose_dirs: dict[Path, tuple] = {}
+
+    @staticmethod
+    def _stat_key(path: Path):
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _packed_refs(self) -> dict[str, str]:
+        path = self.common_dir / "packed-refs"
+        key = self._stat_key(path)
+        if key != self._packed_key:
+            packed = {}
+            if key is not None:
+                with open(path, "rb") as fh:
+                    for line in fh:
+                        # skip header and peeled lines ("^<sha>")
+                        if line[:1] in (b"#", b"^"):
+                            continue
+                        sha, _, name = line.rstrip(b"\n").partition(b" ")
+                        packed[name.decode()] = sha.decode()
+            self._packed = packed
+            self._packed_key = key
+        return self._packed
+
+    def _ref_file(self, name: str) -> Path:
+        # per-worktree refs live in the worktree git dir, everything else in the common dir
+        if name == "HEAD" or not name.startswith("refs/") or name.startswith(
+            ("refs/bisect/", "refs/worktree/", "refs/rewritten/")
+        ):
+            return self.git_dir / name
+        return self.common_dir / name
+
+    def _read_loose(self, name: str) -> Optional[str]:
+        try:
+            with open(self._ref_file(name), "rb") as fh:
+                return fh.read().strip().decode()
+        except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+            return None
+
+    def _lookup(self, name: str) -> Optional[str]:
+        value = self._read_loose(name)
+        if value is None:
+            value = self._packed_refs().get(name)
+        return value
+
+    def get(self, name: str) -> Optional[str]:
+        """Sha of the full ref `name` (symbolic refs followed), or None."""
+        for _ in range(5):  # same depth limit as git
+            value = self._lookup(name)
+            if value is None or not value.startswith("ref:"):
+                return value
+            name = value[4:].strip()
+        return None
+
+    def symbolic_target(self, name: str = "HEAD") -> Optional[str]:
+        """Target ref of a symbolic ref (None if detached / not symbolic)."""
+        value = self._lookup(name)
+        if value and value.startswith("ref:"):
+            return value[4:].strip()
+        return None
+
+    def _scan_dir(self, directory: Path, prefix: str, out: dict[str, str]):
+        key = self._stat_key(directory)
+        if key is None:
+            self._loose_dirs.pop(directory, None)
+            return
+        cached = self._loose_dirs.get(directory)
+        if cached is None or cached[0] != key:
+            refs, subdirs = {}, []
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".lock"):
+                        continue
+                    if entry.is_dir():
+                        subdirs.append(entry.name)
+                    else:
+                        with open(entry.path, "rb") as fh:
+                            refs[prefix + entry.name] = fh.read().strip().decode()
+            cached = (key, refs, subdirs)
+            self._loose_dirs[directory] = cached
+        out.update(cached[1])
+        for sub in cached[2]:
+            self._scan_dir(directory / sub, f"{prefix}{sub}/", out)
+
+    def refs(self, prefix: str = "refs/") -> dict[str, str]:
+        """Mapping full ref name -> value for every ref under `prefix`."""
+        out = {k: v for k, v in self._packed_refs().items() if k.startswith(prefix)}
+        # loose refs take precedence over packed ones
+        self._scan_dir(self.common_dir / prefix.rstrip("/"), prefix, out)
+        return out
+
+
 class GitRepository:
     def __init__(self, path: str):
-        self.repo = git.Repo(path, search_parent_directories=True)
+        # root del repo (cartella che contiene .git), trovata senza lanciare git
+        self.repo_root, self.git_dir, self.common_dir = discover_repository(path)
+
+        # pure-Python ref index for HEAD / branch reads
+        self.refs = RefIndex(self.git_dir, self.common_dir)
 
-        # root del repo (cartella che contiene .git)
-        self.repo_root = Path(self.repo.git.rev_parse("--show-toplevel"))
+        # persistent cat-file reader for object and ref-resolution reads
+        self.objects = ObjectReader(self.repo_root)
 
-        # user info
+        # refspecs queued inside push_batch(), pushed in one atomic round trip
+        self._pending_pushes: list[str] = []
+        self._batch_depth = 0
+
+        # branch → time of the last fetch made by this process
+        self._fetched_at: dict[str, float] = {}
+
+    @cached_property
+    def repo(self):
+        return _open_repo(self.repo_root)
+
+    @cached_property
+    def state_dir(self) -> Path:
+        """
+        .gatp/ at the repository root (DB, caches, worktrees), created on
+        first use and kept out of `git status` / `git add -A`.
+        """
+        path = self.repo_root / ".gatp"
+        path.mkdir(exist_ok=True)
+        self.ensure_excluded(".gatp/")
+        return path
+
+    @cached_property
+    def _user(self) -> Tuple[str, str]:
         with self.repo.config_reader() as config:
-            self.user_name = config.get_value("user", "name", "")
-            self.user_email = config.get_value("user", "email", "")
+            return (
+                config.get_value("user", "name", ""),
+                config.get_value("user", "email", ""),
+            )
+
+    @property
+    def user_name(self) -> str:
+        return self._user[0]
+
+    @property
+    def user_email(self) -> str:
+        return self._user[1]
+
+    def close(self):
+        self.objects.close()
+        if "repo" in self.__dict__:
+            self.repo.close()
 
     def get_repo_root(self) -> Path:
         return self.repo_root
 
     def get_remote_name(self) -> str:
-        return self.repo.remotes.origin.name
+        # gatp always works against "origin"; no need to load the remote config
+        return "origin"
 
     def get_user_info(self) -> Tuple[str, str]:
         """Restituisce il nome e l'email dell'utente Git configurato."""
@@ -36,10 +382,31 @@ class GitRepository:
         return self.repo.git.checkout(branch)
 
     def current_branch(self) -> str:
-        return self.repo.active_branch.name
+        target = self.refs.symbolic_target("HEAD")
+        if target is None or not target.startswith("refs/heads/"):
+            raise TypeError("HEAD is detached; no current branch")
+        return target[len("refs/heads/") :]
+
+    def resolve(self, rev: str) -> Optional[str]:
+        """Resolve a ref/revision to its object sha (None if it does not exist)."""
+        info = self.objects.info(rev)
+        return info[0] if info else None
+
+    def commit_parents(self, rev: str) -> list[str]:
+        """Parent shas of a commit, read from the raw commit object."""
+        obj = self.objects.read(f"{rev}^{{commit}}")
+        if obj is None:
+            raise ValueError(f"Unknown commit '{rev}'")
+        parents = []
+        for line in obj[2].split(b"\n"):
+            if not line:
+                break  # end of headers
+            if line.startswith(b"parent "):
+                parents.append(line[7:].decode())
+        return parents
 
     def branch_exists(self, name: str) -> bool:
-        return name in [h.name for h in self.repo.heads]
+        return self.refs.get(f"refs/heads/{name}") is not None
 
     def create_branch(self, name: str, base: Optional[str] = None):
         if base:
@@ -49,9 +416,61 @@ class GitRepository:
     def push(self, branch: str = None):
         if branch is None:
             branch = self.current_branch()
+        if self._batch_depth:
+            return self.queue_push(f"refs/heads/{branch}:refs/heads/{branch}")
         return self.repo.git.push(self.get_remote_name(), branch)
 
+    # ---------------------- PUSH BATCHING ----------------------
+    @contextmanager
+    def push_batch(self):
+        """
+        Collect every push made inside the block (branches, tags,
+        deletions) and send them at the end as a single
+        `git push --atomic`: one network negotiation, all-or-nothing.
+        Nothing is pushed if the block raises.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            if self._batch_depth == 1:
+                self._pending_pushes.clear()
+            raise
+        finally:
+            self._batch_depth -= 1
+        if self._batch_depth == 0:
+            self.flush_pushes()
+
+    def queue_push(self, refspec: str):
+        if refspec not in self._pending_pushes:
+            self._pending_pushes.append(refspec)
+        if not self._batch_depth:
+            self.flush_pushes()
+
+    def queue_tag(self, tag: str):
+        self.queue_push(f"refs/tags/{tag}:refs/tags/{tag}")
+
+    def queue_delete(self, branch: str):
+        self.queue_push(f":refs/heads/{branch}")
+
+    def flush_pushes(self, chunk_size: int = 1000) -> list[str]:
+        """
+        Push all queued refspecs atomically. Very large batches (mass
+        deletions) are split in chunks of `chunk_size` to stay below the
+        command-line limit; each chunk is still atomic.
+        """
+        pending, self._pending_pushes = self._pending_pushes, []
+        for i in range(0, len(pending), chunk_size):
+            self.repo.git.push(
+                "--atomic", self.get_remote_name(), *pending[i : i + chunk_size]
+            )
+        return pending
+
+    def create_tag(self, name: str, ref: str = "HEAD"):
+        return self.repo.git.tag(name, ref)
+
     def pull(self, branch: Optional[str] = None):
+        # prefer sync_branch(): targeted fetch, no checkout needed
         if branch:
             return self.repo.git.pull(self.get_remote_name(), branch)
         return self.repo.git.pull(self.get_remote_name())
@@ -59,9 +478,10 @@ class GitRepository:
     def rename_branch(self, old: str, new: str):
         # rename locally
         self.repo.git.branch("-m", old, new)
-        # push rename
-        self.repo.git.push(self.get_remote_name(), f":{old}")  # delete old on remote
-        self.repo.git.push(self.get_remote_name(), new)  # push new
+        # push rename: delete old + push new in one atomic push
+        with self.push_batch():
+            self.queue_delete(old)
+            self.push(new)
         return True
 
     def add(self, all: bool = True, files: list[str] = None):
@@ -79,11 +499,134 @@ class GitRepository:
         return True
 
     def rebase(self, source: str, onto: str):
-        self.repo.git.checkout(onto)
+        """Rebase branch `onto` on top of `source`, in the gatp worktree of `onto`."""
+        from git.exc import GitCommandError
+
+        if self.resolve(source) is None:
+            raise ValueError(f"Unknown revision '{source}'")
+        old, wt, path = self._start_worktree_operation(onto, source, "rebase")
         try:
-            return self.repo.git.rebase(source)
-        except git.exc.GitCommandError:
-            raise MergeConflictError("Rebase conflict detected")
+            wt.rebase(self.resolve(source))
+        except GitCommandError:
+            paths = self._unmerged_paths(wt)
+            if not paths:
+                # failed without conflicts (bad revision, ...): nothing to resolve
+                self._clear_operation(path)
+                raise
+            raise MergeConflictError(
+                f"Rebase conflict detected (resolve in {path})",
+                paths,
+                path,
+            )
+        return self._finish_worktree_operation(onto, wt, path, "rebase")
+
+    # ---------------------- IN-MEMORY MERGES ----------------------
+    def is_ancestor(self, ancestor: str, rev: str) -> bool:
+        status, _, _ = self.repo.git.merge_base(
+            "--is-ancestor",
+            ancestor,
+            rev,
+            with_extended_output=True,
+            with_exceptions=False,
+        )
+        return status == 0
+
+    def count_commits(self, include: str, exclude: Iterable[str] = ()) -> int:
+        """Commits reachable from `include` but not from `exclude`, in one rev-list walk."""
+        return int(
+            self.repo.git.rev_list("--count", include, *(f"^{e}" for e in exclude), "--")
+        )
+
+    def log_range(self, include: str, exclude: Iterable[str] = ()) -> list[Tuple[str, str]]:
+        """(sha, subject) of the commits reachable from `include` but not `exclude`."""
+        out = self.repo.git.log(
+            "--format=%H %s", include, *(f"^{e}" for e in exclude), "--"
+        )
+        return [tuple(line.split(" ", 1)) if " " in line else (line, "") for line in out.splitlines()]
+
+    def merge_tree(self, source: str, target: str) -> Tuple[str, list[str]]:
+        """
+        Merge `source` into `target` without touching index or worktree
+        (`git merge-tree --write-tree`). Returns (tree sha, conflicted paths).
+        """
+        status, out, err = self.repo.git.merge_tree(
+            "--write-tree",
+            "--name-only",
+            "--no-messages",
+            "-z",
+            target,
+            source,
+            with_extended_output=True,
+            with_exceptions=False,
+            strip_newline_in_stdout=False,
+        )
+        if status not in (0, 1):
+            raise RuntimeError(f"git merge-tree failed: {err}")
+        tree, *paths = out.split("\0")
+        return tree, list(dict.fromkeys(p for p in paths if p))
+
+    def predict_merge(
+        self, source: str, target: str, no_ff: bool = True
+    ) -> MergeResult:
+        """What merging `source` into `target` would do; changes no ref."""
+        src = self.resolve(f"{source}^{{commit}}")
+        dst = self.resolve(f"{target}^{{commit}}")
+        if src is None or dst is None:
+            missing = source if src is None else target
+            raise ValueError(f"Unknown revision '{missing}'")
+        if self.is_ancestor(src, dst):
+            return MergeResult("up-to-date", None, [])
+        if not no_ff and self.is_ancestor(dst, src):
+            return MergeResult("fast-forward", None, [])
+        _, conflicts = self.merge_tree(src, dst)
+        return MergeResult("conflict" if conflicts else "merge", None, conflicts)
+
+    def merge_in_memory(
+        self, source: str, target: str, no_ff: bool = True, message: str = None
+    ) -> MergeResult:
+        """
+        Merge `source` into branch `target` with merge-tree + commit-tree +
+        update-ref: no checkout. On conflicts nothing is changed and the
+        result has kind "conflict".
+        """
+        old = self.refs.get(f"refs/heads/{target}")
+        src = self.resolve(f"{source}^{{commit}}")
+        if old is None or src is None:
+            missing = target if old is None else source
+            raise ValueError(f"Unknown revision '{missing}'")
+
+        if self.is_ancestor(src, old):
+            return MergeResult("up-to-date", old, [])
+        if not no_ff and self.is_ancestor(old, src):
+            kind, new = "fast-forward", src
+        else:
+            tree, conflicts = self.merge_tree(src, old)
+            if conflicts:
+                return MergeResult("conflict", None, conflicts)
+            kind = "merge"
+            new = self.repo.git.commit_tree(
+                tree,
+                "-p",
+                old,
+                "-p",
+                src,
+                "-m",
+                message or f"Merge branch '{source}' into {target}",
+            )
+        self._advance_branch(target, old, new, f"gatp: {kind} {source}")
+        return MergeResult(kind, new, [])
+
+    def _advance_branch(self, branch: str, old: str, new: str, reason: str):
+        # if the branch is checked out here, carry index and worktree along:
+        # a two-tree read-tree only rewrites the files that actually changed
+        try:
+            checked_out = self.current_branch() == branch
+        except TypeError:
+            checked_out = False
+        if checked_out:
+            self.repo.git.read_tree("-m", "-u", old, new)
+        # compare-and-swap on the old value: never clobber a concurrent update
+        self.repo.git.update_ref("-m", reason, f"refs/heads/{branch}", new, old)
 
     def merge(
         self,
@@ -92,20 +635,320 @@ class GitRepository:
         strategy: str = None,
         no_ff: bool = True,
     ):
-        if strategy not in ("ort", "ours", "theirs", "resolve"):
+        """
+        Merge `source` into `target`. Computed in memory whenever possible;
+        the target is only checked out (worktree merge) for the `resolve`
+        strategy, or when there are conflicts: either to auto-resolve them
+        with ours/theirs, or to leave them for a human to resolve.
+        """
+        if strategy not in (None, "ort", "ours", "theirs", "resolve"):
             raise ValueError(f"Unsupported merge strategy: {strategy}")
-            # TODO implement strategy handling
-        self.repo.git.checkout(target)
+        if self.resolve(source) is None:
+            raise ValueError(f"Unknown revision '{source}'")
+
+        if strategy != "resolve":
+            result = self.merge_in_memory(source, target, no_ff=no_ff)
+            if result.kind != "conflict":
+                return result
+        return self._merge_worktree(source, target, strategy, no_ff)
+
+    def _merge_worktree(self, source: str, target: str, strategy: str, no_ff: bool):
+        from git.exc import GitCommandError
+
+        args = ["--no-ff"] if no_ff else []
+        if strategy == "resolve":
+            args += ["-s", "resolve"]
+        elif strategy in ("ours", "theirs"):
+            args += ["-X", strategy]
+        src = self.resolve(f"{source}^{{commit}}")
+        old, wt, path = self._start_worktree_operation(target, source, "merge")
+        try:
+            wt.merge(*args, "-m", f"Merge branch '{source}' into {target}", src)
+        except GitCommandError:
+            paths = self._unmerged_paths(wt)
+            if not paths:
+                # failed without conflicts (bad revision, ...): nothing to resolve
+                self._clear_operation(path)
+                raise
+            raise MergeConflictError(
+                f"Merge conflict detected (resolve in {path})",
+                paths,
+                path,
+            )
+        new = self._finish_worktree_operation(target, wt, path, f"merge {source}")
+        return MergeResult("merge", new, [])
+
+    # ---------------------- TRUNK WORKTREES ----------------------
+    # Operations that need a real checkout (conflicting merges, rebases)
+    # run in persistent detached worktrees under .gatp/worktrees/<branch>,
+    # never in the developer's checkout. A worktree is created once and
+    # then only moved between tips, which rewrites just the changed files.
+    _OPERATION = "GATP_OPERATION"
+
+    def worktree_path(self, branch: str) -> Path:
+        return self.state_dir / "worktrees" / branch
+
+    def _worktree_git_dir(self, path: Path) -> Optional[Path]:
+        # the worktree's `.git` file points at its private git dir
+        try:
+            content = (path / ".git").read_text()
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        if not content.startswith("gitdir:"):
+            return None
+        git_dir = Path(content[len("gitdir:") :].strip())
+        return git_dir if git_dir.is_absolute() else (path / git_dir).resolve()
+
+    def worktree(self, branch: str):
+        """
+        Git command wrapper bound to the gatp worktree of `branch`, created
+        on first use and moved to the branch tip. Refuses to touch a
+        worktree with an operation still waiting to be resolved.
+        """
+        tip = self.refs.get(f"refs/heads/{branch}")
+        if tip is None:
+            raise ValueError(f"Unknown branch '{branch}'")
+        path = self.worktree_path(branch)
+        git_dir = self._worktree_git_dir(path)
+        if git_dir is None or not git_dir.exists():
+            # stale registration (directory removed by hand) → prune, then add
+            self.repo.git.worktree("prune")
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self.repo.git.worktree("add", "--detach", "--force", str(path), tip)
+            return type(self.repo.git)(str(path))
+
+        wt = type(self.repo.git)(str(path))
+        if (git_dir / self._OPERATION).exists():
+            raise MergeConflictError(
+                f"An operation is waiting to be resolved in {path}: "
+                "run `gatp flux resolve` (or `gatp flux resolve --abort`) first",
+                self._unmerged_paths(wt),
+                path,
+            )
+        if (git_dir / "HEAD").read_text().strip() != tip:
+            # incremental: only files that differ between the two tips are written
+            wt.reset("-q", "--hard", tip)
+        return wt
+
+    def _start_worktree_operation(self, branch: str, source: str, kind: str):
+        old = self.refs.get(f"refs/heads/{branch}")
+        wt = self.worktree(branch)
+        path = self.worktree_path(branch)
+        state = {"branch": branch, "source": source, "base": old, "kind": kind}
+        (self._worktree_git_dir(path) / self._OPERATION).write_text(json.dumps(state))
+        return old, wt, path
+
+    def ensure_excluded(self, pattern: str):
+        """Add `pattern` to .git/info/exclude (local, never committed) if missing."""
+        exclude = self.common_dir / "info" / "exclude"
+        content = exclude.read_text() if exclude.exists() else ""
+        if pattern in content.splitlines():
+            return
+        exclude.parent.mkdir(parents=True, exist_ok=True)
+        with exclude.open("a") as fh:
+            if content and not content.endswith("\n"):
+                fh.write("\n")
+            fh.write(pattern + "\n")
+
+    def _finish_worktree_operation(self, branch: str, wt, path: Path, reason: str) -> str:
+        from git.exc import GitCommandError
+
+        git_dir = self._worktree_git_dir(path)
+        state = json.loads((git_dir / self._OPERATION).read_text())
+        new = wt.rev_parse("HEAD")
         try:
-            if strategy and no_ff:
-                return self.repo.git.merge("--no-ff", source, strategy_option=strategy)
-            elif strategy:
-                return self.repo.git.merge(source, strategy_option=strategy)
-            elif no_ff:
-                return self.repo.git.merge("--no-ff", source)
-            return self.repo.git.merge(source)
-        except git.exc.GitCommandError:
-            raise MergeConflictError("Merge conflict detected")
+            # compare-and-swap on the tip the operation started from
+            self._advance_branch(branch, state["base"], new, f"gatp: {reason}")
+        except GitCommandError:
+            if self.refs.get(f"refs/heads/{branch}") == state["base"]:
+                raise  # not a concurrent update
+        else:
+            self._clear_operation(path)
+            return new
+
+        # the branch moved while the operation was pending: the worktree
+        # result is kept as a commit and the operation is closed either way
+        self._clear_operation(path)
+        if state.get("kind") == "rebase":
+            raise ValueError(
+                f"'{branch}' moved while the rebase was pending; rebased result kept "
+                f"at {new[:10]}: run the rebase again"
+            )
+        result = self.merge_in_memory(
+            new, branch, message=f"Merge resolved '{state['source']}' into {branch}"
+        )
+        if result.kind == "conflict":
+            raise MergeConflictError(
+                f"'{branch}' moved while the merge was pending and the resolved result "
+                f"{new[:10]} conflicts with the new tip: merge '{state['source']}' again",
+                result.conflicts,
+            )
+        return result.commit
+
+    def _clear_operation(self, path: Path):
+        (self._worktree_git_dir(path) / self._OPERATION).unlink(missing_ok=True)
+
+    @staticmethod
+    def _unmerged_paths(wt) -> list[str]:
+        return wt.diff("--name-only", "--diff-filter=U").splitlines()
+
+    def pending_worktrees(self) -> dict[str, dict]:
+        """Branch → operation state ({branch, source, base, kind}) still waiting to be resolved."""
+        # markers live in the worktrees' private git dirs: no checkout is walked
+        pending = {}
+        for marker in (self.common_dir / "worktrees").glob(f"*/{self._OPERATION}"):
+            state = json.loads(marker.read_text())
+            pending[state["branch"]] = state
+        return pending
+
+    def _operation_worktree(self, branch: str):
+        path = self.worktree_path(branch)
+        git_dir = self._worktree_git_dir(path)
+        if git_dir is None or not (git_dir / self._OPERATION).exists():
+            raise ValueError(f"No operation to resolve for '{branch}'")
+        return path, git_dir, type(self.repo.git)(str(path))
+
+    def _conflict_markers(self, wt) -> list[str]:
+        # `diff --check` also reports whitespace errors: keep only leftover markers
+        _, out, _ = wt.diff(
+            "--check", "HEAD", with_extended_output=True, with_exceptions=False
+        )
+        paths = [
+            line.split(":", 1)[0]
+            for line in out.splitlines()
+            if line.endswith("leftover conflict marker")
+        ]
+        return list(dict.fromkeys(paths))
+
+    def complete_worktree(self, branch: str) -> str:
+        """
+        Finish the merge or rebase waiting in the worktree of `branch` once
+        conflicts are resolved (and staged) there: commit / continue, then
+        move the branch (re-merging if it moved in the meantime).
+        """
+        path, git_dir, wt = self._operation_worktree(branch)
+        unmerged = self._unmerged_paths(wt)
+        if unmerged:
+            raise MergeConflictError(
+                f"Unresolved conflicts remain: stage the resolved files with "
+                f"`git -C {path} add`",
+                unmerged,
+                path,
+            )
+        markers = self._conflict_markers(wt)
+        if markers:
+            raise MergeConflictError("Conflict markers left in files", markers, path)
+        wt.add("-A")
+        if (git_dir / "MERGE_HEAD").exists():
+            wt.commit("--no-edit")
+        elif (git_dir / "rebase-merge").exists() or (git_dir / "rebase-apply").exists():
+            wt.rebase("--continue", env={"GIT_EDITOR": "true"})
+        return self._finish_worktree_operation(branch, wt, path, "resolve")
+
+    def abort_worktree(self, branch: str) -> dict:
+        """
+        Give up the merge or rebase waiting in the worktree of `branch`:
+        abort it, clear the marker and move the worktree back to the tip.
+        Returns the operation state.
+        """
+        path, git_dir, wt = self._operation_worktree(branch)
+        state = json.loads((git_dir / self._OPERATION).read_text())
+        if (git_dir / "MERGE_HEAD").exists():
+            wt.merge("--abort", with_exceptions=False)
+        elif (git_dir / "rebase-merge").exists() or (git_dir / "rebase-apply").exists():
+            wt.rebase("--abort", with_exceptions=False)
+        self._clear_operation(path)
+        wt.reset("-q", "--hard", self.refs.get(f"refs/heads/{branch}"))
+        return state
+
+    # ---------------------- FETCH ----------------------
+    def _fetch_options(self) -> list[str]:
+        """
+        Keep partial clones partial: fetch with the remote's filter
+        (`blob:none` unless configured otherwise), so no blob is
+        downloaded until a command actually reads it.
+        """
+        remote = self.get_remote_name()
+        with self.repo.config_reader() as config:
+            promisor = config.get_value(f'remote "{remote}"', "promisor", False)
+            filter = config.get_value(f'remote "{remote}"', "partialclonefilter", "")
+        return [f"--filter={filter or 'blob:none'}"] if promisor else []
+
+    def fetch_refs(
+        self,
+        branches: Iterable[str],
+        depth: Optional[int] = None,
+        filter: Optional[str] = None,
+        max_age: float = FETCH_MAX_AGE,
+        force: bool = False,
+    ) -> list[str]:
+        """
+        Fetch only `branches` (one round trip, no tags) into their
+        remote-tracking refs. A branch fetched less than `max_age` seconds
+        ago by a recent invocation (.gatp/fetch.json), or at any time by
+        this process, is considered current and skipped. `depth` deepens/limits shallow
+        history; `filter` forces a partial fetch (e.g. "blob:none").
+        Returns the branches actually fetched.
+        """
+        from .cache import load_state, save_state
+
+        remote = self.get_remote_name()
+        # already fetched by this command: current for its whole duration
+        todo = [b for b in dict.fromkeys(branches) if force or b not in self._fetched_at]
+        if not todo:
+            return []
+
+        now = time.time()
+        state_path = self.state_dir / FETCH_STATE_NAME
+        state = load_state(state_path, FETCH_STATE_VERSION)
+        fetched = state.setdefault(remote, {})
+        if not force:
+            todo = [b for b in todo if now - fetched.get(b, 0) > max_age]
+        if not todo:
+            return []
+
+        args = ["--no-tags", *self._fetch_options()]
+        if filter:
+            args = [a for a in args if not a.startswith("--filter=")]
+            args.append(f"--filter={filter}")
+        if depth:
+            args.append(f"--depth={depth}")
+        self.repo.git.fetch(
+            *args,
+            remote,
+            *(f"+refs/heads/{b}:refs/remotes/{remote}/{b}" for b in todo),
+        )
+        for b in todo:
+            self._fetched_at[b] = fetched[b] = now
+        save_state(state_path, FETCH_STATE_VERSION, state)
+        return todo
+
+    def sync_branches(self, branches: Iterable[str], **fetch_options) -> dict[str, MergeResult]:
+        """
+        Bring local `branches` up to date with their remote counterparts
+        without checking them out: one targeted fetch, then fast-forward
+        (or merge in memory) each branch.
+        """
+        branches = list(dict.fromkeys(branches))
+        remote = self.get_remote_name()
+        self.fetch_refs(branches, **fetch_options)
+        results = {}
+        for branch in branches:
+            tracking = f"refs/remotes/{remote}/{branch}"
+            if self.refs.get(f"refs/heads/{branch}") is None:
+                self.repo.git.branch(branch, tracking)
+                results[branch] = MergeResult("fast-forward", self.refs.get(tracking), [])
+                continue
+            result = self.merge_in_memory(tracking, branch, no_ff=False)
+            if result.kind == "conflict":
+                raise MergeConflictError(
+                    f"'{branch}' diverged from {remote} with conflicts", result.conflicts
+                )
+            results[branch] = result
+        return results
+
+    def sync_branch(self, branch: str, **fetch_options) -> MergeResult:
+        return self.sync_branches([branch], **fetch_options)[branch]
 
     def delete_branch(self, name: str, remote: bool = False, force: bool = False):
         """
@@ -116,9 +959,7 @@ class GitRepository:
         # ----------------------
         # 1. Delete LOCAL branch (if exists)
         # ----------------------
-        local_branches = [h.name for h in self.repo.heads]
-
-        if name in local_branches:
+        if self.branch_exists(name):
             try:
                 if force:
                     self.repo.git.branch("-D", name)
@@ -136,15 +977,10 @@ class GitRepository:
         # 2. Delete REMOTE branch
         # ----------------------
         if remote:
-            remote_ref = f"origin/{name}"
-            remote_branches = self.repo.git.branch("-r").splitlines()
-
-            remote_branches = [b.strip() for b in remote_branches]
-
-            if remote_ref in remote_branches:
-                # delete remote branch
+            if self.refs.get(f"refs/remotes/origin/{name}") is not None:
+                # delete remote branch (queued if inside push_batch)
                 try:
-                    self.repo.git.push("origin", f":{name}")
+                    self.queue_delete(name)
                 except Exception as e:
                     raise RuntimeError(f"Failed to delete remote branch '{name}': {e}")
             else:
@@ -155,39 +991,265 @@ class GitRepository:
 
     def list_branches(self, remote: bool = False) -> list[str]:
         if remote:
-            return [ref.name for ref in self.repo.remote().refs]
-        return [h.name for h in self.repo.heads]
+            prefix = f"refs/remotes/{self.get_remote_name()}/"
+            return sorted(
+                name[len("refs/remotes/") :]
+                for name in self.refs.refs(prefix)
+                if name != f"{prefix}HEAD"
+            )
+        return sorted(name[len("refs/heads/") :] for name in self.refs.refs("refs/heads/"))
+
+    # ---------------------- STREAMING ----------------------
+    def stream_lines(self, *args: str) -> Iterator[str]:
+        """
+        Run `git <args>` and yield its stdout line by line while it runs,
+        so huge outputs (refs, logs) are never held in memory at once.
+        """
+        global _spawn_count
+        _spawn_count += 1
+        proc = subprocess.Popen(
+            ["git", *args],
+            cwd=self.repo_root,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        try:
+            for line in proc.stdout:
+                yield line.decode(errors="surrogateescape").rstrip("\n")
+        finally:
+            proc.stdout.close()
+            err = proc.stderr.read()
+            proc.stderr.close()
+            # closed early by the caller: not an error
+            if proc.wait() not in (0, -13) and err:
+                raise RuntimeError(f"git {args[0]} failed: {err.decode(errors='replace').strip()}")
 
-    def get_commits(self, n=10):
-        return list(self.repo.iter_commits(self.repo.active_branch.name, max_count=n))
+    def stream_chunks(self, *args: str, chunk_size: int = 1 << 16) -> Iterator[bytes]:
+        """
+        Run `git <args>` and yield its raw stdout in chunks of at most
+        `chunk_size` bytes: nothing is decoded, binary output passes through.
+        """
+        global _spawn_count
+        _spawn_count += 1
+        proc = subprocess.Popen(
+            ["git", *args],
+            cwd=self.repo_root,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        try:
+            while True:
+                chunk = proc.stdout.read1(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            proc.stdout.close()
+            err = proc.stderr.read()
+            proc.stderr.close()
+            if proc.wait() not in (0, -13) and err:
+                raise RuntimeError(f"git {args[0]} failed: {err.decode(errors='replace').strip()}")
 
-    def show_commit(self, commit_hash: str, path: str | None = None) -> str:
-        commit = self.repo.commit(commit_hash)
-        if commit.parents:
-            parent = commit.parents[0]
-        else:
-            parent = None
+    def stream_records(self, *args: str, sep: str = "\0", chunk_size: int = 1 << 16) -> Iterator[str]:
+        """Like stream_lines(), for outputs whose records end with `sep` (e.g. `-z`)."""
+        sep = sep.encode()
+        pending = b""
+        for chunk in self.stream_chunks(*args, chunk_size=chunk_size):
+            *records, pending = (pending + chunk).split(sep)
+            for record in records:
+                yield record.decode(errors="surrogateescape")
+        if pending:
+            yield pending.decode(errors="surrogateescape")
+
+    def iter_commits(
+        self,
+        include: Iterable[str] = ("HEAD",),
+        exclude: Iterable[str] = (),
+        skip: int = 0,
+        max_count: Optional[int] = None,
+        paths: Iterable[str] = (),
+        first_parent: bool = False,
+        body: bool = False,
+    ) -> Iterator[CommitRecord]:
+        """
+        Stream commits reachable from `include` but not `exclude`, newest
+        first, from a single `git log` pipe: memory does not depend on
+        the size of the range. `skip`/`max_count` page through it.
+        """
+        fields = _LOG_FIELDS + ("%x1f%b" if body else "")
+        args = ["log", "-z", f"--format={fields}"]
+        if skip:
+            args.append(f"--skip={skip}")
+        if max_count is not None:
+            args.append(f"--max-count={max_count}")
+        if first_parent:
+            args.append("--first-parent")
+        args += [*include, *(f"^{e}" for e in exclude), "--", *paths]
+        for record in self.stream_records(*args):
+            sha, parents, author, email, ts, subject, *rest = record.split("\x1f")
+            yield CommitRecord(
+                sha,
+                parents.split(),
+                author,
+                email,
+                int(ts),
+                subject,
+                rest[0].rstrip("\n") if rest else None,
+            )
 
-        if parent:
+    def for_each_ref(
+        self, prefix: str, fields: Iterable[str], merged: Optional[str] = None
+    ) -> Iterator[list[str]]:
+        """
+        Stream `for-each-ref` records under `prefix`: one list of field
+        values (e.g. "refname", "committerdate:unix") per ref. With
+        `merged`, only refs whose tip is reachable from that revision.
+        """
+        fields = list(fields)
+        args = ["for-each-ref", "--format=" + "%00".join(f"%({f})" for f in fields)]
+        if merged is not None:
+            args.append(f"--merged={merged}")
+        for line in self.stream_lines(*args, prefix):
+            yield line.split("\0")
+
+    def delete_branches(
+        self, names: Iterable[str], remote: bool = True, local: bool = True, force: bool = False
+    ) -> list[str]:
+        """
+        Delete many branches at once: local ones with a single `git branch -d`
+        (`-D` with `force`), remote ones queued on the push batch (one atomic
+        push per chunk). Without `force`, local branches git does not consider
+        merged are kept. Returns the names actually deleted or queued.
+        """
+        names = list(names)
+        deleted = []
+        if local:
+            # never the checked-out branch
+            head = self.refs.symbolic_target("HEAD")
+            existing = [
+                n for n in names
+                if f"refs/heads/{n}" != head and self.refs.get(f"refs/heads/{n}") is not None
+            ]
+            if existing and force:
+                self.repo.git.branch("-D", *existing)
+                deleted += existing
+            elif existing:
+                # `-d` deletes the merged ones and refuses the rest (exit 1)
+                self.repo.git.branch("-d", *existing, with_exceptions=False)
+                left = {ref for (ref,) in self.for_each_ref("refs/heads/", ["refname"])}
+                deleted += [n for n in existing if f"refs/heads/{n}" not in left]
+        if remote:
+            tracking = f"refs/remotes/{self.get_remote_name()}/"
+            with self.push_batch():
+                for name in names:
+                    if self.refs.get(tracking + name) is not None:
+                        self.queue_delete(name)
+                        deleted.append(name)
+        return list(dict.fromkeys(deleted))
+
+    def get_commits(self, n=10) -> list[CommitRecord]:
+        return list(self.iter_commits(max_count=n))
+
+    # ---------------------- DIFF ----------------------
+    def _diff_tree_args(self, commit: str, parent: Optional[str]) -> list[str]:
+        # plumbing: no pager, colors, external drivers or textconv from user config
+        if parent is None:
+            parents = self.commit_parents(commit)
+            parent = parents[0] if parents else None
+        if parent is None:
+            return ["diff-tree", "-r", "--root", "--no-commit-id", commit]  # first commit of the repo
+        return ["diff-tree", "-r", "-M", parent, commit]
+
+    def iter_diff(
+        self,
+        commit: str,
+        paths: Iterable[str] = (),
+        parent: Optional[str] = None,
+        binary: bool = False,
+        chunk_size: int = 1 << 16,
+    ) -> Iterator[bytes]:
+        """
+        Stream the patch of `commit` against its first parent (or `parent`)
+        as raw byte chunks. Pathspecs are applied by git, so filtered-out
+        files are never produced; content is not decoded, so binary and
+        non-UTF-8 files pass through unchanged. With `binary`, binary
+        changes are emitted as applicable patches instead of a summary.
+        """
+        args = self._diff_tree_args(commit, parent) + ["-p"]
+        if binary:
+            args.append("--binary")
+        yield from self.stream_chunks(*args, "--", *paths, chunk_size=chunk_size)
+
+    def diff_stat(
+        self, commit: str, paths: Iterable[str] = (), parent: Optional[str] = None
+    ) -> Iterator[DiffStat]:
+        """Per-file line counts of `commit` (`--numstat`): no patch text is produced."""
+        args = self._diff_tree_args(commit, parent) + ["--numstat", "-z"]
+        records = self.stream_records(*args, "--", *paths)
+        for record in records:
+            if not record:
+                continue
+            added, deleted, path = record.split("\t", 2)
+            old_path = None
+            if not path:
+                # rename/copy: the two paths follow as separate records
+                old_path, path = next(records), next(records)
+            yield DiffStat(
+                path,
+                None if added == "-" else int(added),
+                None if deleted == "-" else int(deleted),
+                old_path,
+            )
+
+    def changed_paths(
+        self, commit: str, paths: Iterable[str] = (), parent: Optional[str] = None
+    ) -> Iterator[str]:
+        """Paths touched by `commit` (`--name-only`), without reading any blob."""
+        args = self._diff_tree_args(commit, parent) + ["--name-only", "-z"]
+        for path in self.stream_records(*args, "--", *paths):
             if path:
-                return parent.diff(commit, paths=path, create_patch=True)[
-                    0
-                ].diff.decode()
-            else:
-                return self.repo.git.show(commit_hash)
-        else:
-            # First commit of the repo
-            return self.repo.git.show(commit_hash)
-
-    def blame(self, file_path: str, line: int | None = None) -> str:
-        if line:
-            # blame singola linea
-            blame_info = self.repo.git.blame("-L", f"{line},{line}", file_path)
-            return blame_info
-        else:
-            # blame completo
-            return self.repo.git.blame(file_path)
+                yield path
+
+    def show_commit(self, commit_hash: str, path: str | None = None) -> str:
+        """Whole patch as a string; prefer iter_diff() for large commits."""
+        patch = b"".join(self.iter_diff(commit_hash, [path] if path else ()))
+        return patch.decode(errors="replace")
 
+    # ---------------------- BLAME ----------------------
+    def iter_blame(
+        self, path: str, rev: str = "HEAD", ranges: Iterable[tuple[int, int]] = ()
+    ) -> Iterator[BlameHunk]:
+        """
+        Stream blame hunks of `path` at `rev` (optionally only the
+        inclusive line `ranges`), parsed from `git blame --incremental`
+        as git emits them: hunks are not in line order.
+        """
+        args = ["blame", "--incremental", *(f"-L{s},{e}" for s, e in ranges), rev, "--", path]
+        commits = {}  # commit headers are only sent the first time
+        hunk = None
+        for line in self.stream_lines(*args):
+            if hunk is None:
+                sha, orig, final, count = line.split()
+                hunk = [sha, int(orig), int(final), int(count)]
+                info = commits.setdefault(sha, {})
+                continue
+            key, _, value = line.partition(" ")
+            if key != "filename":
+                info[key] = value
+                continue
+            sha, orig, final, count = hunk
+            yield BlameHunk(
+                final,
+                count,
+                sha,
+                orig,
+                value,
+                info.get("author", ""),
+                info.get("author-mail", "").strip("<>"),
+                int(info.get("author-time", 0)),
+                info.get("summary", ""),
+            )
+            hunk = None
 
 if __name__ == "__main__":
     lg = GitRepository(".")
@@ -0,0 +1,181 @@
+"""
+Compiled policy snapshot and branch matcher, kept import-light.
+
+The installed git hooks run on every push with `python -I -S` and load
+only this module: it must stay on builtin modules (no typing,
+dataclasses, pathlib, json or even os, each of which costs more than
+the whole check; posix provides stat/fspath).
+The snapshot is a marshal dump of plain dicts/lists, and re/fnmatch are
+only imported when the policy has glob/regex trunks. The dataclass view
+of the policy is built on top of it in policy.py.
+"""
+
+from __future__ import annotations
+
+import marshal
+
+try:
+    # builtin; `os` (with _collections_abc behind it) adds ~2 ms to every hook
+    from posix import fspath, stat
+
+    _SEPARATORS = "/"
+except ImportError:  # not POSIX
+    from os import fspath, stat
+
+    _SEPARATORS = "/\\"
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Optional
+
+    from .policy import FlowPolicy, Policy, TrunkPolicy
+
+# bump when the snapshot layout changes: older snapshots are ignored
+SNAPSHOT_VERSION = 2
+SNAPSHOT_NAME = "policy.snapshot"
+
+
+# ---------------------- SNAPSHOT ----------------------
+def snapshot_path(db_path) -> str:
+    """SNAPSHOT_NAME in the directory of `db_path`."""
+    path = fspath(db_path)
+    cut = max(path.rfind(sep) for sep in _SEPARATORS)
+    return path[: cut + 1] + SNAPSHOT_NAME
+
+
+def db_key(db_path) -> Optional[list]:
+    """
+    mtime/size of the DB and its WAL: any write changes it. An empty WAL
+    (just opened, nothing written) counts as no WAL.
+    """
+    key = []
+    for path in (fspath(db_path), f"{fspath(db_path)}-wal"):
+        try:
+            st = stat(path)
+        except FileNotFoundError:
+            key.append(None)
+            continue
+        key.append([st.st_mtime_ns, st.st_size] if st.st_size else None)
+    return key if key[0] is not None else None
+
+
+def read_snapshot(db_path) -> Optional[dict]:
+    """Snapshot document ({version, key, policy}), or None if missing or outdated."""
+    try:
+        with open(snapshot_path(db_path), "rb") as fh:
+            data = marshal.loads(fh.read())
+    except (FileNotFoundError, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(data, dict) or data.get("version") != SNAPSHOT_VERSION:
+        return None
+    return data
+
+
+def dump_snapshot(data: dict) -> bytes:
+    return marshal.dumps(data)
+
+
+def fresh_policy_data(db_path) -> Optional[dict]:
+    """Plain-dict policy of the snapshot, or None if missing or stale."""
+    data = read_snapshot(db_path)
+    if data is None or data.get("key") != db_key(db_path):
+        return None
+    return data["policy"]
+
+
+# ---------------------- BRANCH MATCHER ----------------------
+REGEX_PREFIX = "re:"
+
+
+def is_pattern(name: str) -> bool:
+    """Trunk names may be globs (`release/*`) or regexes (`re:release/\\d+`)."""
+    return name.startswith(REGEX_PREFIX) or any(c in name for c in "*?[")
+
+
+# an unescaped \1..\9: group numbers shift once patterns are combined
+_NUMBERED_BACKREF = r"(?<!\\)(?:\\\\)*\\[1-9]"
+
+
+def _pattern_source(name: str) -> str:
+    if name.startswith(REGEX_PREFIX):
+        import re
+
+        source = name[len(REGEX_PREFIX) :]
+        if re.search(_NUMBERED_BACKREF, source):
+            raise ValueError(
+                f"trunk '{name}': numbered backreferences are not supported, "
+                "use a named group and (?P=name)"
+            )
+        return source
+    import fnmatch
+
+    # fnmatch.translate gives "(?s:...)\\Z": keep the group, drop the anchor
+    return fnmatch.translate(name)[:-2]
+
+
+class BranchMatcher:
+    """
+    Branch classifier compiled once per policy load.
+    - trunks: exact names in a dict; glob/regex names combined into a
+      single alternation, tried longest pattern first (then by name), so
+      `release/1.x` beats `release/*` and ties never depend on dict order.
+      Each pattern becomes a named group of that alternation, so regexes
+      may not use numbered backreferences (`\\1`): they raise ValueError,
+      `(?P<v>...)(?P=v)` works. Invalid regexes raise ValueError too.
+    - flows: prefix trie with longest-match semantics, so with both
+      `feature/` and `feature/ui/` the more specific flow always wins.
+    Classification costs O(len(branch)) whatever the number of flows.
+    """
+
+    _END = ""  # trie key marking the end of a prefix (never a real char)
+
+    def __init__(self, policy: Policy):
+        self._exact = {}
+        patterns = []
+        for trunk in policy.trunks.values():
+            if is_pattern(trunk.name):
+                patterns.append(trunk)
+            else:
+                self._exact[trunk.name] = trunk
+
+        patterns.sort(key=lambda t: (-len(t.name), t.name))
+        self._patterns = {f"t{i}": t for i, t in enumerate(patterns)}
+        self._pattern_re = None
+        if patterns:
+            import re
+
+            try:
+                self._pattern_re = re.compile(
+                    "|".join(
+                        f"(?P<{group}>{_pattern_source(t.name)})"
+                        for group, t in self._patterns.items()
+                    )
+                )
+            except re.error as e:
+                raise ValueError(f"invalid trunk pattern: {e}") from None
+
+        self._trie = {}
+        for name, flow in sorted(policy.flows.items()):
+            node = self._trie
+            for char in flow.prefix:
+                node = node.setdefault(char, {})
+            # first flow (by name) wins if two flows share the same prefix
+            node.setdefault(self._END, (name, flow))
+
+    def trunk(self, branch: str) -> Optional[TrunkPolicy]:
+        trunk = self._exact.get(branch)
+        if trunk is None and self._pattern_re is not None:
+            match = self._pattern_re.fullmatch(branch)
+            if match:
+                trunk = self._patterns[match.lastgroup]
+        return trunk
+
+    def flow(self, branch: str) -> Optional[tuple[str, FlowPolicy]]:
+        node = self._trie
+        found = node.get(self._END)
+        for char in branch:
+            node = node.get(char)
+            if node is None:
+                break
+            found = node.get(self._END, found)
+        return found
@@ -1,93 +1,147 @@
-from typing import Optional, Tuple
+import time
+from typing import Iterator, NamedTuple, Optional, Tuple
 from datetime import datetime
+from functools import cached_property
 
+from .cache import load_state, save_state
 from .repository import GitRepository
-from .db import DBStore, Trunk, Flow, Bind
+from .policy import (
+    Policy,
+    TrunkPolicy,
+    FlowPolicy,
+    BindPolicy,
+    BranchMatcher,
+    load_snapshot,
+)
 
 # default objects (usali per init)
 DEFAULT_TRUNKS = {
-    "main": Trunk("main", allow_push=False, require_pr=True),
-    "develop": Trunk("develop", allow_push=True, require_pr=True),
+    "main": TrunkPolicy("main", allow_push=False, require_pr=True),
+    "develop": TrunkPolicy("develop", allow_push=True, require_pr=True),
 }
 
 DEFAULT_FLOWS = {
-    "feature": Flow("feature/", parent="develop", target="develop"),
-    "hotfix": Flow("hotfix/", parent="main", target="main"),
-    # "release": Flow("release/", parent="develop", target="main"),
+    "feature": FlowPolicy("feature", "feature/", parent="develop", target="develop"),
+    "hotfix": FlowPolicy("hotfix", "hotfix/", parent="main", target="main"),
+    # "release": FlowPolicy("release", "release/", parent="develop", target="main"),
 }
 
 DEFAULT_BINDS = {
-    "release": Bind(
+    "release": BindPolicy(
         name="release", parent="develop", target="main", mode="aggregate", tag=True
     ),
 }
 
 
+class RefStatus(NamedTuple):
+    ref: str
+    branch: str
+    flow: Optional[str]
+    trunk: Optional[str]  # the trunk itself, or the flow's target trunk
+    push_allowed: bool
+    pr_required: bool
+    unmanaged: bool
+
+
+class PlanStep(NamedTuple):
+    action: str  # merge | conflict | rebase | push | tag | pr | skip
+    detail: str
+
+
+class Propagation(NamedTuple):
+    source: str
+    target: str
+    via: list[str]  # bind names and/or "sync_with"
+    pending: Optional[int]  # commits of source not yet in target (None: missing branch)
+    commits: list[Tuple[str, str]]  # pending (sha, subject), if requested
+    walked: bool  # False when the checkpoint already covered both tips
+
+
+class Retention(NamedTuple):
+    branch: str
+    flow: str
+    age_days: float  # since the tip's committer date
+    merged: bool  # tip reachable from every flow target
+    delete: bool
+    reason: str
+
+
+# bump when the checkpoint layout changes: older checkpoints are ignored
+PROPAGATION_VERSION = 1
+
+
 class TreeManager:
     def __init__(self, repo_path: str = "."):
         # determine repo root using GitRepository
         self.repo = GitRepository(repo_path)
         self.repo_root = self.repo.get_repo_root()
-        self.store = DBStore(self.repo_root)
-
-        if self.store.is_initialized():
-            # load from DB
-            self.trunks = {t.name: t for t in self.store.get_trunks()}
-            # flows: map name->Flow
-            self.flows = {name: flow for (name, flow) in self.store.get_flows()}
-            # binds can be added similarly if needed
-            self.binds = {b.name: b for b in self.store.get_binds()}
-        else:
-            # use defaults until user calls setup/init
-            self.trunks = DEFAULT_TRUNKS
-            self.flows = DEFAULT_FLOWS
-            self.binds = DEFAULT_BINDS
-
-        # initialize user
-        self.user_exists = self.init_user()
+        self.db_path = self.repo_root / ".gatp" / "config.db"
+
+        self.load_policy()
+
+    @cached_property
+    def store(self):
+        # SQLAlchemy is only imported by commands that really need the ORM
+        from .db import DBStore
+
+        self.repo.state_dir  # creates .gatp/, excluded from git
+        return DBStore(self.db_path)
+
+    @property
+    def is_configured(self) -> bool:
+        """True once `config setup`/`import` stored a topology (trunk rows)."""
+        return self.db_path.exists() and bool(self.store.get_trunks())
+
+    def load_policy(self):
+        policy = None
+        if self.db_path.exists():
+            # compiled snapshot; fall back to the DB (and recompile) if stale
+            policy = load_snapshot(self.db_path) or self.store.rebuild_snapshot()
+        if policy is None or not policy.trunks:
+            # use defaults until user calls setup/init: the DB may already
+            # exist, created empty by logs or the PR cache
+            policy = Policy(DEFAULT_TRUNKS, DEFAULT_FLOWS, DEFAULT_BINDS)
+
+        self.policy = policy
+        self.trunks = policy.trunks
+        self.flows = policy.flows
+        self.binds = policy.binds
+        self.matcher = BranchMatcher(policy)
 
     def init_user(self):
-
+        # called by the commands that write to the store (setup, import, PR records)
         if self.store.is_initialized() and self.repo.user_name and self.repo.user_email:
 
-            # verify user on db or create default
+            # verify user on db or create default (lookup + insert in one commit)
             name = self.repo.user_name
             email = self.repo.user_email
-            users = self.store.get_users()
-
-            # if there are no users, add current as admin
-            if not users:
-                self.store.add_user(name=name, email=email, admin=True)
-                return True
-            else:
-                # verify existing user
-                for u in users:
-                    if u.name == name and u.email == email:
-                        return True
-
-                # if the user is not found, add as non-admin
-                self.store.add_user(name=name, email=email, admin=False)
-                return True
+            with self.store.transaction():
+                users = self.store.get_users()
+
+                # if there are no users, add current as admin
+                if not users:
+                    self.store.add_user(name=name, email=email, admin=True)
+                    return True
+                else:
+                    # verify existing user
+                    for u in users:
+                        if u.name == name and u.email == email:
+                            return True
+
+                    # if the user is not found, add as non-admin
+                    self.store.add_user(name=name, email=email, admin=False)
+                    return True
 
         # if the user does not exist, or it's not initialized, return False
         return False
 
-    def detect_trunk(self, branch: str) -> Optional[Trunk]:
-        # direct match on trunk names
-        if branch in self.trunks:
-            return self.trunks[branch]
-        return None
-
-    def detect_flow(self, branch: str) -> Optional[Tuple[str, Flow]]:
-        # if DB is used, prefer DB lookup; otherwise fallback to defaults
-        # self.flows maps name->Flow (if from DB) or default mapping name->Flow
-        for name, cfg in self.flows.items():
-            if isinstance(cfg, tuple):
-                # case when list_flows returned raw tuples (defensive)
-                cfg = cfg[1]
-            if branch.startswith(cfg.prefix):
-                return (name, cfg)
-        return None
+    def detect_trunk(self, branch: str) -> Optional[TrunkPolicy]:
+        # exact trunk names first, then glob/regex trunks (e.g. release/*)
+        return self.matcher.trunk(branch)
+
+    def detect_flow(self, branch: str) -> Optional[Tuple[str, FlowPolicy]]:
+        # longest matching flow prefix
+        return self.matcher.flow(branch)
 
     def get_target(self, flow_name: str) -> str:
         f = self.flows.get(flow_name)
@@ -95,144 +149,396 @@ class TreeManager:
             raise KeyError(flow_name)
         return f.target
 
-    def can_push(self, branch: str) -> bool:
-        # if branch is trunk, read trunk settings; else find flow and use flow.parent target trunk settings
-        t = self.detect_trunk(branch)
-        if t:
-            return bool(t.allow_push)
+    def evaluate(self, branch: str, ref: Optional[str] = None) -> "RefStatus":
+        """Classify one branch against the trunk/flow policy."""
+        trunk = self.detect_trunk(branch)
+        if trunk:
+            return RefStatus(
+                ref or branch,
+                branch,
+                None,
+                trunk.name,
+                bool(trunk.allow_push),
+                bool(trunk.require_pr),
+                False,
+            )
         flow = self.detect_flow(branch)
         if flow:
-            _, fs = flow
-            # target trunk settings if present
-            trunk = self.trunks.get(fs.target)
-            if trunk:
-                return bool(trunk.allow_push)
-            # default conservative
-            return False
-        return False
+            name, fs = flow
+            # target trunk settings if present, conservative defaults otherwise
+            target = self.trunks.get(fs.target)
+            return RefStatus(
+                ref or branch,
+                branch,
+                name,
+                fs.target,
+                bool(target.allow_push) if target else False,
+                bool(target.require_pr) if target else True,
+                False,
+            )
+        return RefStatus(ref or branch, branch, None, None, False, True, True)
+
+    def audit_refs(self, local: bool = True, remote: bool = True) -> Iterator["RefStatus"]:
+        """
+        Classify every local and/or remote branch in one pass.
+        Refs come from the in-memory ref index (no git process) and results
+        are yielded one by one, so callers can stream them.
+        """
+        prefixes = []
+        if local:
+            prefixes.append("refs/heads/")
+        if remote:
+            prefixes.append(f"refs/remotes/{self.repo.get_remote_name()}/")
+        for prefix in prefixes:
+            for ref in self.repo.refs.refs(prefix):
+                branch = ref[len(prefix) :]
+                if branch == "HEAD":
+                    continue
+                yield self.evaluate(branch, ref)
+
+    def unmanaged_branches(
+        self,
+        remote: bool = True,
+        patterns: Optional[list[str]] = None,
+        older_than_days: Optional[int] = None,
+    ) -> Iterator[Tuple[str, float]]:
+        """
+        Stream (branch, age in days) for every branch that is neither a
+        trunk nor in a flow, in a single `for-each-ref` pass. `patterns`
+        (globs) and `older_than_days` narrow the selection.
+        """
+        import fnmatch
+
+        prefix = f"refs/remotes/{self.repo.get_remote_name()}/" if remote else "refs/heads/"
+        now = time.time()
+        for refname, date in self.repo.for_each_ref(
+            prefix, ("refname", "committerdate:unix")
+        ):
+            branch = refname[len(prefix) :]
+            if branch == "HEAD" or self.detect_trunk(branch) or self.detect_flow(branch):
+                continue
+            if patterns and not any(fnmatch.fnmatchcase(branch, p) for p in patterns):
+                continue
+            age = (now - int(date or 0)) / 86400
+            if older_than_days is not None and age < older_than_days:
+                continue
+            yield branch, age
+
+    def pending_range(self, branch: str) -> Tuple[list[str], list[str]]:
+        """
+        (include, exclude) revisions selecting the commits of `branch` not
+        yet on the branches it feeds: its flow target(s) for a flow branch,
+        the trunks below it (binds, sync_with) for a trunk.
+        """
+        flow = self.detect_flow(branch)
+        if flow is not None:
+            targets = [t.strip() for t in flow[1].target.split(",")]
+        elif self.detect_trunk(branch) is not None:
+            targets = [t for (s, t) in self.trunk_edges() if s == branch]
+        else:
+            raise ValueError(f"'{branch}' is neither a trunk nor in a flow")
+        existing = [t for t in targets if self.repo.refs.get(f"refs/heads/{t}")]
+        return [branch], existing
+
+    def can_push(self, branch: str) -> bool:
+        # trunk settings, or the target trunk settings of the branch's flow
+        return self.evaluate(branch).push_allowed
 
     def requires_pr(self, branch: str) -> bool:
-        t = self.detect_trunk(branch)
-        if t:
-            return bool(t.require_pr)
-        flow = self.detect_flow(branch)
-        if flow:
-            _, fs = flow
-            trunk = self.trunks.get(fs.target)
-            if trunk:
-                return bool(trunk.require_pr)
-            return True
-        return True
+        return self.evaluate(branch).pr_required
 
     # Convenience: expose store init
     def init_store_with_defaults(self):
-        # create DB and write defaults
-        self.store.init_db(DEFAULT_TRUNKS, DEFAULT_FLOWS)
+        # create DB and write defaults (one transaction)
+        self.store.apply_policy(Policy(DEFAULT_TRUNKS, DEFAULT_FLOWS, DEFAULT_BINDS))
         # reload into memory
-        self.trunks = {t.name: t for t in self.store.list_trunks()}
-        self.flows = {name: flow for (name, flow) in self.store.list_flows()}
+        self.load_policy()
 
-    def execute_bind(self, bind_name: str):
+    def _load_bind(self, bind_name: str):
         bind = self.binds.get(bind_name)
         if not bind:
             raise KeyError(f"Bind '{bind_name}' not found")
-        parent = bind.parent
-        target = bind.target
-        mode = bind.mode
-        tag = bind.tag
 
-        assert mode in ("merge", "rebase", "aggregate"), f"Invalid bind mode '{mode}'"
+        assert bind.mode in (
+            "merge",
+            "rebase",
+            "aggregate",
+        ), f"Invalid bind mode '{bind.mode}'"
 
         # Ensure branches exist
-        if not self.repo.branch_exists(parent):
-            raise ValueError(f"Parent branch '{parent}' does not exist")
-        if not self.repo.branch_exists(target):
-            raise ValueError(f"Target branch '{target}' does not exist")
+        if not self.repo.branch_exists(bind.parent):
+            raise ValueError(f"Parent branch '{bind.parent}' does not exist")
+        if not self.repo.branch_exists(bind.target):
+            raise ValueError(f"Target branch '{bind.target}' does not exist")
 
         # get target record
-        target_trunk = self.store.get_trunk(target)
-
+        target_trunk = self.trunks.get(bind.target)
+        if target_trunk is None:
+            raise ValueError(f"Target trunk '{bind.target}' not configured")
+        return bind, target_trunk
+
+    def plan_bind(self, bind_name: str) -> list["PlanStep"]:
+        """Dry run of execute_bind: predicted merges, conflicts, pushes, tags."""
+        bind, target_trunk = self._load_bind(bind_name)
+        parent, target = bind.parent, bind.target
+        steps = []
         if target_trunk.allow_push:
+            if bind.mode == "rebase":
+                steps.append(PlanStep("rebase", f"{target} onto {parent}"))
+            else:
+                steps.append(self._plan_merge(parent, target))
+                if bind.mode == "aggregate":
+                    # target will contain parent: merging it back cannot conflict
+                    steps.append(PlanStep("merge", f"{target} → {parent}"))
+                    steps.append(PlanStep("push", parent))
+            steps.append(PlanStep("push", target))
+            if bind.tag:
+                steps.append(PlanStep("tag", f"{bind.name}-<timestamp> on {target}"))
+        else:
+            steps.append(PlanStep("skip", f"trunk '{target}' does not allow push"))
+        if target_trunk.require_pr:
+            steps.append(PlanStep("pr", f"{parent} → {target}"))
+        return steps
 
-            if mode == "merge":
-                # Merge changes from parent to target
-                self.repo.merge(source=parent, target=target)
-            elif mode == "rebase":
-                # Rebase target onto parent
-                self.repo.rebase(source=parent, onto=target)
-            elif mode == "aggregate":
-                # Aggregate changes from both branches and push in both directions
-                # Merge parent into target
-                self.repo.merge(source=parent, target=target)
-                # Merge target back into parent to keep them in sync
-                self.repo.merge(source=target, target=parent)
-
-            self.repo.checkout(target)
-            self.repo.push(target)
-
-            if tag:
-                # Create a tag with current timestamp
-                timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-                tag_name = f"{bind.name}-{timestamp}"
-                self.repo.repo.create_tag(tag_name)
-                self.repo.push()
+    def plan_finish(self, branch: str, no_ff: bool = True) -> list["PlanStep"]:
+        """Dry run of `flux finish`: predicted merge, push and PR."""
+        flow = self.detect_flow(branch)
+        if not flow:
+            raise ValueError(f"Unknown flow for branch {branch}")
+        target = flow[1].target
+        steps = [self._plan_merge(branch, target, no_ff)]
+        if steps[0].action != "conflict":
+            if self.can_push(target):
+                steps.append(PlanStep("push", target))
+            else:
+                steps.append(PlanStep("skip", f"trunk '{target}' is protected"))
+        if self.requires_pr(target):
+            steps.append(PlanStep("pr", f"{branch} → {target}"))
+        return steps
+
+    def _plan_merge(
+        self, source: str, target: str, no_ff: bool = True
+    ) -> "PlanStep":
+        result = self.repo.predict_merge(source, target, no_ff=no_ff)
+        if result.kind == "conflict":
+            return PlanStep(
+                "conflict", f"{source} → {target}: {', '.join(result.conflicts)}"
+            )
+        return PlanStep("merge", f"{source} → {target} ({result.kind})")
+
+    def execute_bind(self, bind_name: str, **fetch_options):
+        # fetch_options (depth, filter) go to the trunks' sync fetch
+        bind, target_trunk = self._load_bind(bind_name)
+        parent = bind.parent
+        target = bind.target
+        mode = bind.mode
+        tag = bind.tag
+
+        if target_trunk.allow_push:
+            # both trunks up to date with the remote: one targeted fetch
+            self.repo.sync_branches([parent, target], **fetch_options)
+            # every ref update of the bind goes out in one atomic push
+            with self.repo.push_batch():
+                if mode == "merge":
+                    # Merge changes from parent to target
+                    self.repo.merge(source=parent, target=target)
+                elif mode == "rebase":
+                    # Rebase target onto parent
+                    self.repo.rebase(source=parent, onto=target)
+                elif mode == "aggregate":
+                    # Aggregate changes from both branches and push in both directions
+                    # Merge parent into target
+                    self.repo.merge(source=parent, target=target)
+                    # Merge target back into parent to keep them in sync
+                    self.repo.merge(source=target, target=parent)
+                    self.repo.push(parent)
+
+                # merges are computed in memory: no checkout needed to push
+                self.repo.push(target)
+
+                if tag:
+                    # Create a tag with current timestamp
+                    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+                    tag_name = f"{bind.name}-{timestamp}"
+                    self.repo.create_tag(tag_name, target)
+                    self.repo.queue_tag(tag_name)
 
         if target_trunk.require_pr:
             print(
                 f"Target trunk '{target}' requires PRs; please create a PR for changes from '{parent}' to '{target}'."
             )
 
-    # def retain_flow_branches(self, older_than_days: int = 30):
-    #     # retention process: delete merged flow branches
-    #     # (not-trunks) older than a given date, with no additional commit,
-    #     # and with no PRs open
-    #     now = datetime.now()
-    #     cutoff_date = now - timedelta(days=older_than_days)
-    #     remote = self.repo.get_remote_name()
-
-    #     for name, fs in self.flows.items():
-    #         if isinstance(fs, tuple):
-    #             fs = fs[1]
-    #         prefix = fs.prefix
-    #         for bname in self.repo.list_branches(remote=True):
-    #             # remove remote prefix if present
-    #             branch_short = bname[len(f"{remote}/") :]
-    #             print(bname)
-    #             if branch_short.startswith(prefix):
-    #                 # check last commit date
-    #                 commit = self.repo.repo.commit(bname)
-    #                 commit_date = datetime.fromtimestamp(commit.committed_date)
-    #                 if commit_date < cutoff_date:
-    #                     # 1 - check if merged into target trunk
-    #                     target_trunk = fs.target
-    #                     if not self.repo.branch_exists(target_trunk):
-    #                         continue
-    #                     target_commit = self.repo.repo.commit(target_trunk)
-    #                     if commit.hexsha == target_commit.hexsha:
-    #                         # already at tip, can delete
-    #                         pass
-    #                     elif commit in self.repo.repo.iter_commits(
-    #                         f"{bname}..{target_trunk}"
-    #                     ):
-    #                         # commit is ancestor of target trunk, can delete
-    #                         pass
-    #                     else:
-    #                         # not merged yet
-    #                         continue
-    #                     # 2- check for open PRs
-
-    #                     # Here you would check for open PRs via provider API
-    #                     # For now, we just print the branch to be deleted
-    #                     print(
-    #                         f"Branch '{bname}' is older than {older_than_days} days and can be deleted."
-    #                     )
+    # ---------------------- PROPAGATION ----------------------
+    def trunk_edges(self) -> dict[Tuple[str, str], list[str]]:
+        """
+        Trunk hierarchy as (source, target) → reasons: every bind moves its
+        parent into its target, and a trunk moves into each `sync_with` trunk.
+        """
+        edges = {}
+        for bind in self.binds.values():
+            edges.setdefault((bind.parent, bind.target), []).append(bind.name)
+        for trunk in self.trunks.values():
+            for other in (trunk.sync_with or "").split(","):
+                if other.strip():
+                    edges.setdefault((trunk.name, other.strip()), []).append("sync_with")
+        return edges
+
+    def verify_propagation(
+        self, remote: bool = False, commits: bool = False, full: bool = False
+    ) -> list["Propagation"]:
+        """
+        Commits of each trunk not yet propagated to the trunks below it.
+        A checkpoint per edge (.gatp/propagation.json) records the last
+        source tip found fully contained in the target: later runs only
+        walk the commits added since then, and nothing at all if neither
+        tip moved. Trunks are never rewritten, so a verified tip stays
+        verified; `full` ignores the checkpoints anyway.
+        """
+        prefix = f"refs/remotes/{self.repo.get_remote_name()}/" if remote else "refs/heads/"
+        path = self.repo.state_dir / "propagation.json"
+        state = load_state(path, PROPAGATION_VERSION)
+        checkpoints = state[prefix] = {} if full else state.get(prefix, {})
+
+        results = []
+        for (source, target), via in sorted(self.trunk_edges().items()):
+            source_sha = self.repo.refs.get(prefix + source)
+            target_sha = self.repo.refs.get(prefix + target)
+            if source_sha is None or target_sha is None:
+                results.append(Propagation(source, target, via, None, [], False))
+                continue
+
+            key = f"{source}>{target}"
+            point = checkpoints.get(key, {})
+            walked = point.get("source") != source_sha or point.get("target") != target_sha
+            exclude = [target_sha] + ([point["verified"]] if point.get("verified") else [])
+            if walked:
+                pending = self.repo.count_commits(source_sha, exclude)
+                verified = source_sha if pending == 0 else point.get("verified")
+                checkpoints[key] = {
+                    "source": source_sha,
+                    "target": target_sha,
+                    "verified": verified,
+                    "pending": pending,
+                }
+            else:
+                pending = point["pending"]
+            listed = self.repo.log_range(source_sha, exclude) if commits and pending else []
+            results.append(Propagation(source, target, via, pending, listed, walked))
+
+        save_state(path, PROPAGATION_VERSION, state)
+        return results
+
+    # ---------------------- RETENTION ----------------------
+    def plan_retention(
+        self,
+        remote: bool = True,
+        older_than_days: Optional[int] = None,
+        include_unmerged: bool = False,
+    ) -> list["Retention"]:
+        """
+        Decide which flow branches (not trunks) to delete, with one
+        `for-each-ref` pass for tips and ages plus one `--merged` pass per
+        distinct flow target, whatever the number of branches.
+        - merged branches are deleted if their flow has `auto_delete`
+          (and they are older than `older_than_days`, if given);
+        - branches past their flow's `max_lifetime_days` are deleted if
+          merged, or anyway with `include_unmerged`;
+        - a branch whose tip is a target tip has no commits of its own
+          (just created) and is always kept.
+        Open PRs are checked separately (keep_open_prs).
+        """
+        prefix = f"refs/remotes/{self.repo.get_remote_name()}/" if remote else "refs/heads/"
+        now = time.time()
+
+        candidates = {}
+        for refname, sha, date in self.repo.for_each_ref(
+            prefix, ("refname", "objectname", "committerdate:unix")
+        ):
+            branch = refname[len(prefix) :]
+            if branch == "HEAD" or self.detect_trunk(branch) is not None:
+                continue
+            flow = self.detect_flow(branch)
+            if flow is not None:
+                candidates[branch] = (flow, sha, (now - int(date or 0)) / 86400)
+
+        merged_into, target_tips = {}, {}
+        for (_, flow), _, _ in candidates.values():
+            for target in flow.target.split(","):
+                target = target.strip()
+                if target in merged_into:
+                    continue
+                ref = prefix + target
+                if self.repo.refs.get(ref) is None:
+                    ref = f"refs/heads/{target}"
+                target_tips[target] = self.repo.refs.get(ref)
+                merged_into[target] = (
+                    {
+                        refname[len(prefix) :]
+                        for refname, in self.repo.for_each_ref(prefix, ("refname",), merged=ref)
+                    }
+                    if target_tips[target] is not None
+                    else set()
+                )
+
+        decisions = []
+        for branch, ((flow_name, flow), sha, age) in sorted(candidates.items()):
+            targets = [t.strip() for t in flow.target.split(",")]
+            merged = all(branch in merged_into[t] for t in targets)
+            expired = flow.max_lifetime_days is not None and age > flow.max_lifetime_days
+
+            if sha in (target_tips[t] for t in targets):
+                delete, reason = False, "no commits of its own yet"
+            elif expired and (merged or include_unmerged):
+                delete = True
+                reason = f"lifetime exceeded ({age:.0f}d > {flow.max_lifetime_days}d)"
+            elif expired:
+                delete = False
+                reason = f"lifetime exceeded ({age:.0f}d > {flow.max_lifetime_days}d) but not merged"
+            elif not merged:
+                delete, reason = False, "not merged"
+            elif not flow.auto_delete:
+                delete, reason = False, "merged, auto_delete disabled"
+            elif older_than_days is not None and age < older_than_days:
+                delete, reason = False, f"merged, younger than {older_than_days}d"
+            else:
+                delete, reason = True, "merged"
+            decisions.append(Retention(branch, flow_name, age, merged, delete, reason))
+        return decisions
+
+    def keep_open_prs(self, decisions: list["Retention"], prs) -> list["Retention"]:
+        """
+        Keep branches marked for deletion that still have an open PR (PRCache),
+        or whose PR state the provider failed to report.
+        """
+        pairs = [
+            (d.branch, target.strip())
+            for d in decisions
+            if d.delete
+            for target in self.flows[d.flow].target.split(",")
+        ]
+        states = prs.lookup(pairs)
+        open_sources = {source for (source, _), s in states.items() if s.is_open}
+        unknown_sources = {source for (source, _), s in states.items() if s.is_unknown}
+        kept = []
+        for d in decisions:
+            if d.delete and d.branch in open_sources:
+                d = d._replace(delete=False, reason=f"{d.reason}, but a PR is open")
+            elif d.delete and d.branch in unknown_sources:
+                d = d._replace(delete=False, reason=f"{d.reason}, but the PR state is unknown")
+            kept.append(d)
+        return kept
+
+    def apply_retention(self, decisions: list["Retention"], remote: bool = True) -> list[str]:
+        """Delete the branches marked for deletion: one batched push (or one `branch -D`)."""
+        names = [d.branch for d in decisions if d.delete]
+        if names:
+            # already checked against the flow targets (or --include-unmerged):
+            # `git branch -d` would only look at HEAD/upstream
+            self.repo.delete_branches(names, remote=remote, local=not remote, force=True)
+        return names
 
 
 # TODO git tagging
 # TODO direct flow between trunks with tag: link/join/hook/weld/stamp
 # TODO merge back main to develop
 # TODO test CI
-# TODO impostare effettivamente su git repo che non si può pushare su trunk che non lo permettono
-# TODO aggiungere controllo automatico con gerarchia dei trunks
-# (es. la modifica di develop deve essere propatagata a main, quindi develop ha una gerarchia su main)
-# per ogni commit crea un file fittizio, collezionali, ed alla fine verifica che per ogni trunk le modifiche siano propatagate senza conflitti
@@ -0,0 +1,231 @@
+"""
+Local stand-in for the Azure DevOps pull request API, for offline
+throughput and retry checks of gatp.provider_api.
+
+    with stand_in(latency=0.02) as server:
+        provider = AzureDevOpsProvider("org", "proj", "repo", "pat", base_url=server.base_url)
+        server.fail_next(429, {"Retry-After": "1"})   # scripted failures
+        ...
+        server.requests, server.connections            # counters
+
+HTTP/1.1 keep-alive like the real service: `connections` counts TCP
+connections, so pooling shows up as connections << requests.
+
+Run as a script (from the repository root) for the benchmark scenarios:
+
+    python -m tests.azure_stand_in [--requests 200] [--latency 0.02]
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    # one write per response (flushed by handle_one_request) and no Nagle:
+    # otherwise delayed ACKs add ~40 ms to every keep-alive round trip
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body=None, headers=None):
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self, method: str):
+        server = self.server
+        url = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length)) if length else None
+        if server.latency:
+            time.sleep(server.latency)
+
+        with server.lock:
+            server.requests += 1
+            server.calls.append((method, url.path))
+            failure = server.script.pop(0) if server.script else None
+            if failure is not None and not failure[2]:
+                return self._send(failure[0], {"message": "stand-in failure"}, failure[1])
+
+            _, _, tail = url.path.partition("/_apis/git/repositories/")
+            parts = tail.split("/")[1:]  # after the repository name
+            if parts[:1] != ["pullrequests"]:
+                return self._send(404, {"message": f"unknown route {url.path}"})
+
+            if method == "POST" and len(parts) == 1:
+                server.next_id += 1
+                pr = {
+                    "pullRequestId": server.next_id,
+                    "status": "active",
+                    "sourceRefName": payload["sourceRefName"],
+                    "targetRefName": payload["targetRefName"],
+                    "title": payload["title"],
+                }
+                server.prs[pr["pullRequestId"]] = pr
+                status, body, headers = 201, pr, {}
+            elif method == "GET" and len(parts) == 2:
+                pr = server.prs.get(int(parts[1]))
+                if pr is None:
+                    return self._send(404, {"message": "no such PR"})
+                etag = f'"{pr["pullRequestId"]}-{pr["status"]}"'
+                if self.headers.get("If-None-Match") == etag:
+                    return self._send(304, headers={"ETag": etag})
+                status, body, headers = 200, pr, {"ETag": etag}
+            elif method == "GET" and len(parts) == 1:
+                prs = [
+                    pr
+                    for pr in server.prs.values()
+                    if pr["status"] == query.get("searchCriteria.status", pr["status"])
+                    and pr["sourceRefName"]
+                    == query.get("searchCriteria.sourceRefName", pr["sourceRefName"])
+                    and pr["targetRefName"]
+                    == query.get("searchCriteria.targetRefName", pr["targetRefName"])
+                ]
+                skip, top = int(query.get("$skip", 0)), int(query.get("$top", 100))
+                page = prs[skip : skip + top]
+                status, body, headers = 200, {"value": page, "count": len(page)}, {}
+            else:
+                return self._send(405, {"message": f"{method} not supported"})
+
+        if failure is not None:
+            # applied, then failed on the way back (gateway timeout after the write)
+            return self._send(failure[0], {"message": "stand-in failure"}, failure[1])
+        self._send(status, body, headers)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.prs = {}
+        self.next_id = 0
+        self.script = []  # (status, headers, applied) consumed one per request
+        self.reset_counters()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def reset_counters(self):
+        self.requests = 0
+        self.connections = 0
+        self.calls = []
+
+    def fail_next(self, status: int, headers: dict = None, times: int = 1, applied: bool = False):
+        """
+        Answer the next `times` requests with `status`. With `applied`,
+        the request takes effect first (e.g. a 502 after the PR was created).
+        """
+        self.script.extend([(status, headers or {}, applied)] * times)
+
+
+@contextmanager
+def stand_in(latency: float = 0.0):
+    server = StandInServer(latency)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+# ---------------------- BENCHMARK ----------------------
+def _provider(server, session=None, concurrency: int = 8):
+    from gatp.provider_api import AzureDevOpsProvider
+
+    return AzureDevOpsProvider(
+        "org", "proj", "repo", "pat", base_url=server.base_url, session=session, concurrency=concurrency
+    )
+
+
+def _timed(label: str, server, fn):
+    server.reset_counters()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:<38} {elapsed * 1000:8.1f} ms  "
+        f"{server.requests:5d} requests  {server.connections:4d} new connections"
+    )
+
+
+def main(requests_count: int = 200, latency: float = 0.02):
+    import requests
+
+    from gatp.provider_api import _retry_policy, shared_session
+    from requests.adapters import HTTPAdapter
+
+    with stand_in(latency) as server:
+        ids = [
+            pr["pullRequestId"]
+            for pr in _provider(server).create_prs(
+                [(f"feature/{i}", "develop", f"PR {i}") for i in range(requests_count)]
+            ).results.values()
+        ]
+        print(f"stand-in {server.base_url}, {len(ids)} PRs, {latency * 1000:.0f} ms latency\n")
+
+        def fresh_session_per_request():
+            for pr_id in ids:
+                session = requests.Session()
+                session.mount("http://", HTTPAdapter(max_retries=_retry_policy()))
+                _provider(server, session=session).get_pr(pr_id)
+                session.close()
+
+        _timed("keep-alive off (session per request)", server, fresh_session_per_request)
+        _timed("keep-alive, sequential", server, lambda: [_provider(server).get_pr(i) for i in ids])
+        _timed(
+            "keep-alive, bulk (concurrency 8)",
+            server,
+            lambda: _provider(server, shared_session()).get_pr_statuses(ids),
+        )
+
+        print()
+        server.fail_next(429, {"Retry-After": "1"})
+        _timed("429 + Retry-After: 1, then 200", server, lambda: _provider(server).get_pr(ids[0]))
+        server.fail_next(502, applied=True)
+        before = len(server.prs)
+        _timed(
+            "POST answered 502 after creation",
+            server,
+            lambda: _provider(server).create_prs([("feature/dup", "develop", "dup")]),
+        )
+        print(f"{'':38} {len(server.prs) - before} PR created (no replay)")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+    main(args.requests, args.latency)
@@ -0,0 +1,49 @@
+"""Shared fixtures: throwaway git repositories with a gatp TreeManager."""
+
+import os
+import subprocess
+
+import pytest
+
+
+def git(cwd, *args, env: dict = None) -> str:
+    return subprocess.run(
+        ["git", *args],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+        text=True,
+        env={**os.environ, **env} if env else None,
+    ).stdout.strip()
+
+
+def commit_file(cwd, path: str, content: str, message: str = None, date: str = None) -> str:
+    """Write `path`, commit it on the current branch and return the new HEAD."""
+    target = cwd / path
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_text(content)
+    git(cwd, "add", path)
+    env = {"GIT_AUTHOR_DATE": date, "GIT_COMMITTER_DATE": date} if date else None
+    git(cwd, "commit", "-q", "-m", message or f"update {path}", env=env)
+    return git(cwd, "rev-parse", "HEAD")
+
+
+@pytest.fixture
+def repo_dir(tmp_path):
+    """Repository with one commit on `main` and `develop` at the same tip."""
+    path = tmp_path / "repo"
+    path.mkdir()
+    git(path, "init", "-q", "-b", "main")
+    git(path, "config", "user.name", "Test")
+    git(path, "config", "user.email", "test@example.com")
+    git(path, "config", "commit.gpgsign", "false")
+    commit_file(path, "README", "init\n", "init")
+    git(path, "branch", "develop")
+    return path
+
+
+@pytest.fixture
+def tree_manager(repo_dir):
+    from gatp.tree_manager import TreeManager
+
+    return TreeManager(str(repo_dir))
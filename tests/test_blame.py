@@ -0,0 +1,109 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from gatp.blame import _merge_ranges, _missing_ranges, blame_lines
+
+from conftest import commit_file, git
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def test_merge_ranges():
+    assert _merge_ranges([]) == []
+    assert _merge_ranges([(5, 7), [1, 2], (3, 3)]) == [[1, 3], [5, 7]]
+    assert _merge_ranges([(1, 10), (2, 4), (11, 12)]) == [[1, 12]]
+
+
+def test_missing_ranges():
+    covered = [[3, 5], [8, 9]]
+    assert _missing_ranges([], 1, 4) == [(1, 4)]
+    assert _missing_ranges(covered, 1, 10) == [(1, 2), (6, 7), (10, 10)]
+    assert _missing_ranges(covered, 3, 5) == []
+    assert _missing_ranges(covered, 4, 8) == [(6, 7)]
+    assert _missing_ranges(covered, 10, 12) == [(10, 12)]
+
+
+def _line_commits(hunks):
+    return [h.commit for h in hunks for _ in range(h.count)]
+
+
+def _git_line_commits(repo, path, rev):
+    out = git(repo, "blame", "-l", "-s", rev, "--", path)
+    return [line.split()[0].lstrip("^") for line in out.splitlines()]
+
+
+@pytest.fixture
+def history(repo_dir):
+    first = commit_file(repo_dir, "f.txt", "a\nb\nc\nd\n")
+    second = commit_file(repo_dir, "f.txt", "a\nB\nc\nd\ne\n")
+    return repo_dir, first, second
+
+
+@pytest.fixture
+def calls(tree_manager, monkeypatch):
+    """Line ranges each blame_lines call asked git for."""
+    repo = tree_manager.repo
+    calls, iter_blame = [], repo.iter_blame
+
+    def recording(path, rev, ranges):
+        calls.append(list(ranges))
+        return iter_blame(path, rev, ranges)
+
+    monkeypatch.setattr(repo, "iter_blame", recording)
+    return calls
+
+
+def test_matches_git_blame(tree_manager, history, calls):
+    repo_dir, first, second = history
+    for rev in (first, second):
+        hunks = blame_lines(tree_manager.repo, "f.txt", rev)
+        assert _line_commits(hunks) == _git_line_commits(repo_dir, "f.txt", rev)
+    hunks = blame_lines(tree_manager.repo, "f.txt", second, 2, 3)
+    assert (hunks[0].start, hunks[0].commit, hunks[-1].start + hunks[-1].count - 1) == (2, second, 3)
+
+
+def test_only_missing_lines_are_blamed(tree_manager, history, calls):
+    _, _, second = history
+    blame_lines(tree_manager.repo, "f.txt", second, 2, 3)
+    blame_lines(tree_manager.repo, "f.txt", second, 1, 5)
+    blame_lines(tree_manager.repo, "f.txt", second, 2, 4)
+    assert calls == [[(2, 3)], [(1, 1), (4, 5)]]
+
+
+def test_entry_reused_across_commits(tree_manager, history, calls):
+    repo_dir, _, second = history
+    full = blame_lines(tree_manager.repo, "f.txt", second)
+    # a later commit that does not touch f.txt: answered from the cache
+    third = commit_file(repo_dir, "other.txt", "x\n")
+    assert blame_lines(tree_manager.repo, "f.txt", third) == full
+    assert len(calls) == 1
+    # a commit touching it is blamed again
+    fourth = commit_file(repo_dir, "f.txt", "a\nB\nc\nD\ne\n")
+    hunks = blame_lines(tree_manager.repo, "f.txt", fourth)
+    assert len(calls) == 2
+    assert _line_commits(hunks) == _git_line_commits(repo_dir, "f.txt", fourth)
+
+
+def test_no_cache(tree_manager, history, calls):
+    repo_dir, _, second = history
+    blame_lines(tree_manager.repo, "f.txt", second, use_cache=False)
+    blame_lines(tree_manager.repo, "f.txt", second, use_cache=False)
+    assert len(calls) == 2
+    assert not (repo_dir / ".gatp" / "blame").exists()
+
+
+def test_cli_counts_lines_like_git(repo_dir):
+    # a lone \r is not a line break for git
+    commit_file(repo_dir, "cr.txt", "x\ry\nz\n")
+    proc = subprocess.run(
+        [sys.executable, "-m", "gatp.app", "blame", "cr.txt", "--line", "2"],
+        cwd=repo_dir,
+        capture_output=True,
+        env={**os.environ, "PYTHONPATH": str(ROOT)},
+    )
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.rstrip(b"\n").endswith(b" 2) z")
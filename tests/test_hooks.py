@@ -0,0 +1,89 @@
+import subprocess
+
+import pytest
+
+from gatp import hooks
+from gatp.policy import BranchMatcher, Policy, TrunkPolicy
+from gatp.tree_manager import DEFAULT_FLOWS, DEFAULT_TRUNKS
+
+from conftest import commit_file, git
+
+ZERO = "0" * 40
+SHA = "1" * 40
+RUNS = 5
+
+
+def test_check_updates():
+    trunks = {**DEFAULT_TRUNKS, "release/*": TrunkPolicy("release/*", require_pr=False)}
+    matcher = BranchMatcher(Policy(trunks, DEFAULT_FLOWS, {}))
+    rejected = hooks.check_updates(
+        matcher,
+        [
+            ("refs/heads/develop", SHA, SHA),  # allow_push
+            ("refs/heads/feature/a", ZERO, SHA),
+            ("refs/heads/feature/a", SHA, ZERO),
+            ("refs/tags/v1", ZERO, SHA),
+            ("refs/heads/main", SHA, SHA),
+            ("refs/heads/develop", SHA, ZERO),
+            ("refs/heads/release/1.0", SHA, SHA),
+        ],
+    )
+    assert rejected == [
+        "direct push to trunk 'main' is not allowed; merge via a pull request",
+        "deleting trunk 'develop' is not allowed",
+        "direct push to trunk 'release/1.0' is not allowed; merge through gatp",
+    ]
+
+
+@pytest.fixture
+def hooked(tree_manager, repo_dir, tmp_path):
+    """Configured repository with the pre-push hook and a bare `origin`."""
+    remote = tmp_path / "origin.git"
+    git(tmp_path, "init", "-q", "--bare", str(remote))
+    git(repo_dir, "remote", "add", "origin", str(remote))
+    tree_manager.init_store_with_defaults()
+    hooks.install("pre-push", str(repo_dir))
+    return repo_dir
+
+
+def _push(repo, *refspecs):
+    return subprocess.run(
+        ["git", "push", "origin", *refspecs], cwd=repo, capture_output=True, text=True
+    )
+
+
+def test_installed_hook_enforces_policy(hooked):
+    git(hooked, "checkout", "-q", "-b", "feature/a")
+    commit_file(hooked, "a.txt", "a\n")
+    assert _push(hooked, "feature/a", "develop").returncode == 0
+
+    proc = _push(hooked, "main")
+    assert proc.returncode != 0
+    assert "gatp: direct push to trunk 'main' is not allowed" in proc.stderr
+
+    proc = _push(hooked, ":develop")
+    assert proc.returncode != 0
+    assert "gatp: deleting trunk 'develop' is not allowed" in proc.stderr
+
+
+def test_installed_hook_reads_snapshot_only(hooked):
+    # a fresh snapshot answers the hook: no ORM, no regex engine, no json
+    command = hooks.hook_command("pre-push")
+    command[1:1] = ["-X", "importtime"]
+    proc = subprocess.run(
+        [*command, "origin", "url"],
+        cwd=hooked,
+        input=f"refs/heads/main {SHA} refs/heads/main {SHA}\n",
+        capture_output=True,
+        text=True,
+    )
+    assert proc.returncode == 1
+    imported = {line.split("|")[-1].strip() for line in proc.stderr.splitlines() if "|" in line}
+    assert "gatp.snapshot" in imported
+    assert not imported & {"gatp.tree_manager", "sqlalchemy", "json", "re", "fnmatch", "types", "os"}
+
+
+def test_hook_process_budget(hooked):
+    # best of a few medians: a loaded test machine only ever adds time
+    best = min(hooks.benchmark(str(hooked), runs=9)["process_ms"] for _ in range(RUNS))
+    assert best < hooks.HOOK_BUDGET_MS, f"hook process took {best:.1f} ms (budget {hooks.HOOK_BUDGET_MS} ms)"
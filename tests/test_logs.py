@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def store(tree_manager):
+    store = tree_manager.store
+    now = datetime.utcnow()
+    for i in range(5):
+        store.add_log(timestamp=now + timedelta(seconds=i), user="u", level="info", message=f"m{i}")
+    # stamped earlier, inserted last (a LogSink flushing late)
+    store.add_log(timestamp=now - timedelta(hours=1), user="u", level=None, message="late")
+    store.flush_logs()
+    return store
+
+
+def test_iter_logs_orders(store):
+    assert [r.message for r in store.iter_logs(page_size=2)] == ["late", "m0", "m1", "m2", "m3", "m4"]
+    assert [r.message for r in store.iter_logs(descending=True, page_size=2)][:2] == ["m4", "m3"]
+
+
+def test_after_id_follows_insertion_order(store):
+    first = min(r.id for r in store.iter_logs())
+    rows = list(store.iter_logs(after_id=first, page_size=2))
+    assert [r.message for r in rows] == ["m1", "m2", "m3", "m4", "late"]
+    assert list(store.iter_logs(after_id=store.last_log_id())) == []
+
+
+def test_last_log_id(store):
+    assert store.last_log_id() == max(r.id for r in store.iter_logs())
+    store.add_log(user="u", level="info", message="new")
+    assert [r.message for r in store.iter_logs(after_id=store.last_log_id() - 1)] == ["new"]
+
+
+def test_after_id_rejects_descending(store):
+    with pytest.raises(ValueError, match="descending"):
+        list(store.iter_logs(after_id=1, descending=True))
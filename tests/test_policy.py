@@ -0,0 +1,69 @@
+import pytest
+
+from gatp.policy import BranchMatcher, FlowPolicy, Policy, TrunkPolicy, validate_topology
+
+
+def _matcher(trunks, flows=()):
+    return BranchMatcher(
+        Policy({t: TrunkPolicy(t) for t in trunks}, {f.name: f for f in flows}, {})
+    )
+
+
+def test_longest_flow_prefix_wins():
+    matcher = _matcher(
+        ["develop"],
+        [
+            FlowPolicy("feature", "feature/", "develop", "develop"),
+            FlowPolicy("ui", "feature/ui/", "develop", "develop"),
+        ],
+    )
+    assert matcher.flow("feature/ui/button")[0] == "ui"
+    assert matcher.flow("feature/uix")[0] == "feature"
+    assert matcher.flow("feature/ui")[0] == "feature"
+    assert matcher.flow("feature/")[0] == "feature"
+    assert matcher.flow("featur") is None
+    assert matcher.flow("hotfix/x") is None
+
+
+def test_same_prefix_first_flow_by_name():
+    matcher = _matcher(
+        ["develop"],
+        [FlowPolicy("b", "feat/", "develop", "develop"), FlowPolicy("a", "feat/", "develop", "develop")],
+    )
+    assert matcher.flow("feat/x")[0] == "a"
+
+
+def test_trunk_precedence():
+    matcher = _matcher(["main", "release/*", "release/1.x", "re:release/\\d+\\.\\d+", "re:hotfix/.*"])
+    assert matcher.trunk("main").name == "main"
+    # exact names first, then the longest pattern
+    assert matcher.trunk("release/1.x").name == "release/1.x"
+    assert matcher.trunk("release/2.0").name == "re:release/\\d+\\.\\d+"
+    assert matcher.trunk("release/next").name == "release/*"
+    assert matcher.trunk("hotfix/a/b").name == "re:hotfix/.*"
+    # patterns match the whole name
+    assert matcher.trunk("release/1.0/extra").name == "release/*"
+    assert matcher.trunk("xrelease/2.0") is None
+    assert matcher.trunk("mainline") is None
+
+
+def test_trunk_precedence_ignores_order():
+    names = ["release/*", "release/1.x", "re:release/1\\..*"]
+    for order in (names, names[::-1]):
+        assert _matcher(order).trunk("release/1.x").name == "release/1.x"
+        assert _matcher(order).trunk("release/1.5").name == "re:release/1\\..*"
+
+
+def test_regex_groups():
+    matcher = _matcher(["re:(?P<v>\\d)-(?P=v)", "re:lts/\\\\1"])  # escaped backslash: no backreference
+    assert matcher.trunk("3-3").name == "re:(?P<v>\\d)-(?P=v)"
+    assert matcher.trunk("3-4") is None
+    assert matcher.trunk("lts/\\1").name == "re:lts/\\\\1"
+
+
+@pytest.mark.parametrize("name", ["re:(\\d)-\\1", "re:(a)(b)\\2", "re:release/(", "re:(?P<t0>x)"])
+def test_invalid_trunk_patterns(name):
+    with pytest.raises(ValueError):
+        _matcher([name])
+    with pytest.raises(ValueError):
+        validate_topology(Policy({name: TrunkPolicy(name)}, {}, {}))
@@ -0,0 +1,80 @@
+import pytest
+
+from gatp.pr_cache import NO_PR, PRCache
+from gatp.provider_api import BulkResult
+from gatp.tree_manager import Retention
+
+
+class FailingProvider:
+    """Provider whose every lookup fails (e.g. expired PAT, service down)."""
+
+    concurrency = 4
+
+    def fetch_pr(self, pr_id, etag=None):
+        raise RuntimeError("Azure PR lookup failed 500")
+
+    def list_prs_by_source(self, branches, status="active"):
+        return BulkResult({}, {b: RuntimeError("Azure PR query failed 500") for b in branches})
+
+
+class StaticProvider:
+    concurrency = 4
+
+    def __init__(self, prs):
+        self.prs = prs  # source → list of PR dicts
+
+    def list_prs_by_source(self, branches, status="active"):
+        return BulkResult({b: self.prs.get(b, []) for b in branches}, {})
+
+
+def _pr(pr_id, source, target):
+    return {
+        "pullRequestId": pr_id,
+        "status": "active",
+        "sourceRefName": f"refs/heads/{source}",
+        "targetRefName": f"refs/heads/{target}",
+    }
+
+
+def test_failed_lookup_is_unknown_and_not_cached(tree_manager):
+    prs = PRCache(tree_manager.store, FailingProvider())
+    state = prs.lookup([("feature/a", "develop")])[("feature/a", "develop")]
+    assert state.is_unknown and not state.is_open
+    assert tree_manager.store.get_pr_states([("feature/a", "develop")]) == {}
+    with pytest.raises(RuntimeError, match="provider lookup failed"):
+        prs.open_pr("feature/a", "develop")
+
+
+def test_lookup_by_source_caches_answers(tree_manager):
+    prs = PRCache(tree_manager.store, StaticProvider({"feature/a": [_pr(7, "feature/a", "develop")]}))
+    states = prs.lookup([("feature/a", "develop"), ("feature/b", "develop")])
+    assert states["feature/a", "develop"].pr_id == 7
+    assert states["feature/b", "develop"].status == NO_PR
+    assert prs.open_pr("feature/a", "develop").pr_id == 7
+    assert prs.open_pr("feature/b", "develop") is None
+    # fresh rows answer locally, even if the provider is now down
+    prs.provider = FailingProvider()
+    assert prs.open_pr("feature/a", "develop").pr_id == 7
+
+
+def test_keep_open_prs_keeps_unknown(tree_manager):
+    decisions = [
+        Retention("feature/a", "feature", 40.0, True, True, "merged"),
+        Retention("feature/b", "feature", 40.0, True, True, "merged"),
+        Retention("feature/c", "feature", 1.0, False, False, "not merged"),
+    ]
+    kept = tree_manager.keep_open_prs(decisions, PRCache(tree_manager.store, FailingProvider()))
+    assert [d.delete for d in kept] == [False, False, False]
+    assert kept[0].reason == "merged, but the PR state is unknown"
+    assert kept[2] == decisions[2]
+
+
+def test_keep_open_prs_deletes_without_pr(tree_manager):
+    decisions = [
+        Retention("feature/a", "feature", 40.0, True, True, "merged"),
+        Retention("feature/b", "feature", 40.0, True, True, "merged"),
+    ]
+    provider = StaticProvider({"feature/a": [_pr(7, "feature/a", "develop")]})
+    kept = tree_manager.keep_open_prs(decisions, PRCache(tree_manager.store, provider))
+    assert [(d.branch, d.delete) for d in kept] == [("feature/a", False), ("feature/b", True)]
+    assert kept[0].reason == "merged, but a PR is open"
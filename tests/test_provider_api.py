@@ -0,0 +1,126 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from gatp.provider_api import AzureDevOpsProvider, _retry_policy, run_bulk
+from requests.adapters import HTTPAdapter
+
+from azure_stand_in import stand_in
+
+
+@pytest.fixture
+def server():
+    with stand_in() as server:
+        yield server
+
+
+@pytest.fixture
+def provider(server):
+    # private session: retries are counted per test, not shared across them
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(max_retries=_retry_policy(backoff=0)))
+    yield AzureDevOpsProvider("org", "proj", "repo", "pat", base_url=server.base_url, session=session)
+    session.close()
+
+
+def test_keep_alive_reuses_one_connection(server, provider):
+    pr = provider.create_pr("feature/a", "develop", "a")
+    for _ in range(20):
+        assert provider.get_pr(pr["pullRequestId"])["status"] == "active"
+    assert server.requests == 21
+    assert server.connections == 1
+
+
+def test_post_retried_on_429_with_retry_after(server, provider):
+    server.fail_next(429, {"Retry-After": "0"}, times=2)
+    pr = provider.create_pr("feature/a", "develop", "a")
+    assert pr["pullRequestId"] == 1
+    assert server.requests == 3
+    assert len(server.prs) == 1
+
+
+def test_post_not_replayed_after_gateway_error(server, provider):
+    # the PR was created, the answer got lost behind a 502: no duplicate
+    server.fail_next(502, applied=True)
+    with pytest.raises(RuntimeError, match="502"):
+        provider.create_pr("feature/a", "develop", "a")
+    assert server.requests == 1
+    assert len(server.prs) == 1
+
+
+def test_get_retried_on_5xx(server, provider):
+    pr = provider.create_pr("feature/a", "develop", "a")
+    server.fail_next(502)
+    server.fail_next(504)
+    assert provider.get_pr(pr["pullRequestId"])["pullRequestId"] == pr["pullRequestId"]
+    assert server.requests == 4
+
+
+def test_conditional_get(server, provider):
+    pr = provider.create_pr("feature/a", "develop", "a")
+    body, etag = provider.fetch_pr(pr["pullRequestId"])
+    assert body["status"] == "active"
+    assert provider.fetch_pr(pr["pullRequestId"], etag) == (None, etag)
+
+
+def test_iter_prs_pages(server, provider):
+    provider.create_prs([(f"feature/{i}", "develop", str(i)) for i in range(25)])
+    provider.create_pr("hotfix/x", "main", "x")
+    server.reset_counters()
+    prs = provider.list_prs(target="develop", page_size=10)
+    assert sorted(pr["pullRequestId"] for pr in prs) == list(range(1, 26))
+    assert server.requests == 3  # 10 + 10 + 5
+
+    # a full last page costs one more (empty) request
+    server.reset_counters()
+    assert len(provider.list_prs(page_size=13)) == 26
+    assert server.requests == 3
+
+    assert [pr["title"] for pr in provider.list_prs(source="feature/7")] == ["7"]
+
+
+def test_run_bulk_concurrency_limit():
+    lock, active, peak = threading.Lock(), [0], [0]
+
+    def work(item):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        return item * 2
+
+    result = run_bulk(work, range(12), concurrency=3)
+    assert result.results == {i: i * 2 for i in range(12)}
+    assert peak[0] == 3
+
+
+def test_run_bulk_collects_errors():
+    def work(item):
+        if item == 3:
+            raise RuntimeError("boom")
+        return item
+
+    result = run_bulk(work, [1, 2, 3, 4, 2])
+    assert result.results == {1: 1, 2: 2, 4: 4}
+    assert list(result.errors) == [3] and str(result.errors[3]) == "boom"
+
+
+def test_bulk_failure_does_not_abort_others(server):
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(max_retries=_retry_policy(backoff=0)))
+    provider = AzureDevOpsProvider(
+        "org", "proj", "repo", "pat", base_url=server.base_url, session=session, concurrency=3
+    )
+    created = provider.create_prs([(f"feature/{i}", "develop", str(i)) for i in range(9)])
+    ids = [pr["pullRequestId"] for pr in created.results.values()]
+    server.reset_counters()
+    statuses = provider.get_pr_statuses([*ids, 999])
+    assert statuses.results == {pr_id: "active" for pr_id in ids}
+    assert list(statuses.errors) == [999] and "404" in str(statuses.errors[999])
+    # bounded pool: never more connections than concurrent requests
+    assert server.connections <= 3
+    session.close()
@@ -0,0 +1,127 @@
+import pytest
+from git.exc import GitCommandError
+
+from gatp.repository import MergeResult
+
+from conftest import commit_file, git
+
+
+def test_state_dir_is_excluded(tree_manager, repo_dir):
+    tree_manager.init_store_with_defaults()
+    assert (repo_dir / ".gatp" / "config.db").exists()
+    assert git(repo_dir, "status", "--porcelain") == ""
+    git(repo_dir, "add", "-A")
+    assert git(repo_dir, "diff", "--cached", "--name-only") == ""
+    # idempotent: one exclude line however many times it is used
+    exclude = (repo_dir / ".git" / "info" / "exclude").read_text().splitlines()
+    assert exclude.count(".gatp/") == 1
+
+
+# ---------------------- IN-MEMORY MERGE ----------------------
+def _tip(repo_dir, branch):
+    return git(repo_dir, "rev-parse", f"refs/heads/{branch}")
+
+
+def _on_branch(repo_dir, branch, path, content):
+    """Commit `path` on `branch` (created from develop if needed), back on main."""
+    git(repo_dir, "checkout", "-q", "-B" if branch == "develop" else "-b", branch, "develop")
+    commit = commit_file(repo_dir, path, content)
+    git(repo_dir, "checkout", "-q", "main")
+    return commit
+
+
+def test_merge_up_to_date(tree_manager, repo_dir):
+    main = _tip(repo_dir, "main")
+    result = tree_manager.repo.merge_in_memory("develop", "main")
+    assert result == MergeResult("up-to-date", main, [])
+    assert _tip(repo_dir, "main") == main
+
+
+def test_merge_fast_forward(tree_manager, repo_dir):
+    git(repo_dir, "checkout", "-q", "develop")
+    feature = _on_branch(repo_dir, "feature/a", "a.txt", "a\n")
+    result = tree_manager.repo.merge_in_memory("feature/a", "develop", no_ff=False)
+    assert result == MergeResult("fast-forward", feature, [])
+    assert _tip(repo_dir, "develop") == feature
+
+
+def test_merge_no_ff_creates_merge_commit(tree_manager, repo_dir):
+    old = _tip(repo_dir, "develop")
+    feature = _on_branch(repo_dir, "feature/a", "a.txt", "a\n")
+    result = tree_manager.repo.merge_in_memory("feature/a", "develop")
+    assert result.kind == "merge"
+    assert git(repo_dir, "rev-parse", f"{result.commit}^1", f"{result.commit}^2").split() == [old, feature]
+    assert git(repo_dir, "log", "-1", "--format=%s", "develop") == "Merge branch 'feature/a' into develop"
+
+
+def test_merge_clean(tree_manager, repo_dir):
+    _on_branch(repo_dir, "feature/a", "a.txt", "a\n")
+    _on_branch(repo_dir, "develop", "b.txt", "b\n")
+    result = tree_manager.repo.merge_in_memory("feature/a", "develop", message="merge a")
+    assert result.kind == "merge" and result.conflicts == []
+    assert _tip(repo_dir, "develop") == result.commit
+    assert git(repo_dir, "ls-tree", "--name-only", "develop").split() == ["README", "a.txt", "b.txt"]
+    # the developer's checkout (main) was not touched
+    assert git(repo_dir, "status", "--porcelain") == ""
+
+
+def test_merge_conflict_moves_nothing(tree_manager, repo_dir):
+    _on_branch(repo_dir, "feature/a", "README", "ours\n")
+    develop = _on_branch(repo_dir, "develop", "README", "theirs\n")
+    result = tree_manager.repo.merge_in_memory("feature/a", "develop")
+    assert result == MergeResult("conflict", None, ["README"])
+    assert _tip(repo_dir, "develop") == develop
+    assert git(repo_dir, "status", "--porcelain") == ""
+
+
+def test_merge_into_checked_out_branch_updates_worktree(tree_manager, repo_dir):
+    _on_branch(repo_dir, "feature/a", "a.txt", "a\n")
+    (repo_dir / "README").write_text("local edit\n")  # unrelated local change survives
+    result = tree_manager.repo.merge_in_memory("feature/a", "main")
+    assert result.kind == "merge"
+    assert git(repo_dir, "rev-parse", "HEAD") == result.commit
+    assert (repo_dir / "a.txt").read_text() == "a\n"
+    assert git(repo_dir, "status", "--porcelain") == "M README"
+
+
+def test_advance_branch_is_compare_and_swap(tree_manager, repo_dir):
+    stale = _tip(repo_dir, "develop")
+    _on_branch(repo_dir, "develop", "b.txt", "b\n")
+    current = _tip(repo_dir, "develop")
+    with pytest.raises(GitCommandError):
+        tree_manager.repo._advance_branch("develop", stale, stale, "test")
+    assert _tip(repo_dir, "develop") == current
+
+
+# ---------------------- TARGETED FETCH ----------------------
+@pytest.fixture
+def clone(repo_dir, tmp_path):
+    """Empty repository whose `origin` is repo_dir (develop: 3 commits ahead of main)."""
+    git(repo_dir, "checkout", "-q", "develop")
+    for i in range(3):
+        commit_file(repo_dir, "d.txt", f"{i}\n")
+    git(repo_dir, "checkout", "-q", "main")
+    path = tmp_path / "clone"
+    path.mkdir()
+    git(path, "init", "-q", "-b", "main")
+    git(path, "remote", "add", "origin", f"file://{repo_dir}")
+    return path
+
+
+def test_sync_branch_shallow(clone, repo_dir):
+    from gatp.repository import GitRepository
+
+    result = GitRepository(str(clone)).sync_branch("develop", depth=1)
+    assert result.commit == _tip(repo_dir, "develop")
+    assert git(clone, "rev-parse", "--is-shallow-repository") == "true"
+    assert git(clone, "rev-list", "--count", "develop") == "1"
+
+
+def test_sync_branch_partial(clone, repo_dir):
+    from gatp.repository import GitRepository
+
+    git(repo_dir, "config", "uploadpack.allowFilter", "true")
+    GitRepository(str(clone)).sync_branch("develop", filter="blob:none")
+    assert _tip(clone, "develop") == _tip(repo_dir, "develop")
+    assert git(clone, "rev-list", "--count", "develop") == "4"
+    assert git(clone, "config", "remote.origin.promisor") == "true"
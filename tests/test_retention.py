@@ -0,0 +1,95 @@
+import time
+
+import pytest
+
+from gatp.policy import BranchMatcher, FlowPolicy, Policy
+from gatp.tree_manager import DEFAULT_TRUNKS
+
+from conftest import commit_file, git
+
+OLD = f"@{int(time.time()) - 100 * 86400} +0000"  # 100 days ago
+
+
+def _use_flows(tree_manager, *flows):
+    policy = Policy(dict(DEFAULT_TRUNKS), {f.name: f for f in flows}, {})
+    tree_manager.policy = policy
+    tree_manager.trunks, tree_manager.flows = policy.trunks, policy.flows
+    tree_manager.binds = policy.binds
+    tree_manager.matcher = BranchMatcher(policy)
+
+
+def _branch(repo, name, date=None, merge=False):
+    """Branch `name` off develop with one commit, optionally merged back (--no-ff)."""
+    git(repo, "checkout", "-q", "-b", name, "develop")
+    commit_file(repo, f"{name}.txt", f"{name}\n", date=date)
+    git(repo, "checkout", "-q", "develop")
+    if merge:
+        git(repo, "merge", "-q", "--no-ff", "-m", f"merge {name}", name)
+
+
+@pytest.fixture
+def plan(tree_manager, repo_dir):
+    _use_flows(
+        tree_manager,
+        FlowPolicy("feature", "feature/", "develop", "develop", max_lifetime_days=30, auto_delete=True),
+        FlowPolicy("topic", "topic/", "develop", "develop"),
+    )
+    _branch(repo_dir, "feature/merged", merge=True)
+    _branch(repo_dir, "feature/old-merged", date=OLD, merge=True)
+    _branch(repo_dir, "feature/old-open", date=OLD)
+    _branch(repo_dir, "feature/open")
+    _branch(repo_dir, "topic/merged", merge=True)
+    git(repo_dir, "branch", "feature/new", "develop")
+
+    def plan(**kwargs):
+        return {d.branch: d for d in tree_manager.plan_retention(remote=False, **kwargs)}
+
+    return plan
+
+
+def test_merged_branches(plan):
+    decisions = plan()
+    assert decisions["feature/merged"].merged
+    assert (decisions["feature/merged"].delete, decisions["feature/merged"].reason) == (True, "merged")
+    assert not decisions["topic/merged"].delete
+    assert decisions["topic/merged"].reason == "merged, auto_delete disabled"
+    assert not decisions["feature/open"].delete
+    assert decisions["feature/open"].reason == "not merged"
+    # trunks are never candidates
+    assert "develop" not in decisions and "main" not in decisions
+
+
+def test_expired_branches(plan):
+    decisions = plan()
+    assert decisions["feature/old-merged"].delete
+    assert decisions["feature/old-merged"].reason.startswith("lifetime exceeded")
+    assert decisions["feature/old-merged"].age_days > 99
+    assert not decisions["feature/old-open"].delete
+    assert decisions["feature/old-open"].reason.endswith("but not merged")
+
+
+def test_include_unmerged(plan):
+    decisions = plan(include_unmerged=True)
+    assert decisions["feature/old-open"].delete
+    # not expired: never deleted unmerged
+    assert not decisions["feature/open"].delete
+
+
+def test_older_than(plan):
+    decisions = plan(older_than_days=7)
+    assert not decisions["feature/merged"].delete
+    assert decisions["feature/merged"].reason == "merged, younger than 7d"
+    assert decisions["feature/old-merged"].delete
+
+
+def test_tip_equals_target(plan):
+    decision = plan(include_unmerged=True)["feature/new"]
+    assert decision.merged and not decision.delete
+    assert decision.reason == "no commits of its own yet"
+
+
+def test_apply_retention(plan, tree_manager, repo_dir):
+    deleted = tree_manager.apply_retention(list(plan().values()), remote=False)
+    assert sorted(deleted) == ["feature/merged", "feature/old-merged"]
+    left = git(repo_dir, "for-each-ref", "--format=%(refname:short)", "refs/heads/feature/")
+    assert sorted(left.split()) == ["feature/new", "feature/old-open", "feature/open"]
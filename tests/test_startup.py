@@ -0,0 +1,56 @@
+"""
+Start-up budget: `gatp --help`, subcommand help and usage errors must not
+import GitPython, SQLAlchemy or requests, nor build the TreeManager.
+"""
+
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# wall time of `python -m gatp.app --help`, best of RUNS. Includes
+# interpreter start-up and typer/rich help rendering (~250 ms on a
+# development machine, ~170 ms of it typer + rich).
+HELP_BUDGET_MS = 500
+RUNS = 3
+HEAVY = ("git", "sqlalchemy", "requests")
+
+# runs the CLI like `python -m gatp.app`, then reports the heavy modules loaded
+_PROBE = """
+import json, runpy, sys
+sys.argv = ["gatp", *sys.argv[1:]]
+try:
+    runpy.run_module("gatp.app", run_name="__main__", alter_sys=True)
+except SystemExit:
+    pass
+sys.stderr.write("\\n" + json.dumps([m for m in %r if m in sys.modules]) + "\\n")
+""" % (HEAVY,)
+
+
+@pytest.mark.parametrize(
+    "args",
+    [["--help"], ["flux", "--help"], ["log", "--help"], ["no-such-command"]],
+)
+def test_no_heavy_imports(args):
+    proc = subprocess.run(
+        [sys.executable, "-c", _PROBE, *args], cwd=ROOT, capture_output=True, text=True
+    )
+    loaded = json.loads(proc.stderr.strip().splitlines()[-1])
+    assert loaded == [], f"`gatp {' '.join(args)}` imported {loaded}"
+
+
+def test_help_wall_time_budget():
+    best = float("inf")
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-m", "gatp.app", "--help"], cwd=ROOT, capture_output=True
+        )
+        best = min(best, (time.perf_counter() - start) * 1000)
+        assert proc.returncode == 0
+    assert best < HELP_BUDGET_MS, f"`gatp --help` took {best:.0f} ms (budget {HELP_BUDGET_MS} ms)"